@@ -1,6 +1,14 @@
-from django.contrib import admin
+import os
 
-from certificates.models import ParseFile, ParseSession
+from django.contrib import admin, messages
+from django.db.models import QuerySet
+from django.http import HttpRequest, HttpResponse, FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html_join
+
+from certificates.models import ParseFile, ParseSession, ParseBatch
+from certificates.profiling import format_stats, format_collapsed
 
 
 @admin.register(ParseFile)
@@ -8,6 +16,87 @@ class ParseFileAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(ParseBatch)
+class ParseBatchAdmin(admin.ModelAdmin):
+
+    list_display = ['__str__', 'start_with_policy', 'archive_mode', 'created_at']
+    list_select_related = ['certificate_type']
+
+
 @admin.register(ParseSession)
 class ParseSessionAdmin(admin.ModelAdmin):
-    pass
+
+    PROFILE_FIELDS = {'stats': 'profile_stats', 'stacks': 'profile_stacks'}
+
+    list_display = ['__str__', 'status', 'pages_total', 'profiler', 'created_at', 'finished_at']
+    list_filter = ['status', 'profiler']
+    list_select_related = ['parse_file']
+    readonly_fields = ['profile']
+    exclude = ['page_names', 'profile_stats', 'profile_stacks']
+    actions = ['requeue_with_cprofile', 'requeue_with_sampling']
+
+    def get_urls(self) -> list:
+        return [
+            path('<int:pk>/profile/', self.admin_site.admin_view(self.profile_view),
+                 name='certificates_parsesession_profile'),
+            path('<int:pk>/profile/<str:kind>/', self.admin_site.admin_view(self.profile_download_view),
+                 name='certificates_parsesession_profile_download'),
+        ] + super().get_urls()
+
+    @admin.display(description='Профиль')
+    def profile(self, parse_session: ParseSession) -> str:
+        if not parse_session.profile_stacks:
+            return '-'
+        links = [(reverse('admin:certificates_parsesession_profile', args=[parse_session.pk]), 'Просмотр')]
+        for kind, field_name in self.PROFILE_FIELDS.items():
+            field_file = getattr(parse_session, field_name)
+            if field_file:
+                links.append((reverse('admin:certificates_parsesession_profile_download', args=[parse_session.pk, kind]),
+                              os.path.basename(field_file.name)))
+        return format_html_join(' | ', '<a href="{}">{}</a>', links)
+
+    def profile_view(self, request: HttpRequest, pk: int) -> HttpResponse:
+        """Отчет о самых долгих функциях и стеках вызовов сессии."""
+        parse_session = self._get_profiled_session(request, pk)
+        report = []
+        if parse_session.profile_stats:
+            with parse_session.profile_stats.open('rb') as stats_file:
+                report.append(format_stats(stats_file.read()))
+        with parse_session.profile_stacks.open('rb') as stacks_file:
+            report.append(format_collapsed(stacks_file.read()))
+        return HttpResponse('\n'.join(report), content_type='text/plain; charset=utf-8')
+
+    def profile_download_view(self, request: HttpRequest, pk: int, kind: str) -> FileResponse:
+        parse_session = self._get_profiled_session(request, pk)
+        if kind not in self.PROFILE_FIELDS or not getattr(parse_session, self.PROFILE_FIELDS[kind]):
+            raise Http404
+        field_file = getattr(parse_session, self.PROFILE_FIELDS[kind])
+        return FileResponse(field_file.open('rb'), as_attachment=True, filename=os.path.basename(field_file.name))
+
+    def _get_profiled_session(self, request: HttpRequest, pk: int) -> ParseSession:
+        if not self.has_view_permission(request):
+            raise Http404
+        parse_session = get_object_or_404(ParseSession, pk=pk)
+        if not parse_session.profile_stacks:
+            raise Http404
+        return parse_session
+
+    @admin.action(description='Повторить разделение с cProfile')
+    def requeue_with_cprofile(self, request: HttpRequest, queryset: QuerySet) -> None:
+        self._requeue_with_profiler(request, queryset, ParseSession.Profiler.CPROFILE)
+
+    @admin.action(description='Повторить разделение с сэмплирующим профилировщиком')
+    def requeue_with_sampling(self, request: HttpRequest, queryset: QuerySet) -> None:
+        self._requeue_with_profiler(request, queryset, ParseSession.Profiler.SAMPLING)
+
+    def _requeue_with_profiler(self, request: HttpRequest, queryset: QuerySet, profiler: str) -> None:
+        requeued = 0
+        for parse_session in queryset:
+            # Выполняющуюся сессию нельзя вернуть в очередь: ее обработает второй обработчик
+            if parse_session.status == ParseSession.Status.RUNNING:
+                continue
+            parse_session.profiler = profiler
+            parse_session.save(update_fields=['profiler'])
+            parse_session.requeue()
+            requeued += 1
+        self.message_user(request, f'Возвращено в очередь сессий: {requeued}', messages.SUCCESS)
@@ -1,4 +1,13 @@
+import hashlib
 import os
+from typing import BinaryIO, Dict, Iterable, Optional, Set, Union
+
+import fitz
+from django.core.files import File
+
+
+# Путь к pdf документу на диске либо его содержимое, если документ не сохранен на диске
+PdfSource = Union[str, bytes]
 
 
 class FileHelper:
@@ -28,16 +37,107 @@ class FileHelper:
         return find_string.find(next(filter(str.isalpha, find_string)))
 
     @staticmethod
-    def generate_name(full_path: str, save_path: str, file_name: str,
-                      file_extension: str = 'pdf') -> str:
-        """Генерирует название файла."""
-        if not os.path.exists(full_path):
-            return full_path
+    def get_file_hash(file: File) -> str:
+        """Вычисляет SHA-256 содержимого файла."""
+        file_hash = hashlib.sha256()
+        for chunk in file.chunks():
+            file_hash.update(chunk)
+        return file_hash.hexdigest()
+
+    @staticmethod
+    def open_pdf_document(pdf_file: BinaryIO) -> fitz.Document:
+        """Открывает pdf документ с диска, не читая его целиком в память,
+        либо из содержимого, если файл не сохранен на диске.
+        """
+        return FileHelper.open_pdf_source(FileHelper.get_pdf_source(pdf_file))
+
+    @staticmethod
+    def get_pdf_source(pdf_file: BinaryIO) -> PdfSource:
+        """Возвращает путь к файлу на диске, в том числе обернутому в django File,
+        либо содержимое файла, если он не сохранен на диске.
+        """
+        wrapped_file = pdf_file
+        while wrapped_file is not None:
+            file_path = getattr(wrapped_file, 'name', None)
+            if isinstance(file_path, str) and os.path.isabs(file_path) and os.path.isfile(file_path):
+                return file_path
+            wrapped_file = getattr(wrapped_file, 'file', None)
+        pdf_file.seek(0)
+        return pdf_file.read()
+
+    @staticmethod
+    def open_pdf_source(pdf_source: PdfSource) -> fitz.Document:
+        """Открывает pdf документ: с диска объекты страниц читаются по мере обращения к ним."""
+        if isinstance(pdf_source, str):
+            return fitz.open(pdf_source)
+        return fitz.open(stream=pdf_source, filetype='pdf')
+
 
-        file_number = 1
-        while os.path.exists(f'{save_path}/{file_name}_{file_number}.{file_extension}'):
+class NameRegistry:
+    """Реестр занятых имен файлов в пределах одного архива.
+
+    Для каждого имени хранится номер следующего суффикса, поэтому повторяющееся
+    имя получает свободный суффикс сразу, без перебора уже занятых. Имена
+    сравниваются без учета регистра: на Windows Ivan.pdf и IVAN.pdf при
+    распаковке архива оказываются одним файлом.
+
+    Стратегии разрешения совпадений:
+    suffix - порядковый номер (Ivan_1.pdf, Ivan_2.pdf),
+    page - номер страницы (Ivan_p12.pdf),
+    hash - короткий хэш имени и номера страницы, не меняющийся при повторном разделении.
+    """
+
+    STRATEGIES = ('suffix', 'page', 'hash')
+
+    def __init__(self, used_names: Iterable[str] = (), strategy: str = 'suffix',
+                 file_extension: str = 'pdf', case_sensitive: bool = False) -> None:
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'Неизвестная стратегия разрешения совпадений имен: {strategy}')
+        self.strategy = strategy
+        self.file_extension = file_extension
+        self.case_sensitive = case_sensitive
+        self._used_names: Set[str] = {self._normalize(name) for name in used_names}
+        self._next_suffixes: Dict[str, int] = {}
+
+    def allocate(self, file_name: str, page_index: Optional[int] = None) -> str:
+        """Возвращает свободное имя файла и помечает его занятым."""
+        new_name = f'{file_name}.{self.file_extension}'
+        if self._reserve(new_name):
+            return new_name
+
+        if self.strategy != 'suffix' and page_index is not None:
+            file_name = self._get_page_file_name(file_name, page_index)
+            new_name = f'{file_name}.{self.file_extension}'
+            if self._reserve(new_name):
+                return new_name
+
+        key = self._normalize(file_name)
+        file_number = self._next_suffixes.get(key, 1)
+        new_name = f'{file_name}_{file_number}.{self.file_extension}'
+        while not self._reserve(new_name):
             file_number += 1
+            new_name = f'{file_name}_{file_number}.{self.file_extension}'
+        self._next_suffixes[key] = file_number + 1
+        return new_name
+
+    def _get_page_file_name(self, file_name: str, page_index: int) -> str:
+        if self.strategy == 'page':
+            return f'{file_name}_p{page_index + 1}'
+        name_hash = hashlib.sha256(f'{file_name}:{page_index}'.encode()).hexdigest()
+        return f'{file_name}_{name_hash[:8]}'
+
+    def _reserve(self, name: str) -> bool:
+        key = self._normalize(name)
+        if key in self._used_names:
+            return False
+        self._used_names.add(key)
+        return True
+
+    def _normalize(self, name: str) -> str:
+        return name if self.case_sensitive else name.casefold()
 
-        new_full_path = f'{save_path}/{file_name}_{file_number}.{file_extension}'
+    def __contains__(self, name: str) -> bool:
+        return self._normalize(name) in self._used_names
 
-        return new_full_path
+    def __len__(self) -> int:
+        return len(self._used_names)
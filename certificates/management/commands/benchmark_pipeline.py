@@ -0,0 +1,312 @@
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import tempfile
+import threading
+import time
+import zipfile
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+import fitz
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+
+from certificates.helpers import FileHelper
+from certificates.services import CalibrationDataService, SplitCertificatesService, CertificateNamesService
+
+
+LATIN_NAMES = ['Ibrahim Abdullayev', 'Yusuf Karimov', 'Maryam Saidova', 'Aisha Nurova', 'Umar Khasanov']
+CYRILLIC_NAMES = ['Ибрагим Абдуллаев', 'Юсуф Каримов', 'Марьям Саидова', 'Аиша Нурова', 'Умар Хасанов']
+ARABIC_NAMES = ['إبراهيم عبد الله', 'يوسف كريم', 'مريم سعيد', 'عائشة نور', 'عمر حسن']
+
+# Интервал проверки, жив ли процесс замера, пока он не вернул результат
+RESULT_POLL_INTERVAL = 0.5
+
+
+class TikaStubHandler(BaseHTTPRequestHandler):
+    """Заглушка сервера Tika, извлекающая текст средствами PyMuPDF."""
+
+    def do_PUT(self):
+        content = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+        document = fitz.open(stream=content, filetype='pdf')
+        pages = [page.getText() for page in document]
+
+        if 'html' in self.headers.get('Accept', ''):
+            body = '<html><body>' + ''.join(f'<div class="page">{escape(page)}</div>' for page in pages) \
+                   + '</body></html>'
+            content_type = 'text/html'
+        else:
+            body = ''.join(pages)
+            content_type = 'text/plain'
+
+        encoded_body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', f'{content_type}; charset=UTF-8')
+        self.send_header('Content-Length', str(len(encoded_body)))
+        self.end_headers()
+        self.wfile.write(encoded_body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Измеряет производительность калибровки и разделения на синтетических pdf документах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, nargs='+', default=[10, 100, 1000, 5000],
+                            help='Количество страниц в синтетических документах')
+        parser.add_argument('--duplicates', type=float, default=0.2,
+                            help='Доля сертификатов с повторяющимися именами')
+        parser.add_argument('--font-file', default=None,
+                            help='Шрифт с арабскими глифами; без него арабские имена не используются')
+        parser.add_argument('--tika-stub', action='store_true',
+                            help='Извлекать текст через локальную заглушку сервера Tika')
+        parser.add_argument('--tika-latency', type=float, default=0,
+                            help='Задержка ответа заглушки Tika в секундах')
+        parser.add_argument('--split-pipeline', choices=['sync', 'async'], default=settings.SPLIT_PIPELINE,
+                            help='Конвейер разделения')
+        parser.add_argument('--split-writer', choices=['fitz', 'pypdf2'], default=settings.SPLIT_WRITER,
+                            help='Запись страниц сертификатов')
+        parser.add_argument('--output', default='benchmark.json', help='Файл для результатов в формате JSON')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        overrides = {'SPLIT_PIPELINE': options['split_pipeline'], 'SPLIT_WRITER': options['split_writer']}
+        stub_server = None
+        if options['tika_stub']:
+            stub_server = ThreadingHTTPServer(('127.0.0.1', 0), TikaStubHandler)
+            stub_server.latency = options['tika_latency']
+            threading.Thread(target=stub_server.serve_forever, daemon=True).start()
+            overrides.update({
+                'PDF_PARSER_BACKEND': 'certificates.services.TikaParserBackend',
+                'TIKA_SERVER_PATH': f'http://127.0.0.1:{stub_server.server_port}/',
+            })
+
+        results = []
+        try:
+            with override_settings(**overrides), tempfile.TemporaryDirectory() as directory:
+                for pages_count in options['pages']:
+                    pdf_path = os.path.join(directory, f'certificates_{pages_count}.pdf')
+                    names = self._generate_names(pages_count, options['duplicates'], options['font_file'])
+                    self._generate_pdf(pdf_path, names, options['font_file'])
+
+                    for stage, benchmark in (('calibration', _benchmark_calibration),
+                                             ('split', _benchmark_split),
+                                             ('generate_name', _benchmark_generate_name)):
+                        result = _run_isolated(benchmark, pdf_path, names)
+                        result.update({'stage': stage, 'pages': pages_count})
+                        results.append(result)
+                        self.stdout.write(
+                            f"{stage:>14} {pages_count:>6} стр.: {result['seconds']:.3f} с, "
+                            f"{result['pages_per_second']:.1f} стр./с, RSS {result['peak_rss_kb']} КБ"
+                        )
+        finally:
+            if stub_server:
+                stub_server.shutdown()
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'pymupdf': fitz.VersionBind,
+            'parser_backend': overrides.get('PDF_PARSER_BACKEND', settings.PDF_PARSER_BACKEND),
+            'tika_stub': options['tika_stub'],
+            'tika_latency': options['tika_latency'],
+            'split_pipeline': options['split_pipeline'],
+            'split_workers': settings.SPLIT_WORKERS,
+            'split_writer': options['split_writer'],
+            'split_writer_garbage': settings.SPLIT_WRITER_GARBAGE,
+            'split_writer_subset_fonts': bool(settings.SPLIT_WRITER_SUBSET_FONTS),
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+    @staticmethod
+    def _generate_names(pages_count: int, duplicates: float, font_file: Optional[str]) -> List[str]:
+        """Имена сертификатов с заданной долей повторов."""
+        names_pool = LATIN_NAMES + CYRILLIC_NAMES + (ARABIC_NAMES if font_file else [])
+        names = []
+        for i in range(pages_count):
+            if names and random.random() < duplicates:
+                names.append(random.choice(names))
+            else:
+                names.append(f'{random.choice(names_pool)} {i}')
+        return names
+
+    @staticmethod
+    def _generate_pdf(pdf_path: str, names: List[str], font_file: Optional[str]) -> None:
+        document = fitz.open()
+        font = {'fontname': 'F0', 'fontfile': font_file} if font_file else {'fontname': 'helv'}
+        for i, name in enumerate(names):
+            page = document.newPage(width=842, height=595)
+            page.insertText((70, 80), 'CERTIFICATE', fontsize=32)
+            page.insertText((70, 130), 'Academy of Islamic Fiqh', fontsize=18)
+            page.insertText((70, 260), name, fontsize=28, encoding=fitz.TEXT_ENCODING_CYRILLIC, **font)
+            page.insertText((70, 520), f'{i:06d}', fontsize=12)
+        document.save(pdf_path, garbage=3, deflate=True)
+        document.close()
+
+
+def _run_isolated(benchmark: Callable[[str, List[str]], dict], pdf_path: str, names: List[str]) -> dict:
+    """Запускает замер в отдельном процессе, чтобы пиковая память не накапливалась."""
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure, args=(sender, benchmark, pdf_path, names))
+    process.start()
+    sender.close()
+    try:
+        result = _receive_result(receiver, process)
+    finally:
+        receiver.close()
+        process.join()
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+    return result
+
+
+def _receive_result(receiver, process: multiprocessing.Process) -> dict:
+    """Ждет результат замера, пока процесс замера жив.
+
+    Процесс, завершившийся без результата (например, убитый из-за нехватки
+    памяти), не блокирует команду.
+    """
+    while not receiver.poll(RESULT_POLL_INTERVAL):
+        if not process.is_alive() and not receiver.poll():
+            break
+    else:
+        try:
+            return receiver.recv()
+        except EOFError:
+            pass
+    process.join()
+    raise RuntimeError(f'Процесс замера завершился с кодом {process.exitcode}, не вернув результат')
+
+
+def _measure(sender, benchmark: Callable[[str, List[str]], dict], pdf_path: str, names: List[str]) -> None:
+    baseline_rss_kb = _reset_peak_rss()
+    disk_usage = _DiskUsageSampler(SplitCertificatesService.ARCHIVE_SAVE_PATH)
+    disk_usage.start()
+    try:
+        started = time.perf_counter()
+        result = benchmark(pdf_path, names)
+        seconds = time.perf_counter() - started
+    except Exception as e:
+        sender.send({'error': repr(e)})
+        return
+    finally:
+        disk_usage.stop()
+
+    result.update({
+        'seconds': round(seconds, 4),
+        'pages_per_second': round(len(names) / seconds, 2) if seconds else None,
+        'baseline_rss_kb': baseline_rss_kb,
+        'peak_rss_kb': max(_get_peak_rss() - baseline_rss_kb, 0),
+        'peak_temp_disk_bytes': disk_usage.peak,
+    })
+    sender.send(result)
+
+
+def _reset_peak_rss() -> int:
+    """Сбрасывает пиковый RSS процесса и возвращает RSS, от которого считается прирост.
+
+    Дочерний процесс наследует пиковый RSS родителя на момент fork, поэтому на
+    Linux пик сбрасывается до текущего RSS через /proc/self/clear_refs. Если
+    сбросить пик нельзя, прирост считается от унаследованного пика.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return _read_proc_status('VmRSS')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _get_peak_rss() -> int:
+    try:
+        return _read_proc_status('VmHWM')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _read_proc_status(field: str) -> int:
+    """Значение памяти процесса из /proc/self/status в килобайтах."""
+    with open('/proc/self/status') as status:
+        for line in status:
+            name, _, value = line.partition(':')
+            if name == field:
+                return int(value.split()[0])
+    raise OSError(f'В /proc/self/status нет поля {field}')
+
+
+def _benchmark_calibration(pdf_path: str, names: List[str]) -> dict:
+    with open(pdf_path, 'rb') as pdf_file:
+        _, start_with_auto = CalibrationDataService(pdf_file=pdf_file)()
+    return {'start_with_auto': start_with_auto}
+
+
+def _benchmark_split(pdf_path: str, names: List[str]) -> dict:
+    with open(pdf_path, 'rb') as pdf_file:
+        parsed_page, _ = CalibrationDataService(pdf_file=pdf_file)()
+    # Оператор калибрует начало имени вручную, поэтому смещение берется по имени первой страницы
+    name_position = parsed_page.find(names[0])
+
+    with open(pdf_path, 'rb') as pdf_file:
+        archive_path = SplitCertificatesService(pdf_file=pdf_file, name_position=name_position)()
+    with zipfile.ZipFile(archive_path) as archive:
+        archive_entries = len(archive.namelist())
+    archive_size = os.path.getsize(archive_path)
+    os.remove(archive_path)
+    return {
+        'archive_bytes': archive_size,
+        'archive_entries': archive_entries,
+        'source_bytes': os.path.getsize(pdf_path),
+    }
+
+
+def _benchmark_generate_name(pdf_path: str, names: List[str]) -> dict:
+    name_registry = CertificateNamesService.create_name_registry()
+    for page_index, name in enumerate(names):
+        name_registry.allocate(FileHelper.format_file_name(name), page_index)
+    return {'unique_names': len(name_registry)}
+
+
+class _DiskUsageSampler(threading.Thread):
+    """Периодически измеряет объем временного каталога и запоминает максимум."""
+
+    INTERVAL = 0.05
+
+    def __init__(self, path) -> None:
+        super().__init__(daemon=True)
+        self.path = str(path)
+        self.peak = 0
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            self.peak = max(self.peak, self._get_size())
+            self._stopped.wait(self.INTERVAL)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+    def _get_size(self) -> int:
+        size = 0
+        for root, _, files in os.walk(self.path):
+            for file_name in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, file_name))
+                except OSError:
+                    pass
+        return size
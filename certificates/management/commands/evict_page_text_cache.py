@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from certificates.models import PageText
+
+
+class Command(BaseCommand):
+    help = 'Удаляет устаревшие записи кэша текста страниц'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=settings.PAGE_TEXT_CACHE_MAX_AGE,
+                            help='Срок хранения документа в днях с последнего использования')
+        parser.add_argument('--max-size', type=int, default=settings.PAGE_TEXT_CACHE_MAX_SIZE,
+                            help='Максимальный объем кэша в символах')
+
+    def handle(self, *args, **options):
+        deleted = PageText.objects.evict(
+            max_age=timedelta(days=options['max_age']),
+            max_size=options['max_size'],
+        )
+        self.stdout.write(f'Удалено страниц: {deleted}')
@@ -0,0 +1,139 @@
+import os
+import shutil
+import time
+from contextlib import ExitStack
+from typing import Dict, List
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from certificates.models import CertificateType, ParseBatch, ParseSession
+from certificates.services import StreamBatchArchiveService, StreamCertificatesArchiveService
+
+
+class Command(BaseCommand):
+    help = 'Загружает пакет файлов с сертификатами из каталогов и файлов и ставит их разделение в очередь'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', help='Slug курса')
+        parser.add_argument('certificate_type', help='Slug типа сертификата')
+        parser.add_argument('paths', nargs='+',
+                            help='Pdf файлы или каталоги, из которых загружаются все pdf файлы')
+        parser.add_argument('--start-with-policy', choices=ParseBatch.StartWithPolicy.values,
+                            default=ParseBatch.StartWithPolicy.AUTO,
+                            help='auto - начало имени определяется автоматически, '
+                                 'per_file - задается флагом --start-with для каждого файла')
+        parser.add_argument('--start-with', action='append', default=[], metavar='ФАЙЛ=СИМВОЛ',
+                            help='Начало имени в файле, для файлов без значения оно определяется автоматически')
+        parser.add_argument('--archive-mode', choices=ParseBatch.ArchiveMode.values,
+                            default=ParseBatch.ArchiveMode.COMBINED,
+                            help='combined - один архив на пакет, per_file - архив для каждого файла')
+        parser.add_argument('--output',
+                            help='Разделить файлы в этом процессе и сохранить архивы в каталог; '
+                                 'без флага разделение выполняет обработчик очереди')
+        parser.add_argument('--sleep', type=float, default=2,
+                            help='Пауза между проверками сессий, которые разделяет обработчик очереди, в секундах')
+
+    def handle(self, *args, **options):
+        certificate_type = CertificateType.objects.filter(
+            slug=options['certificate_type'], course__slug=options['course'],
+        ).first()
+        if certificate_type is None:
+            raise CommandError(f'Тип сертификата {options["course"]}/{options["certificate_type"]} не найден')
+        file_paths = self._get_file_paths(options['paths'])
+        start_with = self._parse_start_with(options['start_with'])
+
+        with ExitStack() as stack:
+            files = [File(stack.enter_context(open(path, 'rb')), name=os.path.basename(path)) for path in file_paths]
+            calibrations = ParseBatch.calibrate_files(files)
+            with transaction.atomic():
+                batch = ParseBatch.objects.create(
+                    certificate_type=certificate_type,
+                    start_with_policy=options['start_with_policy'],
+                    archive_mode=options['archive_mode'],
+                )
+                results = batch.add_files(files, calibrations)
+
+        parse_files_start_with = {}
+        for path, result in zip(file_paths, results):
+            if isinstance(result, ValidationError):
+                self.stderr.write(f'{path}: {result.messages[0]}')
+                continue
+            if batch.start_with_policy == ParseBatch.StartWithPolicy.PER_FILE \
+                    and os.path.basename(path) in start_with:
+                parse_files_start_with[result.pk] = start_with[os.path.basename(path)]
+        parse_sessions = batch.create_sessions(parse_files_start_with)
+        self.stdout.write(f'Пакет {batch.pk}: загружено файлов {len(parse_sessions)} из {len(file_paths)}')
+
+        if options['output']:
+            self._split(batch, options['sleep'])
+            self._save_archives(batch, options['output'])
+
+    @staticmethod
+    def _get_file_paths(paths: List[str]) -> List[str]:
+        file_paths = []
+        for path in paths:
+            if os.path.isdir(path):
+                file_paths.extend(sorted(
+                    entry.path for entry in os.scandir(path)
+                    if entry.is_file() and entry.name.lower().endswith('.pdf')
+                ))
+            elif os.path.isfile(path):
+                file_paths.append(path)
+            else:
+                raise CommandError(f'Файл или каталог {path} не найден')
+        if not file_paths:
+            raise CommandError('Не найдено ни одного pdf файла')
+        return [os.path.abspath(path) for path in file_paths]
+
+    @staticmethod
+    def _parse_start_with(values: List[str]) -> Dict[str, int]:
+        start_with = {}
+        for value in values:
+            file_name, _, position = value.rpartition('=')
+            if not file_name or not position.isdigit():
+                raise CommandError(f'Начало имени задается в виде ФАЙЛ=СИМВОЛ: {value}')
+            start_with[os.path.basename(file_name)] = int(position)
+        return start_with
+
+    def _split(self, batch: ParseBatch, sleep: float) -> None:
+        """Разделяет файлы пакета вместе с обработчиками очереди и ждет завершения всех сессий."""
+        parse_sessions = batch.get_parse_sessions()
+        while True:
+            parse_session = parse_sessions.claim_next()
+            if parse_session is None:
+                break
+            parse_session.split_certificates()
+            self.stdout.write(f'{parse_session}: {parse_session.get_status_display()}')
+        # Часть сессий могла забрать обработчик очереди
+        while parse_sessions.filter(status__in=[ParseSession.Status.QUEUED, ParseSession.Status.RUNNING]).exists():
+            time.sleep(sleep)
+
+    def _save_archives(self, batch: ParseBatch, output: str) -> None:
+        os.makedirs(output, exist_ok=True)
+        if batch.archive_mode == ParseBatch.ArchiveMode.COMBINED:
+            archive_paths = [os.path.join(output, batch.archive_name)]
+            with open(archive_paths[0], 'wb') as archive:
+                for chunk in StreamBatchArchiveService(parts=batch.iter_archive_parts())():
+                    archive.write(chunk)
+        else:
+            archive_paths = []
+            for parse_file, parse_session in batch.get_latest_sessions():
+                if parse_session is None or parse_session.status != ParseSession.Status.DONE:
+                    continue
+                archive_paths.append(os.path.join(output, parse_session.archive_name))
+                if parse_session.certificates:
+                    shutil.copyfile(parse_session.certificates.path, archive_paths[-1])
+                    continue
+                with open(archive_paths[-1], 'wb') as archive, parse_file.file.open('rb') as pdf_file:
+                    for chunk in StreamCertificatesArchiveService(pdf_file=pdf_file,
+                                                                  page_names=parse_session.page_names)():
+                        archive.write(chunk)
+
+        for parse_file, parse_session in batch.get_latest_sessions():
+            if parse_session is not None and parse_session.status == ParseSession.Status.FAILED:
+                self.stderr.write(f'{parse_file.file_name}: {parse_session.error}')
+        for archive_path in archive_paths:
+            self.stdout.write(f'Сохранен архив {archive_path}')
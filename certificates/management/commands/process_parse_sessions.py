@@ -0,0 +1,47 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from certificates.metrics import start_metrics_server
+from certificates.models import ParseSession, PageText
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь сессий разделения сертификатов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать сессии в очереди и завершить работу')
+        parser.add_argument('--sleep', type=float, default=2,
+                            help='Пауза между опросами пустой очереди в секундах')
+        parser.add_argument('--metrics-port', type=int, default=settings.METRICS_PORT,
+                            help='Порт сервера метрик обработчика, 0 - не запускать сервер')
+
+    def handle(self, *args, **options):
+        if options['metrics_port']:
+            start_metrics_server(options['metrics_port'])
+            logger.info(f'Метрики обработчика доступны на порту {options["metrics_port"]}')
+
+        while True:
+            ParseSession.objects.requeue_stale(timeout=timedelta(seconds=settings.SPLIT_HEARTBEAT_TIMEOUT))
+            parse_session = ParseSession.objects.claim_next()
+            if parse_session is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            logger.info(f'Начато разделение сессии {parse_session.pk}')
+            parse_session.split_certificates()
+            logger.info(f'Сессия {parse_session.pk} завершена со статусом {parse_session.status}')
+
+            PageText.objects.evict(
+                max_age=timedelta(days=settings.PAGE_TEXT_CACHE_MAX_AGE),
+                max_size=settings.PAGE_TEXT_CACHE_MAX_SIZE,
+            )
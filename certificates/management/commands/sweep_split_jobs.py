@@ -0,0 +1,83 @@
+import os
+import shutil
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from certificates.models import ParseSession, ParseFileUpload
+from certificates.services import SplitCertificatesService
+
+
+class Command(BaseCommand):
+    help = 'Возвращает в очередь зависшие сессии и удаляет брошенные временные файлы разделения и загрузки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=settings.SPLIT_HEARTBEAT_TIMEOUT,
+                            help='Возраст в секундах, после которого сессия и временные файлы считаются брошенными')
+        parser.add_argument('--upload-max-age', type=int, default=settings.UPLOAD_MAX_AGE,
+                            help='Возраст в секундах, после которого загрузка файла частями считается брошенной')
+
+    def handle(self, *args, **options):
+        max_age = options['max_age']
+        requeued = ParseSession.objects.requeue_stale(timeout=timedelta(seconds=max_age))
+        self.stdout.write(f'Возвращено в очередь сессий: {requeued}')
+        self._sweep_uploads(options['upload_max_age'])
+
+        save_path = SplitCertificatesService.ARCHIVE_SAVE_PATH
+        if not save_path.exists():
+            return
+        removed = 0
+        for entry in os.scandir(save_path):
+            if entry.stat().st_mtime > time.time() - max_age or not self._is_orphaned(entry):
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+            removed += 1
+        self.stdout.write(f'Удалено временных файлов: {removed}')
+
+    def _sweep_uploads(self, max_age: int) -> None:
+        """Удаляет загрузки, части которых не дописывались max_age секунд,
+        и временные файлы прерванных обычных загрузок.
+        """
+        expired_at = time.time() - max_age
+        removed = 0
+        for upload in ParseFileUpload.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=max_age)):
+            if os.path.exists(upload.part_path) and os.path.getmtime(upload.part_path) > expired_at:
+                continue
+            upload.delete()
+            removed += 1
+        self.stdout.write(f'Удалено брошенных загрузок: {removed}')
+
+        if not os.path.exists(settings.FILE_UPLOAD_TEMP_DIR):
+            return
+        upload_ids = {str(upload_id) for upload_id in ParseFileUpload.objects.values_list('pk', flat=True)}
+        for entry in os.scandir(settings.FILE_UPLOAD_TEMP_DIR):
+            if entry.stat().st_mtime < expired_at and entry.name.partition('.')[0] not in upload_ids:
+                os.remove(entry.path)
+
+    @staticmethod
+    def _is_orphaned(entry: os.DirEntry) -> bool:
+        """Проверяет, что файл не нужен ни одной сессии.
+
+        Каталоги остаются от прежнего разделения через распаковку во временную
+        папку, недописанные архивы сессий нужны, пока сессию можно продолжить,
+        а готовые архивы - пока на них ссылается сессия.
+        """
+        if entry.is_dir():
+            return True
+        if entry.name.endswith('.part'):
+            parse_session_id = entry.name.partition('_')[2].partition('.')[0]
+            parse_session = ParseSession.objects.filter(pk=parse_session_id).first() \
+                if parse_session_id.isdigit() else None
+            if parse_session is not None and not parse_session.is_finished:
+                return False
+            if parse_session is not None:
+                parse_session.checkpoints.all().delete()
+            return True
+        relative_path = os.path.relpath(entry.path, settings.MEDIA_ROOT)
+        return not ParseSession.objects.filter(certificates=relative_path).exists()
@@ -0,0 +1,249 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGES = ('read', 'extract', 'parse', 'name', 'write', 'archive')
+
+T = TypeVar('T')
+
+_EXHAUSTED = object()
+
+
+class Metric:
+    """Метрика процесса в текстовом формате Prometheus."""
+
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _get_key(self, labels: dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f'Метрика {self.name} ожидает метки {", ".join(self.label_names)}')
+        return tuple(str(labels[label_name]) for label_name in self.label_names)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        labels = [*zip(self.label_names, key), *extra]
+        if not labels:
+            return ''
+        escaped = (value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in labels)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+    def render(self) -> List[str]:
+        """Строки метрики для страницы /metrics."""
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик."""
+
+    type_name = 'counter'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._get_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._get_key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return super().render() + [f'{self.name}{self._format_labels(key)} {value}' for key, value in values]
+
+
+class Histogram(Metric):
+    """Распределение наблюдений по корзинам с накопительными счетчиками."""
+
+    type_name = 'histogram'
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: число наблюдений в корзинах, их сумма и количество
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._get_key(labels)
+        with self._lock:
+            bucket_counts, total, count = self._values.get(key, ([0] * (len(self.buckets) + 1), 0, 0))
+            bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (bucket_counts, total + value, count + 1)
+
+    def get_count(self, **labels) -> int:
+        with self._lock:
+            return self._values.get(self._get_key(labels), (None, 0, 0))[2]
+
+    def get_sum(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._get_key(labels), (None, 0, 0))[1]
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(bucket_counts), total, count))
+                            for key, (bucket_counts, total, count) in self._values.items())
+        lines = super().render()
+        for key, (bucket_counts, total, count) in values:
+            cumulative = 0
+            for upper_bound, bucket_count in zip([*map(str, self.buckets), '+Inf'], bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{self._format_labels(key, [("le", upper_bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{self._format_labels(key)} {total}')
+            lines.append(f'{self.name}_count{self._format_labels(key)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Метрики процесса, которые отдаются странице /metrics."""
+
+    def __init__(self) -> None:
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return ''.join(f'{line}\n' for metric in self._metrics for line in metric.render())
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.register(Histogram(
+    'certificates_stage_duration_seconds', 'Длительность этапа задания в секундах',
+    label_names=('service', 'stage'),
+))
+JOB_DURATION = registry.register(Histogram(
+    'certificates_job_duration_seconds', 'Длительность задания в секундах',
+    label_names=('service', 'status'),
+))
+PAGES_PROCESSED = registry.register(Counter(
+    'certificates_pages_processed_total', 'Число записанных в архив страниц сертификатов',
+    label_names=('service',),
+))
+BYTES_WRITTEN = registry.register(Counter(
+    'certificates_bytes_written_total', 'Объем записанных в архив страниц сертификатов в байтах',
+    label_names=('service',),
+))
+TIKA_REQUEST_DURATION = registry.register(Histogram(
+    'certificates_tika_request_duration_seconds', 'Длительность запроса к серверу Tika в секундах',
+    label_names=('outcome',),
+))
+
+
+class JobMetrics:
+    """Длительность этапов и объем работы одного задания.
+
+    Длительности этапов суммируются: если этап выполняется в нескольких
+    потоках одновременно, его длительность может превышать длительность
+    задания. По завершении задания длительности попадают в гистограммы, а
+    сводка пишется в лог.
+    """
+
+    def __init__(self, service: str) -> None:
+        self.service = service
+        self.durations: Dict[str, float] = {}
+        self.pages = 0
+        self.bytes_written = 0
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_duration(name, time.perf_counter() - started)
+
+    def iterate(self, iterable: Iterable[T], stage: str) -> Iterator[T]:
+        """Отдает элементы iterable, относя время их получения к этапу stage."""
+        iterator = iter(iterable)
+        try:
+            while True:
+                with self.stage(stage):
+                    item = next(iterator, _EXHAUSTED)
+                if item is _EXHAUSTED:
+                    return
+                yield item
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+    def add_duration(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.durations[stage] = self.durations.get(stage, 0) + seconds
+
+    def add_page(self, size: int) -> None:
+        """Учитывает записанную в архив страницу."""
+        with self._lock:
+            self.pages += 1
+            self.bytes_written += size
+        PAGES_PROCESSED.inc(service=self.service)
+        BYTES_WRITTEN.inc(size, service=self.service)
+
+    def finish(self, status: str) -> None:
+        """Сохраняет метрики задания и пишет сводку в лог."""
+        duration = time.perf_counter() - self._started
+        for stage, seconds in self.durations.items():
+            STAGE_DURATION.observe(seconds, service=self.service, stage=stage)
+        JOB_DURATION.observe(duration, service=self.service, status=status)
+        logger.info(f'{self.service}: {status} за {duration:.3f} с, {self.summary()}')
+
+    def summary(self) -> str:
+        stages = sorted(self.durations.items(), key=lambda item: STAGES.index(item[0])
+                        if item[0] in STAGES else len(STAGES))
+        summary = ', '.join(f'{stage} {seconds:.3f} с' for stage, seconds in stages)
+        if self.pages:
+            summary = f'{summary}; страниц {self.pages}, записано {self.bytes_written} байт'
+        return summary
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Отдает метрики процесса, в котором запущен сервер."""
+
+    def do_GET(self) -> None:
+        content = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_metrics_server(port: int, address: str = '') -> ThreadingHTTPServer:
+    """Запускает в фоновом потоке сервер метрик для процессов без веб-сервера."""
+    server = ThreadingHTTPServer((address, port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
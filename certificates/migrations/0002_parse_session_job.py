@@ -0,0 +1,60 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def mark_existing_sessions_done(apps, schema_editor):
+    ParseSession = apps.get_model('certificates', 'ParseSession')
+    ParseSession.objects.exclude(certificates='').update(status='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsesession',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создана'),
+        ),
+        migrations.AddField(
+            model_name='parsesession',
+            name='error',
+            field=models.TextField(blank=True, verbose_name='Ошибка'),
+        ),
+        migrations.AddField(
+            model_name='parsesession',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Завершена'),
+        ),
+        migrations.AddField(
+            model_name='parsesession',
+            name='pages_processed',
+            field=models.PositiveIntegerField(default=0, verbose_name='Обработано страниц'),
+        ),
+        migrations.AddField(
+            model_name='parsesession',
+            name='pages_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Всего страниц'),
+        ),
+        migrations.AddField(
+            model_name='parsesession',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Начата'),
+        ),
+        migrations.AddField(
+            model_name='parsesession',
+            name='status',
+            field=models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='queued', max_length=16, verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='parsesession',
+            name='certificates',
+            field=models.FileField(blank=True, upload_to='certificates', verbose_name='Архив с сертификатами'),
+        ),
+        migrations.RunPython(mark_existing_sessions_done, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0002_parse_session_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsesession',
+            name='page_names',
+            field=models.JSONField(blank=True, default=list, verbose_name='Имена сертификатов по страницам'),
+        ),
+    ]
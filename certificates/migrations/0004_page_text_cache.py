@@ -0,0 +1,36 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0003_parse_session_page_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsefile',
+            name='file_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='SHA-256 файла'),
+        ),
+        migrations.CreateModel(
+            name='PageText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256 документа')),
+                ('backend', models.CharField(max_length=255, verbose_name='Бэкенд извлечения текста')),
+                ('page_index', models.PositiveIntegerField(verbose_name='Номер страницы')),
+                ('text', models.TextField(blank=True, verbose_name='Текст страницы')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='Длина текста')),
+                ('used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Последнее использование')),
+            ],
+            options={
+                'verbose_name': 'Текст страницы',
+                'verbose_name_plural': 'Тексты страниц',
+                'unique_together': {('source_hash', 'backend', 'page_index')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0004_page_text_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsesession',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последнее обновление прогресса'),
+        ),
+        migrations.CreateModel(
+            name='SplitCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_index', models.PositiveIntegerField(verbose_name='Номер страницы')),
+                ('name', models.CharField(max_length=255, verbose_name='Имя сертификата')),
+                ('header_offset', models.PositiveBigIntegerField(verbose_name='Смещение заголовка в архиве')),
+                ('end_offset', models.PositiveBigIntegerField(verbose_name='Смещение конца записи в архиве')),
+                ('zip_info', models.JSONField(verbose_name='Поля заголовка записи')),
+                ('parse_session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='certificates.parsesession', verbose_name='Сессия разделения')),
+            ],
+            options={
+                'verbose_name': 'Записанная страница',
+                'verbose_name_plural': 'Записанные страницы',
+                'unique_together': {('parse_session', 'page_index')},
+            },
+        ),
+    ]
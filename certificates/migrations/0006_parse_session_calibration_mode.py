@@ -0,0 +1,22 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0005_split_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsesession',
+            name='calibration_mode',
+            field=models.CharField(choices=[('offset', 'По смещению символа'), ('layout', 'По расположению на странице')], default='offset', max_length=16, verbose_name='Режим калибровки'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='parsesession',
+            unique_together={('parse_file_id', 'start_with', 'calibration_mode')},
+        ),
+    ]
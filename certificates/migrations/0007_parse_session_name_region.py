@@ -0,0 +1,27 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0006_parse_session_calibration_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsesession',
+            name='name_region',
+            field=models.JSONField(blank=True, default=list, verbose_name='Область имени в долях страницы [x0, y0, x1, y1]'),
+        ),
+        migrations.AlterField(
+            model_name='parsesession',
+            name='calibration_mode',
+            field=models.CharField(choices=[('offset', 'По смещению символа'), ('layout', 'По расположению на странице'), ('region', 'По выделенной области')], default='offset', max_length=16, verbose_name='Режим калибровки'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='parsesession',
+            unique_together={('parse_file_id', 'start_with', 'calibration_mode', 'name_region')},
+        ),
+    ]
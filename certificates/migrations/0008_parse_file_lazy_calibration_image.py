@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0007_parse_session_name_region'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parsefile',
+            name='calibration_certificate',
+            field=models.ImageField(blank=True, upload_to='', verbose_name='Сертификат для калибровки'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:45
+
+import certificates.validators
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0008_parse_file_lazy_calibration_image'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parsefile',
+            name='file',
+            field=models.FileField(upload_to='parse_files', validators=[certificates.validators.validate_pdf_file], verbose_name='Файл для разделения сертификатов'),
+        ),
+        migrations.CreateModel(
+            name='ParseFileUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_name', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('size', models.PositiveBigIntegerField(validators=[django.core.validators.MinValueValidator(5)], verbose_name='Размер файла')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Начало загрузки')),
+                ('certificate_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_uploads', to='certificates.certificatetype', verbose_name='Тип сертификата')),
+            ],
+            options={
+                'verbose_name': 'Загрузка файла',
+                'verbose_name_plural': 'Загрузки файлов',
+            },
+        ),
+    ]
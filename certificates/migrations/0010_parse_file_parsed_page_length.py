@@ -0,0 +1,25 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:49
+
+from django.db import migrations, models
+from django.db.models.functions import Length
+
+
+def fill_parsed_page_length(apps, schema_editor):
+    ParseFile = apps.get_model('certificates', 'ParseFile')
+    ParseFile.objects.update(parsed_page_length=Length('parsed_page'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0009_parse_file_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsefile',
+            name='parsed_page_length',
+            field=models.PositiveIntegerField(default=0, verbose_name='Длина распаршенной страницы'),
+        ),
+        migrations.RunPython(fill_parsed_page_length, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0010_parse_file_parsed_page_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsesession',
+            name='profile_stacks',
+            field=models.FileField(blank=True, upload_to='profiles', verbose_name='Свернутые стеки вызовов'),
+        ),
+        migrations.AddField(
+            model_name='parsesession',
+            name='profile_stats',
+            field=models.FileField(blank=True, upload_to='profiles', verbose_name='Статистика pstats'),
+        ),
+        migrations.AddField(
+            model_name='parsesession',
+            name='profiler',
+            field=models.CharField(blank=True, choices=[('', 'Без профилирования'), ('cprofile', 'cProfile'), ('sampling', 'Сэмплирующий')], default='', max_length=16, verbose_name='Профилировщик'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0011_parsesession_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParseBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_with_policy', models.CharField(choices=[('auto', 'Определять начало имени автоматически'), ('per_file', 'Задать начало имени для каждого файла')], default='auto', max_length=16, verbose_name='Начало имени')),
+                ('archive_mode', models.CharField(choices=[('combined', 'Один архив на все файлы'), ('per_file', 'Отдельный архив для каждого файла')], default='combined', max_length=16, verbose_name='Архивы с сертификатами')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создан')),
+                ('certificate_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parse_batches', to='certificates.certificatetype', verbose_name='Тип сертификата')),
+            ],
+            options={
+                'verbose_name': 'Пакет файлов',
+                'verbose_name_plural': 'Пакеты файлов',
+            },
+        ),
+        migrations.AddField(
+            model_name='parsefile',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='parse_files', to='certificates.parsebatch', verbose_name='Пакет файлов'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:11
+
+from django.db import migrations, models
+
+
+def fill_parser_backend(apps, schema_editor):
+    # До появления выбора бэкенда файлы калибровались через Tika
+    ParseFile = apps.get_model('certificates', 'ParseFile')
+    ParseFile.objects.update(parser_backend='certificates.services.TikaParserBackend')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0012_parsebatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsefile',
+            name='parser_backend',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Бэкенд извлечения текста'),
+        ),
+        migrations.RunPython(fill_parser_backend, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0013_parse_file_parser_backend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsesession',
+            name='claim_token',
+            field=models.UUIDField(blank=True, editable=False, null=True, verbose_name='Метка обработчика'),
+        ),
+    ]
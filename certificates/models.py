@@ -1,16 +1,39 @@
+import collections
+import hashlib
+import logging
 import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
 from functools import cached_property
+from typing import Optional, List, BinaryIO, Union, Dict, Iterator, Sequence, Tuple, Callable
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.base import ContentFile
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction, connection, DatabaseError
+from django.db.models import Sum, Max, F
+from django.db.models.functions import Substr
 from django.urls import reverse
+from django.utils import timezone
+from django_cleanup import cleanup
 from pytils.translit import slugify
 
-from certificates.services import CalibrationDataService, \
-    SplitCertificatesService
+from certificates.helpers import FileHelper
+from certificates.profiling import BaseProfiler, create_profiler
+from certificates.services import CalibrationDataService, BatchCalibrationService, \
+    iter_archive_certificates, iter_pdf_certificates, \
+    SplitCertificatesService, CertificateNamesService, TikaError
+from certificates.upload_handlers import PartUploadedFile
+from certificates.validators import PDF_HEADER, validate_pdf_file
 
 
+logger = logging.getLogger(__name__)
+
 class Course(models.Model):
     """Курс."""
 
@@ -59,18 +82,51 @@ class CertificateType(models.Model):
         return self.name
 
 
+class ParseFileQuerySet(models.QuerySet):
+
+    def with_text_window(self, offset: Union[int, F], length: int) -> 'ParseFileQuerySet':
+        """Добавляет text_window - фрагмент текста первой страницы с символа offset,
+        вырезанный на стороне базы данных без загрузки всего текста.
+        """
+        return self.annotate(text_window=Substr('parsed_page', offset + 1, length))
+
+
+class ParseFileManager(models.Manager.from_queryset(ParseFileQuerySet)):
+    """Текст первой страницы бывает большим и нужен только при загрузке файла,
+    поэтому по умолчанию не загружается.
+    """
+
+    def get_queryset(self) -> ParseFileQuerySet:
+        return super().get_queryset().defer('parsed_page')
+
+
+@cleanup.ignore
 class ParseFile(models.Model):
-    """Файл с сертификатами для разделения."""
+    """Файл с сертификатами для разделения.
+
+    Одинаковые по содержимому файлы хранятся один раз, поэтому файлы удаляются
+    не django-cleanup, а сигналом после удаления последней ссылки на них.
+    """
 
-    file = models.FileField(upload_to='parse_files',
+    file = models.FileField(upload_to='parse_files', validators=[validate_pdf_file],
                             verbose_name='Файл для разделения сертификатов')
     certificate_type = models.ForeignKey('CertificateType', on_delete=models.CASCADE,
                                          related_name='parse_files', verbose_name='Тип сертификата')
 
-    calibration_certificate = models.ImageField(verbose_name='Сертификат для калибровки')
+    # Изображения для калибровки рендерятся при первом просмотре, поле заполнено у загруженных ранее файлов
+    calibration_certificate = models.ImageField(blank=True, verbose_name='Сертификат для калибровки')
     parsed_page = models.TextField(verbose_name='Распаршенная страница')
+    parsed_page_length = models.PositiveIntegerField(default=0, verbose_name='Длина распаршенной страницы')
     start_with_auto = models.IntegerField(verbose_name='Начало имени в сертификате (определяется автоматически)',
                                           validators=[MinValueValidator(0)])
+    file_hash = models.CharField(max_length=64, blank=True, db_index=True, verbose_name='SHA-256 файла')
+    # Смещение имени зависит от того, как бэкенд располагает текст, поэтому файл
+    # разделяется тем же бэкендом, которым калибровался
+    parser_backend = models.CharField(max_length=255, blank=True, verbose_name='Бэкенд извлечения текста')
+    batch = models.ForeignKey('ParseBatch', on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='parse_files', verbose_name='Пакет файлов')
+
+    objects = ParseFileManager()
 
     def get_absolute_url(self) -> str:
         return reverse('parse-session-create', kwargs={
@@ -84,31 +140,380 @@ class ParseFile(models.Model):
         return os.path.basename(self.file.name)
 
     @cached_property
-    def trimmed_parsed_page(self) -> str:
-        """Обрезанная распаршенная страница."""
-        return self.parsed_page[self.start_with_auto:]
+    def calibration_images(self) -> dict:
+        """Ссылки на изображения первой страницы для калибровки разной ширины."""
+        def get_url(width: int, image_format: str) -> str:
+            return reverse('calibration-image', kwargs={
+                'file_hash': self.get_file_hash(),
+                'dpi': settings.CALIBRATION_IMAGE_DPI,
+                'width': width,
+                'image_format': image_format,
+            })
+
+        widths = settings.CALIBRATION_IMAGE_WIDTHS
+        return {
+            'webp_srcset': ', '.join(f'{get_url(width, "webp")} {width}w' for width in widths),
+            'jpeg_srcset': ', '.join(f'{get_url(width, "jpeg")} {width}w' for width in widths),
+            'src': get_url(widths[-1], 'jpeg'),
+        }
+
+    def get_file_hash(self) -> str:
+        """SHA-256 файла, вычисляется для файлов, загруженных до его появления."""
+        if not self.file_hash:
+            self.file_hash = FileHelper.get_file_hash(self.file)
+            ParseFile.objects.filter(pk=self.pk).update(file_hash=self.file_hash)
+        return self.file_hash
+
+    def _share_duplicate_data(self) -> None:
+        """Использует файл и калибровочные данные ранее загруженного такого же файла."""
+        duplicate = ParseFile.objects.filter(file_hash=self.file_hash).exclude(pk=self.pk).first()
+        if duplicate is None:
+            return
+        self.file = duplicate.file.name
+        self.calibration_certificate = duplicate.calibration_certificate.name
+        self.parsed_page = duplicate.parsed_page
+        self.parsed_page_length = duplicate.parsed_page_length
+        self.start_with_auto = duplicate.start_with_auto
+        self.parser_backend = duplicate.parser_backend
 
     def save(self, *args, **kwargs):
-        if not self.parsed_page or not self.start_with_auto or not self.calibration_certificate:
-            self.parsed_page, self.start_with_auto, tmp_file \
-                = CalibrationDataService(pdf_file=self.file.file.file)()
-            self.calibration_certificate.name = os.path.relpath(tmp_file, settings.MEDIA_ROOT)
+        if not self.file_hash:
+            # Обработчик загрузки вычисляет хэш на лету, иначе файл читается еще раз
+            self.file_hash = getattr(self.file.file, 'file_hash', None) or FileHelper.get_file_hash(self.file)
+            self._share_duplicate_data()
+        # Незагруженный текст уже сохранен в базе данных, загружать его для проверки не нужно
+        if 'parsed_page' not in self.get_deferred_fields():
+            if not self.parsed_page or self.start_with_auto is None:
+                self.parsed_page, self.start_with_auto = CalibrationDataService(pdf_file=self.file.file.file)()
+                self.parser_backend = settings.PDF_PARSER_BACKEND
+            self.parsed_page_length = len(self.parsed_page)
+        if not self.parser_backend:
+            # Калибровочные данные получены вызывающим кодом бэкендом из настроек
+            self.parser_backend = settings.PDF_PARSER_BACKEND
         super().save(*args, **kwargs)
 
+    def get_parser_backend(self) -> str:
+        return self.parser_backend or settings.PDF_PARSER_BACKEND
+
+    def __str__(self):
+        return self.file_name
+
+
+class ParseFileUpload(models.Model):
+    """Загрузка файла с сертификатами частями.
+
+    Части дописываются в файл в FILE_UPLOAD_TEMP_DIR, поэтому прерванную загрузку
+    можно продолжить с размера уже записанной части.
+    """
+
+    WRITE_CHUNK_SIZE = 64 * 1024
+    PART_HASHES_LIMIT = 1024
+
+    # SHA-256 загруженных частей по загрузкам вместе с размером, до которого он вычислен.
+    # Состояние хэша нельзя сохранить в базе данных, поэтому оно хранится в процессе:
+    # если следующая часть пришла в другой процесс, хэш вычисляется по файлу целиком
+    _part_hashes = collections.OrderedDict()
+    _part_hashes_lock = threading.Lock()
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    certificate_type = models.ForeignKey('CertificateType', on_delete=models.CASCADE,
+                                         related_name='file_uploads', verbose_name='Тип сертификата')
+    file_name = models.CharField(max_length=255, verbose_name='Имя файла')
+    size = models.PositiveBigIntegerField(validators=[MinValueValidator(len(PDF_HEADER))],
+                                          verbose_name='Размер файла')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Начало загрузки')
+
+    class Meta:
+        verbose_name = 'Загрузка файла'
+        verbose_name_plural = 'Загрузки файлов'
+
+    @property
+    def part_path(self) -> str:
+        return os.path.join(settings.FILE_UPLOAD_TEMP_DIR, f'{self.pk}.part')
+
+    @property
+    def offset(self) -> int:
+        """Размер уже загруженной части файла."""
+        return os.path.getsize(self.part_path) if os.path.exists(self.part_path) else 0
+
+    @property
+    def is_complete(self) -> bool:
+        return self.offset == self.size
+
+    def append(self, stream: BinaryIO, offset: int) -> int:
+        """Дописывает часть файла из потока и возвращает размер загруженной части."""
+        if offset != self.offset:
+            raise ValidationError('Часть файла должна начинаться с %(offset)s байта',
+                                  code='offset_mismatch', params={'offset': self.offset})
+        chunk = stream.read(self.WRITE_CHUNK_SIZE)
+        if offset == 0 and not chunk.startswith(PDF_HEADER):
+            raise ValidationError('Файл не является pdf документом', code='invalid_pdf')
+
+        part_hash = self._pop_part_hash(offset)
+        os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+        with open(self.part_path, 'ab') as part_file:
+            while chunk:
+                if offset + len(chunk) > self.size:
+                    raise ValidationError('Размер файла превышает указанный при начале загрузки',
+                                          code='size_exceeded')
+                part_file.write(chunk)
+                if part_hash is not None:
+                    part_hash.update(chunk)
+                offset += len(chunk)
+                chunk = stream.read(self.WRITE_CHUNK_SIZE)
+        if part_hash is not None:
+            with self._part_hashes_lock:
+                self._part_hashes[self.pk] = (offset, part_hash)
+                while len(self._part_hashes) > self.PART_HASHES_LIMIT:
+                    self._part_hashes.popitem(last=False)
+        return offset
+
+    def _pop_part_hash(self, offset: int):
+        """Хэш части файла размером offset, если он вычислен этим процессом."""
+        if offset == 0:
+            return hashlib.sha256()
+        with self._part_hashes_lock:
+            hashed_size, part_hash = self._part_hashes.pop(self.pk, (None, None))
+        return part_hash if hashed_size == offset else None
+
+    def complete(self) -> ParseFile:
+        """Создает файл с сертификатами из полностью загруженного файла."""
+        part_hash = self._pop_part_hash(self.size)
+        with open(self.part_path, 'rb') as part_file:
+            parse_file = ParseFile(
+                file=PartUploadedFile(part_file, name=self.file_name,
+                                      file_hash=part_hash and part_hash.hexdigest()),
+                certificate_type=self.certificate_type,
+            )
+            parse_file.save()
+        self.delete()
+        return parse_file
+
     def __str__(self):
         return self.file_name
 
 
+class ParseBatch(models.Model):
+    """Пакет файлов с сертификатами, загруженных и разделяемых вместе."""
+
+    class StartWithPolicy(models.TextChoices):
+        AUTO = 'auto', 'Определять начало имени автоматически'
+        PER_FILE = 'per_file', 'Задать начало имени для каждого файла'
+
+    class ArchiveMode(models.TextChoices):
+        COMBINED = 'combined', 'Один архив на все файлы'
+        PER_FILE = 'per_file', 'Отдельный архив для каждого файла'
+
+    certificate_type = models.ForeignKey('CertificateType', on_delete=models.CASCADE,
+                                         related_name='parse_batches', verbose_name='Тип сертификата')
+    start_with_policy = models.CharField(max_length=16, choices=StartWithPolicy.choices,
+                                         default=StartWithPolicy.AUTO, verbose_name='Начало имени')
+    archive_mode = models.CharField(max_length=16, choices=ArchiveMode.choices,
+                                    default=ArchiveMode.COMBINED, verbose_name='Архивы с сертификатами')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Создан')
+
+    class Meta:
+        verbose_name = 'Пакет файлов'
+        verbose_name_plural = 'Пакеты файлов'
+
+    def get_absolute_url(self) -> str:
+        return reverse('parse-batch-detail', kwargs={'pk': self.pk})
+
+    @staticmethod
+    def calibrate_files(files: Sequence[File]) -> List[Union[Tuple[str, int], ValidationError]]:
+        """Проверяет и калибрует файлы одновременно, не обращаясь к базе данных.
+
+        Для каждого файла возвращаются калибровочные данные либо ошибка, из-за
+        которой файл нельзя добавить в пакет.
+        """
+        results: List[Union[Tuple[str, int], ValidationError, None]] = []
+        for file in files:
+            try:
+                validate_pdf_file(file)
+            except ValidationError as error:
+                results.append(error)
+            else:
+                results.append(None)
+
+        pdf_files = [file for file, result in zip(files, results) if result is None]
+        calibrations = iter(BatchCalibrationService(pdf_files=pdf_files)())
+        for i in range(len(files)):
+            if results[i] is not None:
+                continue
+            calibration = next(calibrations)
+            if isinstance(calibration, Exception):
+                calibration = ValidationError(f'Не удалось получить текст первой страницы: {calibration}',
+                                              code='calibration_failed')
+            results[i] = calibration
+        return results
+
+    def add_files(self, files: Sequence[File], calibrations: Sequence[Union[Tuple[str, int], ValidationError]],
+                  ) -> List[Union[ParseFile, ValidationError]]:
+        """Сохраняет в пакет файлы, откалиброванные calibrate_files.
+
+        Калибровка выполняется заранее, чтобы не держать открытой транзакцию,
+        в которой сохраняется пакет. Для файлов с ошибкой калибровки
+        возвращается ошибка.
+        """
+        results: List[Union[ParseFile, ValidationError]] = []
+        for file, calibration in zip(files, calibrations):
+            if isinstance(calibration, ValidationError):
+                results.append(calibration)
+                continue
+            parsed_page, start_with_auto = calibration
+            results.append(ParseFile.objects.create(
+                file=file,
+                certificate_type=self.certificate_type,
+                batch=self,
+                parsed_page=parsed_page,
+                start_with_auto=start_with_auto,
+            ))
+        return results
+
+    def create_sessions(self, start_with: Optional[Dict[int, int]] = None) -> List['ParseSession']:
+        """Ставит в очередь разделение файлов пакета, у которых еще нет сессии.
+
+        start_with - начало имени по id файла, для остальных файлов
+        используется начало, найденное автоматически.
+        """
+        start_with = start_with or {}
+        return [
+            ParseSession.objects.create(parse_file=parse_file,
+                                        start_with=start_with.get(parse_file.pk, parse_file.start_with_auto))
+            for parse_file in self.parse_files.filter(parse_sessions__isnull=True).order_by('pk')
+        ]
+
+    def get_parse_sessions(self) -> 'ParseSessionQuerySet':
+        return ParseSession.objects.filter(parse_file__batch=self)
+
+    def get_latest_sessions(self) -> List[Tuple[ParseFile, Optional['ParseSession']]]:
+        """Файлы пакета и последняя сессия разделения каждого из них."""
+        parse_files = list(self.parse_files.order_by('pk'))
+        latest_sessions = {}
+        for parse_session in self.get_parse_sessions().defer('page_names').order_by('pk'):
+            latest_sessions[parse_session.parse_file_id] = parse_session
+        return [(parse_file, latest_sessions.get(parse_file.pk)) for parse_file in parse_files]
+
+    @property
+    def is_finished(self) -> bool:
+        """Все файлы пакета разделены."""
+        latest_sessions = self.get_latest_sessions()
+        return bool(latest_sessions) and all(parse_session is not None and parse_session.is_finished
+                                             for _, parse_session in latest_sessions)
+
+    def iter_archive_parts(self) -> Iterator[Tuple[str, Iterator[Tuple[str, bytes]]]]:
+        """Папки общего архива пакета с сертификатами успешно разделенных файлов."""
+        folder_counts: Dict[str, int] = {}
+        for _, parse_session in self.get_latest_sessions():
+            if parse_session is None or parse_session.status != ParseSession.Status.DONE:
+                continue
+            # Одинаковые файлы пакета с одной калибровкой получают папки с порядковым номером
+            folder = os.path.splitext(parse_session.archive_name)[0]
+            folder_key = folder.casefold()
+            folder_counts[folder_key] = folder_counts.get(folder_key, 0) + 1
+            if folder_counts[folder_key] > 1:
+                folder = f'{folder}_{folder_counts[folder_key] - 1}'
+            yield folder, parse_session.iter_certificates()
+
+    @property
+    def archive_name(self) -> str:
+        """Название общего архива пакета для скачивания."""
+        return f'{self.certificate_type.slug}_batch_{self.pk}.zip'
+
+    def __str__(self):
+        return f'{self.certificate_type} - {self.created_at:%d.%m.%Y %H:%M}'
+
+
+class ParseSessionQuerySet(models.QuerySet):
+
+    def claim_next(self) -> Optional['ParseSession']:
+        """Забирает из очереди следующую сессию разделения.
+
+        Сессия переводится в статус выполнения условным обновлением,
+        поэтому одну сессию не заберут несколько обработчиков одновременно.
+        """
+        queued_ids = self.filter(status=ParseSession.Status.QUEUED).order_by('pk').values_list('pk', flat=True)
+        for parse_session_id in queued_ids[:10]:
+            now = timezone.now()
+            is_claimed = self.filter(pk=parse_session_id, status=ParseSession.Status.QUEUED).update(
+                status=ParseSession.Status.RUNNING,
+                started_at=now,
+                heartbeat_at=now,
+                pages_processed=0,
+                claim_token=uuid.uuid4(),
+            )
+            if is_claimed:
+                return self.get(pk=parse_session_id)
+        return None
+
+    def requeue_stale(self, timeout: timedelta) -> int:
+        """Возвращает в очередь сессии, обработчик которых не обновлял прогресс дольше timeout.
+
+        Такие сессии остаются от упавших обработчиков и при следующем запуске
+        продолжаются с последней зафиксированной страницы.
+        """
+        return self.filter(
+            status=ParseSession.Status.RUNNING,
+            heartbeat_at__lt=timezone.now() - timeout,
+        ).update(status=ParseSession.Status.QUEUED, started_at=None)
+
+
+class SessionLostError(Exception):
+    """Сессию вернули в очередь и забрал другой обработчик."""
+
+
 class ParseSession(models.Model):
 
+    PROGRESS_UPDATE_INTERVAL = 1
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
+    class CalibrationMode(models.TextChoices):
+        OFFSET = 'offset', 'По смещению символа'
+        LAYOUT = 'layout', 'По расположению на странице'
+        REGION = 'region', 'По выделенной области'
+
+    class Profiler(models.TextChoices):
+        NONE = '', 'Без профилирования'
+        CPROFILE = 'cprofile', 'cProfile'
+        SAMPLING = 'sampling', 'Сэмплирующий'
+
     parse_file = models.ForeignKey('ParseFile', on_delete=models.CASCADE,
                                    related_name='parse_sessions', verbose_name='Файл с сертификатами')
     start_with = models.IntegerField(verbose_name='Начало имени в сертификате',
                                      validators=[MinValueValidator(0)])
-    certificates = models.FileField(upload_to='certificates', verbose_name='Архив с сертификатами')
+    calibration_mode = models.CharField(max_length=16, choices=CalibrationMode.choices,
+                                        default=CalibrationMode.OFFSET, verbose_name='Режим калибровки')
+    name_region = models.JSONField(default=list, blank=True,
+                                   verbose_name='Область имени в долях страницы [x0, y0, x1, y1]')
+    certificates = models.FileField(upload_to='certificates', blank=True, verbose_name='Архив с сертификатами')
+    page_names = models.JSONField(default=list, blank=True, verbose_name='Имена сертификатов по страницам')
+
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED,
+                              verbose_name='Статус')
+    pages_total = models.PositiveIntegerField(default=0, verbose_name='Всего страниц')
+    pages_processed = models.PositiveIntegerField(default=0, verbose_name='Обработано страниц')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Создана')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начата')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершена')
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='Последнее обновление прогресса')
+    # Меняется при каждом получении сессии из очереди, по нему обработчик проверяет, что сессия еще его
+    claim_token = models.UUIDField(null=True, blank=True, editable=False, verbose_name='Метка обработчика')
+
+    profiler = models.CharField(max_length=16, choices=Profiler.choices, default=Profiler.NONE, blank=True,
+                                verbose_name='Профилировщик')
+    profile_stats = models.FileField(upload_to='profiles', blank=True, verbose_name='Статистика pstats')
+    profile_stacks = models.FileField(upload_to='profiles', blank=True, verbose_name='Свернутые стеки вызовов')
+
+    objects = ParseSessionQuerySet.as_manager()
 
     class Meta:
-        unique_together = ['parse_file_id', 'start_with']
+        unique_together = ['parse_file_id', 'start_with', 'calibration_mode', 'name_region']
 
     def get_absolute_url(self) -> str:
         return reverse('parse-session-create', kwargs={
@@ -117,14 +522,310 @@ class ParseSession(models.Model):
             'pk': self.parse_file.pk,
         })
 
-    def save(self, *args, **kwargs):
-        if not self.certificates:
-            certificates_archive = SplitCertificatesService(
-                pdf_file=self.parse_file.file.file,
+    def clean(self):
+        if self.calibration_mode == self.CalibrationMode.REGION and not self._is_valid_region(self.name_region):
+            raise ValidationError({'name_region': 'Выделите область с именем на изображении сертификата'})
+        if self.calibration_mode != self.CalibrationMode.REGION:
+            self.name_region = []
+
+    @staticmethod
+    def _is_valid_region(region) -> bool:
+        if not isinstance(region, list) or len(region) != 4 \
+                or not all(isinstance(value, (int, float)) for value in region):
+            return False
+        x0, y0, x1, y1 = region
+        return 0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.Status.DONE, self.Status.FAILED)
+
+    @property
+    def eta(self) -> Optional[timedelta]:
+        """Оставшееся время разделения, оцененное по скорости обработки страниц."""
+        if self.status != self.Status.RUNNING or not self.started_at or not self.pages_processed:
+            return None
+        elapsed = timezone.now() - self.started_at
+        return elapsed / self.pages_processed * (self.pages_total - self.pages_processed)
+
+    def requeue(self) -> None:
+        """Возвращает сессию в очередь."""
+        self.status = self.Status.QUEUED
+        self.pages_processed = 0
+        self.error = ''
+        self.started_at = None
+        self.finished_at = None
+        self.save(update_fields=['status', 'pages_processed', 'error', 'started_at', 'finished_at'])
+
+    def split_certificates(self) -> None:
+        """Разделяет файл на сертификаты, сохраняя прогресс выполнения."""
+        last_update = 0
+
+        def update_progress(pages_processed: int, pages_total: int) -> None:
+            nonlocal last_update
+            now = time.monotonic()
+            if pages_processed < pages_total and now - last_update < self.PROGRESS_UPDATE_INTERVAL:
+                return
+            last_update = now
+            self.pages_processed, self.pages_total = pages_processed, pages_total
+            is_owned = self._filter_owned().update(
+                pages_processed=pages_processed,
+                pages_total=pages_total,
+                heartbeat_at=timezone.now(),
+            )
+            # Прекращает запись в архив, который теперь дописывает другой обработчик
+            if not is_owned:
+                raise SessionLostError(f'Сессию {self.pk} обрабатывает другой обработчик')
+
+        def save_checkpoints(checkpoints: List[dict]) -> None:
+            if not self._filter_owned().exists():
+                raise SessionLostError(f'Сессию {self.pk} обрабатывает другой обработчик')
+            SplitCheckpoint.objects.bulk_create([
+                SplitCheckpoint(parse_session=self, **checkpoint) for checkpoint in checkpoints
+            ])
+
+        file_hash = self.parse_file.get_file_hash()
+        parser_backend = self.parse_file.get_parser_backend()
+        cached_pages = PageText.objects.get_pages(file_hash, parser_backend)
+        profiler_name = self.profiler or settings.SPLIT_PROFILER
+        profiler = create_profiler(profiler_name, settings.SPLIT_PROFILER_INTERVAL) if profiler_name else None
+        if profiler:
+            profiler.start()
+        parsed_pages = None
+        try:
+            with self._send_heartbeats():
+                parsed_pages = self._split(update_progress, save_checkpoints, cached_pages, parser_backend)
+        except TikaError as e:
+            # Файл разделяется бэкендом, которым калибровался, даже если в настройках выбран другой
+            self.status = self.Status.FAILED
+            self.error = (f'Файл калибровался бэкендом {parser_backend}, но сервер Tika недоступен: {e}. '
+                          f'Запустите сервер Tika (docker-compose --profile tika) или загрузите файл заново')
+        except Exception as e:
+            self.status = self.Status.FAILED
+            self.error = str(e)
+        else:
+            self.status = self.Status.DONE
+        finally:
+            if profiler:
+                profiler.stop()
+            self.parse_file.file.close()
+
+        with transaction.atomic():
+            # Результат сохраняется, только если сессию не вернули в очередь и не забрал другой обработчик
+            if not self._filter_owned().select_for_update().exists():
+                logger.warning(f'Сессия {self.pk} возвращена в очередь во время разделения, результат не сохранен')
+                return
+            if profiler:
+                self._save_profile(profiler)
+            self.finished_at = timezone.now()
+            self.save(update_fields=['certificates', 'page_names', 'status', 'error', 'pages_processed',
+                                     'pages_total', 'finished_at', 'profile_stats', 'profile_stacks'])
+        if self.status == self.Status.DONE and cached_pages is None and parsed_pages is not None:
+            self._cache_pages(file_hash, parsed_pages, parser_backend)
+
+    def _split(self, update_progress: Callable[[int, int], None], save_checkpoints: Callable[[List[dict]], None],
+               cached_pages: Optional[List[str]], parser_backend: str) -> Optional[List[str]]:
+        """Разделяет файл и возвращает текст страниц, если он извлекался."""
+        if settings.CERTIFICATES_ARCHIVE_MODE == 'stream':
+            service = CertificateNamesService(
+                pdf_file=FileHelper.get_pdf_source(self.parse_file.file.open('rb')),
                 name_position=self.start_with,
-            )()
-            self.certificates.name = os.path.relpath(certificates_archive, settings.MEDIA_ROOT)
-        super().save(*args, **kwargs)
+                parsed_pages=cached_pages,
+                calibration_mode=self.calibration_mode,
+                name_region=self.name_region,
+                parser_backend=parser_backend,
+            )
+            self.page_names = service()
+            update_progress(len(self.page_names), len(self.page_names))
+            return service.parsed_pages
+
+        service = SplitCertificatesService(
+            pdf_file=self.parse_file.file.open('rb'),
+            name_position=self.start_with,
+            progress_callback=update_progress,
+            parsed_pages=cached_pages,
+            archive_path=self.archive_path,
+            checkpoints=self._get_checkpoints(),
+            checkpoint_callback=save_checkpoints,
+            calibration_mode=self.calibration_mode,
+            name_region=self.name_region,
+            parser_backend=parser_backend,
+        )
+        certificates_archive = service()
+        self.page_names = service.page_names
+        self.certificates.name = os.path.relpath(certificates_archive, settings.MEDIA_ROOT)
+        self.checkpoints.all().delete()
+        return service.parsed_pages
+
+    def _filter_owned(self) -> models.QuerySet:
+        """Сессия, если ее не забрал из очереди другой обработчик."""
+        return ParseSession.objects.filter(pk=self.pk, claim_token=self.claim_token)
+
+    @contextmanager
+    def _send_heartbeats(self) -> Iterator[None]:
+        """Подтверждает в фоновом потоке, что сессия выполняется.
+
+        Извлечение текста всего документа или медленный ответ Tika не вызывают
+        обновление прогресса, поэтому без подтверждений долгий этап мог бы
+        превысить SPLIT_HEARTBEAT_TIMEOUT и сессию забрал бы другой обработчик.
+        """
+        stopped = threading.Event()
+
+        def send_heartbeats() -> None:
+            try:
+                while not stopped.wait(settings.SPLIT_HEARTBEAT_INTERVAL):
+                    try:
+                        self._filter_owned().update(heartbeat_at=timezone.now())
+                    except DatabaseError as e:
+                        logger.warning(f'Не удалось подтвердить выполнение сессии {self.pk}: {e}')
+            finally:
+                # Поток использует собственное соединение с базой данных
+                connection.close()
+
+        thread = threading.Thread(target=send_heartbeats, name=f'heartbeat-{self.pk}', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    @staticmethod
+    def _cache_pages(file_hash: str, parsed_pages: List[str], parser_backend: str) -> None:
+        """Сохраняет текст страниц в кэш. Ошибка кэша не влияет на результат разделения."""
+        try:
+            PageText.objects.save_pages(file_hash, parsed_pages, parser_backend)
+        except DatabaseError as e:
+            logger.warning(f'Текст страниц {file_hash} не сохранен в кэш: {e}')
+
+    def _save_profile(self, profiler: BaseProfiler) -> None:
+        """Сохраняет результат профилирования рядом с сессией, заменяя прошлый."""
+        for field_file, content, extension in (
+            (self.profile_stats, profiler.get_stats(), 'pstats'),
+            (self.profile_stacks, profiler.get_collapsed(), 'collapsed'),
+        ):
+            field_file.delete(save=False)
+            if content is not None:
+                field_file.save(f'session_{self.pk}.{extension}', ContentFile(content), save=False)
+
+    @property
+    def archive_path(self) -> str:
+        """Путь к архиву сессии, недописанный архив хранится рядом с суффиксом .part."""
+        return str(SplitCertificatesService.ARCHIVE_SAVE_PATH / f'session_{self.pk}.zip')
+
+    def _get_checkpoints(self) -> List[dict]:
+        """Зафиксированные при прошлом запуске страницы, если недописанный архив сохранился."""
+        checkpoints = list(self.checkpoints.order_by('page_index').values(
+            'page_index', 'name', 'header_offset', 'end_offset', 'zip_info',
+        ))
+        part_path = f'{self.archive_path}.part'
+        is_consistent = all(checkpoint['page_index'] == i for i, checkpoint in enumerate(checkpoints)) \
+            and os.path.exists(part_path) \
+            and (not checkpoints or os.path.getsize(part_path) >= checkpoints[-1]['end_offset'])
+        if checkpoints and not is_consistent:
+            self.checkpoints.all().delete()
+            return []
+        return checkpoints
+
+    def iter_certificates(self) -> Iterator[Tuple[str, bytes]]:
+        """Имена и содержимое сертификатов разделенной сессии."""
+        if self.certificates:
+            yield from iter_archive_certificates(self.certificates.path)
+            return
+        with self.parse_file.file.open('rb') as pdf_file:
+            yield from iter_pdf_certificates(FileHelper.get_pdf_source(pdf_file), self.page_names)
+
+    @property
+    def archive_name(self) -> str:
+        """Название архива с сертификатами для скачивания."""
+        suffix = '' if self.calibration_mode == self.CalibrationMode.OFFSET else f'_{self.calibration_mode}'
+        return f'{os.path.splitext(self.parse_file.file_name)[0]}_{self.start_with}{suffix}.zip'
+
+    def __str__(self):
+        return f'{self.parse_file.file_name} - {self.start_with} ({self.get_calibration_mode_display()})'
+
+
+class SplitCheckpoint(models.Model):
+    """Страница, записанная в недописанный архив сессии разделения."""
+
+    parse_session = models.ForeignKey('ParseSession', on_delete=models.CASCADE,
+                                      related_name='checkpoints', verbose_name='Сессия разделения')
+    page_index = models.PositiveIntegerField(verbose_name='Номер страницы')
+    name = models.CharField(max_length=255, verbose_name='Имя сертификата')
+    header_offset = models.PositiveBigIntegerField(verbose_name='Смещение заголовка в архиве')
+    end_offset = models.PositiveBigIntegerField(verbose_name='Смещение конца записи в архиве')
+    zip_info = models.JSONField(verbose_name='Поля заголовка записи')
+
+    class Meta:
+        verbose_name = 'Записанная страница'
+        verbose_name_plural = 'Записанные страницы'
+        unique_together = ['parse_session', 'page_index']
+
+    def __str__(self):
+        return f'{self.parse_session_id} - {self.page_index}'
+
+
+class PageTextQuerySet(models.QuerySet):
+
+    def get_pages(self, source_hash: str, backend: Optional[str] = None) -> Optional[List[str]]:
+        """Возвращает закэшированный текст всех страниц документа или None."""
+        pages = self.filter(source_hash=source_hash, backend=backend or settings.PDF_PARSER_BACKEND)
+        parsed_pages = list(pages.order_by('page_index').values_list('text', flat=True))
+        if not parsed_pages:
+            return None
+        pages.update(used_at=timezone.now())
+        return parsed_pages
+
+    def save_pages(self, source_hash: str, parsed_pages: List[str], backend: Optional[str] = None) -> None:
+        """Сохраняет текст всех страниц документа."""
+        backend = backend or settings.PDF_PARSER_BACKEND
+        with transaction.atomic():
+            self.filter(source_hash=source_hash, backend=backend).delete()
+            # Тот же документ может одновременно сохранять другой обработчик, текст страниц у них совпадает
+            self.bulk_create([
+                PageText(source_hash=source_hash, backend=backend,
+                         page_index=page_index, text=text, size=len(text))
+                for page_index, text in enumerate(parsed_pages)
+            ], batch_size=500, ignore_conflicts=True)
+
+    def evict(self, max_age: timedelta, max_size: int) -> int:
+        """Удаляет документы, не использовавшиеся дольше max_age,
+        и самые давно использованные документы сверх max_size символов.
+        """
+        deleted, _ = self.filter(used_at__lt=timezone.now() - max_age).delete()
+
+        documents = self.values('source_hash', 'backend').annotate(
+            document_size=Sum('size'),
+            last_used_at=Max('used_at'),
+        ).order_by('-last_used_at')
+        total_size = 0
+        for document in documents:
+            total_size += document['document_size']
+            if total_size > max_size:
+                document_deleted, _ = self.filter(
+                    source_hash=document['source_hash'],
+                    backend=document['backend'],
+                ).delete()
+                deleted += document_deleted
+        return deleted
+
+
+class PageText(models.Model):
+    """Закэшированный текст страницы pdf документа."""
+
+    source_hash = models.CharField(max_length=64, db_index=True, verbose_name='SHA-256 документа')
+    backend = models.CharField(max_length=255, verbose_name='Бэкенд извлечения текста')
+    page_index = models.PositiveIntegerField(verbose_name='Номер страницы')
+    text = models.TextField(blank=True, verbose_name='Текст страницы')
+    size = models.PositiveIntegerField(default=0, verbose_name='Длина текста')
+    used_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name='Последнее использование')
+
+    objects = PageTextQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Текст страницы'
+        verbose_name_plural = 'Тексты страниц'
+        unique_together = ['source_hash', 'backend', 'page_index']
 
     def __str__(self):
-        return f'{self.parse_file.file_name} - {self.start_with}'
+        return f'{self.source_hash[:12]} - {self.page_index}'
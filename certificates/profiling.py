@@ -0,0 +1,180 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from types import FrameType
+from typing import Dict, Optional, Tuple
+
+
+# Функция в статистике cProfile: (файл, строка, название)
+Function = Tuple[str, int, str]
+
+
+class BaseProfiler:
+    """Профилировщик задания.
+
+    Используется как контекстный менеджер вокруг профилируемого кода. Результат
+    сохраняется в виде свернутых стеков (collapsed stacks), из которых
+    flamegraph.pl и speedscope строят флеймграф, а cProfile дополнительно
+    сохраняет статистику pstats.
+    """
+
+    def __enter__(self) -> 'BaseProfiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        raise NotImplementedError
+
+    def get_stats(self) -> Optional[bytes]:
+        """Статистика в формате pstats, если профилировщик ее собирает."""
+        return None
+
+    def get_collapsed_stacks(self) -> Dict[str, int]:
+        """Вес каждого стека вызовов, функции стека разделены точкой с запятой."""
+        raise NotImplementedError
+
+    def get_collapsed(self) -> bytes:
+        stacks = self.get_collapsed_stacks()
+        return ''.join(f'{stack} {weight}\n' for stack, weight in sorted(stacks.items()) if weight).encode('utf-8')
+
+    @staticmethod
+    def format_function(filename: str, line: int, name: str) -> str:
+        # Точка с запятой и пробел разделяют стек и вес в строке свернутого стека
+        label = f'{os.path.basename(filename)}:{line}:{name}' if filename != '~' else name
+        return label.replace(';', ':').replace(' ', '_')
+
+
+class CProfileProfiler(BaseProfiler):
+    """Детерминированный профилировщик cProfile.
+
+    Учитывает каждый вызов в потоке, запустившем профилирование. Свернутые
+    стеки восстанавливаются из графа вызовов pstats: время функции делится
+    между вызвавшими ее функциями пропорционально времени вызовов из них, поэтому
+    веса стеков - оценка в микросекундах.
+    """
+
+    MIN_STACK_TIME = 1e-5
+
+    def __init__(self) -> None:
+        self.profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self.profile.enable()
+
+    def stop(self) -> None:
+        self.profile.disable()
+
+    def get_stats(self) -> bytes:
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+    def get_collapsed_stacks(self) -> Dict[str, int]:
+        stats = pstats.Stats(self.profile).stats
+        callees: Dict[Function, Dict[Function, float]] = {function: {} for function in stats}
+        for function, (_, _, _, _, callers) in stats.items():
+            for caller, (_, _, _, caller_cumulative_time) in callers.items():
+                if caller in callees:
+                    callees[caller][function] = caller_cumulative_time
+
+        stacks: Dict[str, int] = Counter()
+        roots = [function for function, (_, _, _, _, callers) in stats.items() if not callers]
+        for root in roots:
+            self._collapse(stats, callees, root, [], 1, stacks)
+        return stacks
+
+    def _collapse(self, stats: dict, callees: Dict[Function, Dict[Function, float]], function: Function,
+                  stack: list, share: float, stacks: Dict[str, int]) -> None:
+        _, _, total_time, cumulative_time, _ = stats[function]
+        # Ветви, на которые приходится меньше MIN_STACK_TIME, отбрасываются, чтобы
+        # перебор путей в плотном графе вызовов не рос неограниченно
+        if cumulative_time * share < self.MIN_STACK_TIME:
+            return
+        stack = stack + [function]
+        stacks[';'.join(self.format_function(*frame) for frame in stack)] += round(total_time * share * 1e6)
+        for callee, edge_time in callees[function].items():
+            # Рекурсивные вызовы уже учтены во времени функции выше по стеку
+            if callee in stack or not edge_time:
+                continue
+            callee_cumulative_time = stats[callee][3]
+            self._collapse(stats, callees, callee, stack,
+                           share * min(edge_time / callee_cumulative_time, 1) if callee_cumulative_time else 0,
+                           stacks)
+
+
+class SamplingProfiler(BaseProfiler):
+    """Сэмплирующий профилировщик.
+
+    Фоновый поток каждые interval секунд записывает стеки всех остальных потоков
+    процесса. Накладные расходы не зависят от числа вызовов, а вес стека равен
+    числу попавших в него замеров. Статистика pstats не собирается.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.stacks: Dict[str, int] = Counter()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def get_collapsed_stacks(self) -> Dict[str, int]:
+        return self.stacks
+
+    def _sample_loop(self) -> None:
+        own_thread_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_thread_id:
+                    self.stacks[self._format_stack(thread_names.get(thread_id, str(thread_id)), frame)] += 1
+
+    def _format_stack(self, thread_name: str, frame: FrameType) -> str:
+        frames = []
+        while frame is not None:
+            frames.append(self.format_function(frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name))
+            frame = frame.f_back
+        return ';'.join([self.format_function('~', 0, thread_name), *reversed(frames)])
+
+
+def create_profiler(name: str, interval: float) -> BaseProfiler:
+    """Профилировщик по названию: cprofile или sampling."""
+    if name == 'cprofile':
+        return CProfileProfiler()
+    if name == 'sampling':
+        return SamplingProfiler(interval=interval)
+    raise ValueError(f'Неизвестный профилировщик {name}')
+
+
+def format_stats(stats: bytes, sort_by: str = 'cumulative', limit: int = 50) -> str:
+    """Отчет pstats по самым долгим функциям."""
+    report = io.StringIO()
+    profile_stats = pstats.Stats(stream=report)
+    profile_stats.stats = marshal.loads(stats)
+    profile_stats.get_top_level_stats()
+    profile_stats.sort_stats(sort_by).print_stats(limit)
+    return report.getvalue()
+
+
+def format_collapsed(collapsed: bytes, limit: int = 50) -> str:
+    """Самые тяжелые свернутые стеки."""
+    lines = [line.rpartition(' ') for line in collapsed.decode('utf-8').splitlines()]
+    lines.sort(key=lambda line: int(line[2]), reverse=True)
+    return ''.join(f'{weight} {stack}\n' for stack, _, weight in lines[:limit])
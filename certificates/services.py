@@ -1,68 +1,302 @@
+import asyncio
+import collections
+import functools
 import io
 import logging
+import mmap
 import os
-import shutil
+import threading
+import time
 import uuid
-from pathlib import Path
-from typing import Tuple, BinaryIO
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Tuple, BinaryIO, List, Callable, Optional, Iterator, Sequence, Iterable, Union
 
+from PIL import Image
 from PyPDF2 import PdfFileWriter, PdfFileReader
 from django.conf import settings
-from tika import parser
+from django.utils.module_loading import import_string
+from pdfminer.high_level import extract_pages
+from pdfminer.layout import LTTextContainer
+from requests.adapters import HTTPAdapter
 
 import fitz
-import tika
+import requests
 
 from certificates.decorators import exception_logging
-from certificates.helpers import FileHelper
+from certificates.helpers import FileHelper, NameRegistry, PdfSource
+from certificates.metrics import JobMetrics, TIKA_REQUEST_DURATION
 
 
 logger = logging.getLogger(__name__)
-tika.TikaClientOnly = True
+
+ARCHIVE_COMPRESSION_METHODS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflated': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
 
 
 class CalibrationDataService:
     """Сервис получения калибровочных данных."""
 
-    IMAGE_SAVE_PATH = settings.MEDIA_ROOT / 'tmp/calibration_images/'
-
     def __init__(self, pdf_file: BinaryIO) -> None:
         self.pdf_file = pdf_file
+        self.job_metrics: Optional[JobMetrics] = None
 
     @exception_logging(logger=logger)
-    def __call__(self) -> Tuple[str, int, str]:
-        input_pdf = PdfFileReader(self.pdf_file)
-        pdf_with_first_page = PdfFileWriter()
-        pdf_with_first_page.addPage(input_pdf.getPage(0))
+    def __call__(self) -> Tuple[str, int]:
+        self.job_metrics = JobMetrics(service='calibration')
+        status = 'failed'
+        try:
+            with self.job_metrics.stage('read'):
+                document = FileHelper.open_pdf_document(self.pdf_file)
+            try:
+                with self.job_metrics.stage('parse'):
+                    parsed_pdf = ParseDocumentPageService(document=document, page_index=0)()
+            finally:
+                document.close()
+            with self.job_metrics.stage('name'):
+                start_with_auto = FileHelper.get_first_alpha_from_string(parsed_pdf)
+            status = 'done'
+        finally:
+            self.job_metrics.finish(status)
+
+        return parsed_pdf, start_with_auto
+
+
+class BatchCalibrationService:
+    """Сервис получения калибровочных данных нескольких файлов.
+
+    Файлы калибруются одновременно в пуле из BATCH_WORKERS потоков. Для
+    каждого файла возвращаются калибровочные данные либо исключение, поэтому
+    ошибка в одном файле не прерывает калибровку остальных.
+    """
+
+    def __init__(self, pdf_files: Sequence[BinaryIO]) -> None:
+        self.pdf_files = pdf_files
+
+    def __call__(self) -> List[Union[Tuple[str, int], Exception]]:
+        with ThreadPoolExecutor(max_workers=settings.BATCH_WORKERS) as executor:
+            futures = [executor.submit(CalibrationDataService(pdf_file=pdf_file)) for pdf_file in self.pdf_files]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class CalibrationImageService:
+    """Сервис получения изображения первой страницы для калибровки.
+
+    Изображение рендерится при первом запросе и кэшируется на диске по
+    SHA-256 документа, разрешению, ширине и формату.
+    """
+
+    IMAGE_SAVE_PATH = settings.MEDIA_ROOT / 'calibration_images/'
+    IMAGE_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+    def __init__(self, pdf_file: BinaryIO, file_hash: str, width: int, image_format: str, dpi: int) -> None:
+        self.pdf_file = pdf_file
+        self.file_hash = file_hash
+        self.width = width
+        self.image_format = image_format
+        self.dpi = dpi
+
+    @exception_logging(logger=logger)
+    def __call__(self) -> str:
+        image_path = self.IMAGE_SAVE_PATH / self.file_hash / f'{self.dpi}_{self.width}.{self.image_format}'
+        if image_path.exists():
+            return str(image_path)
+
+        document = FileHelper.open_pdf_document(self.pdf_file)
+        try:
+            zoom = self.dpi / 72
+            pix = document.loadPage(0).getPixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        finally:
+            document.close()
+
+        image = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+        if image.width > self.width:
+            image = image.resize((self.width, round(image.height * self.width / image.width)), Image.LANCZOS)
+
+        image_path.parent.mkdir(parents=True, exist_ok=True)
+        # Изображение записывается во временный файл, чтобы параллельный запрос не отдал его недописанным
+        tmp_path = image_path.with_name(f'{uuid.uuid4()}.tmp')
+        image.save(tmp_path, format=self.IMAGE_FORMATS[self.image_format],
+                   quality=settings.CALIBRATION_IMAGE_QUALITY)
+        os.replace(tmp_path, image_path)
+        return str(image_path)
+
 
-        buffer = io.BytesIO()
-        pdf_with_first_page.write(buffer)
-        parsed_pdf = ParsePdfService(pdf_file=buffer.getvalue())()
+class CertificateNamesService:
+    """Сервис получения уникальных имен файлов сертификатов по страницам документа.
 
-        start_with_auto = FileHelper.get_first_alpha_from_string(parsed_pdf)
+    В режиме калибровки offset имя берется из текста каждой страницы с
+    символа name_position, в режиме layout - строкой, найденной
+    LayoutNameLocatorService по образцу первой страницы, в режиме region -
+    текстом из области name_region каждой страницы.
 
-        calibration_certificate_path = self._save_first_pdf_page_to_image(
-            pdf_file=buffer.getvalue(),
+    Текст извлекается бэкендом parser_backend, которым калибровался файл:
+    смещение имени зависит от того, как бэкенд располагает текст страницы.
+    """
+
+    def __init__(self, pdf_file: PdfSource, name_position: int, parsed_pages: Optional[List[str]] = None,
+                 calibration_mode: str = 'offset', name_region: Optional[Sequence[float]] = None,
+                 parser_backend: Optional[str] = None) -> None:
+        self.pdf_file = pdf_file
+        self.name_position = name_position
+        self.parser_backend = parser_backend
+        self.parsed_pages = parsed_pages
+        self.calibration_mode = calibration_mode
+        self.name_region = name_region
+
+    def __call__(self) -> List[str]:
+        name_registry = self.create_name_registry()
+        if self.calibration_mode == 'region':
+            region_names = RegionNameExtractorService(pdf_file=self.pdf_file, region=self.name_region)()
+            return [self._get_unique_name(name, name_registry, page_index)
+                    for page_index, name in enumerate(region_names)]
+        if self.calibration_mode == 'layout':
+            located_names = LayoutNameLocatorService(
+                pdf_file=self.pdf_file,
+                reference_name=FileHelper.trim_string_to_newline(self._get_first_page(), self.name_position),
+            )()
+            return [self._get_unique_name(name, name_registry, page_index)
+                    for page_index, name in enumerate(located_names)]
+
+        if self.parsed_pages is None:
+            self.parsed_pages = ParsePdfPagesService(pdf_file=self.pdf_file, backend=self.parser_backend)()
+        return [self.get_page_name(parsed_document, name_registry, page_index)
+                for page_index, parsed_document in enumerate(self.parsed_pages)]
+
+    @staticmethod
+    def create_name_registry(used_names: Iterable[str] = ()) -> NameRegistry:
+        """Реестр имен архива со стратегией разрешения совпадений из настроек."""
+        return NameRegistry(used_names=used_names, strategy=settings.CERTIFICATE_NAME_COLLISION_STRATEGY)
+
+    def get_page_name(self, parsed_page: str, name_registry: NameRegistry, page_index: int) -> str:
+        """Возвращает уникальное имя файла сертификата по тексту страницы."""
+        certificate_name = FileHelper.trim_string_to_newline(
+            string=parsed_page,
+            trim_from=self.name_position,
         )
-        buffer.seek(0)
+        return self._get_unique_name(certificate_name, name_registry, page_index)
+
+    @staticmethod
+    def _get_unique_name(certificate_name: str, name_registry: NameRegistry, page_index: int) -> str:
+        return name_registry.allocate(FileHelper.format_file_name(certificate_name), page_index)
+
+    def _get_first_page(self) -> str:
+        """Текст первой страницы, по которому калибровалось смещение имени."""
+        if self.parsed_pages:
+            return self.parsed_pages[0]
+        document = FileHelper.open_pdf_source(self.pdf_file)
+        try:
+            return ParseDocumentPageService(document=document, page_index=0, backend=self.parser_backend)()
+        finally:
+            document.close()
+
 
-        return parsed_pdf, start_with_auto, calibration_certificate_path
+class RegionNameExtractorService:
+    """Сервис извлечения имени из заданной области каждой страницы.
+
+    Область задается долями ширины и высоты страницы [x0, y0, x1, y1],
+    поэтому не зависит от разрешения изображения для калибровки. Текст
+    извлекается только внутри области, строки объединяются через пробел.
+    """
+
+    def __init__(self, pdf_file: PdfSource, region: Sequence[float]) -> None:
+        self.pdf_file = pdf_file
+        self.region = region
+
+    def __call__(self) -> List[str]:
+        x0, y0, x1, y1 = self.region
+        document = FileHelper.open_pdf_source(self.pdf_file)
+        try:
+            names = []
+            for page in document:
+                width, height = page.rect.width, page.rect.height
+                clip = fitz.Rect(x0 * width, y0 * height, x1 * width, y1 * height)
+                names.append(' '.join(page.getText('text', clip=clip).split()))
+            return names
+        finally:
+            document.close()
+
+
+class LayoutNameLocatorService:
+    """Сервис поиска имени на всех страницах по расположению и размеру шрифта.
+
+    Образцом служит строка первой страницы, содержащая reference_name. На
+    каждой странице выбирается строка, ближе всего к образцу по положению и
+    размеру шрифта, поэтому длина текста перед именем на результат не влияет.
+    Строки всех страниц извлекаются за один проход по документу.
+    """
+
+    # Вес отличия размера шрифта в пунктах относительно расстояния в размерах шрифта образца
+    FONT_SIZE_WEIGHT = 2
+
+    def __init__(self, pdf_file: PdfSource, reference_name: str) -> None:
+        self.pdf_file = pdf_file
+        self.reference_name = ' '.join(reference_name.split())
 
-    def _save_first_pdf_page_to_image(self, pdf_file: bytes) -> str:
-        document = fitz.open(stream=pdf_file, filetype="pdf")
-        page = document.loadPage(0)
-        pix = page.getPixmap()
+    def __call__(self) -> List[str]:
+        document = FileHelper.open_pdf_source(self.pdf_file)
+        try:
+            pages_lines = [self._get_lines(page) for page in document]
+        finally:
+            document.close()
 
-        image_name = str(uuid.uuid4())
-        full_path = self.IMAGE_SAVE_PATH / f'{image_name}.png'
-        image_path = FileHelper.generate_name(full_path=str(full_path), save_path=str(self.IMAGE_SAVE_PATH),
-                                              file_name=image_name, file_extension='png')
+        reference = self._find_reference(pages_lines[0])
+        # Постоянный текст перед именем в строке образца, например «Выдан:»
+        prefix = reference['text'][:reference['text'].find(self.reference_name)]
+        names = []
+        for lines in pages_lines:
+            line = min(lines, key=lambda candidate: self._get_distance(candidate, reference), default=None)
+            name = line['text'] if line else ''
+            names.append(name[len(prefix):] if prefix and name.startswith(prefix) else name)
+        return names
 
-        if not os.path.exists(os.path.dirname(image_path)):
-            Path(image_path).mkdir(parents=True, exist_ok=True)
+    @staticmethod
+    def _get_lines(page: fitz.Page) -> List[dict]:
+        """Строки страницы с текстом, координатами и размером шрифта."""
+        lines = []
+        for block in page.getText('dict')['blocks']:
+            for line in block.get('lines', []):
+                spans = [span for span in line['spans'] if span['text'].strip()]
+                text = ' '.join(''.join(span['text'] for span in spans).split())
+                if not any(map(str.isalpha, text)):
+                    continue
+                lines.append({
+                    'text': text,
+                    'bbox': line['bbox'],
+                    'size': max(span['size'] for span in spans),
+                })
+        return lines
 
-        pix.writePNG(image_path)
-        return image_path
+    def _find_reference(self, lines: List[dict]) -> dict:
+        if self.reference_name:
+            for line in lines:
+                if self.reference_name in line['text']:
+                    return line
+            for line in lines:
+                if line['text'] in self.reference_name:
+                    return line
+        raise ValueError(f'На первой странице не найдена строка с именем «{self.reference_name}»')
+
+    def _get_distance(self, line: dict, reference: dict) -> float:
+        """Расстояние между строками с учетом выравнивания по левому краю, центру или правому краю."""
+        x0, y0, x1, y1 = line['bbox']
+        reference_x0, reference_y0, reference_x1, reference_y1 = reference['bbox']
+        dx = min(abs(x0 - reference_x0), abs(x1 - reference_x1),
+                 abs((x0 + x1) - (reference_x0 + reference_x1)) / 2)
+        dy = abs((y0 + y1) - (reference_y0 + reference_y1)) / 2
+        return (dx ** 2 + dy ** 2) ** 0.5 / reference['size'] \
+            + self.FONT_SIZE_WEIGHT * abs(line['size'] - reference['size'])
 
 
 class SplitCertificatesService:
@@ -71,60 +305,764 @@ class SplitCertificatesService:
     ARCHIVE_SAVE_PATH = settings.MEDIA_ROOT / 'tmp/certificates/'
     ARCHIVE_EXTENSION = 'zip'
 
-    def __init__(self, pdf_file: BinaryIO, name_position: int) -> None:
+    def __init__(self, pdf_file: BinaryIO, name_position: int,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 parsed_pages: Optional[List[str]] = None,
+                 archive_path: Optional[str] = None,
+                 checkpoints: Optional[List[dict]] = None,
+                 checkpoint_callback: Optional[Callable[[List[dict]], None]] = None,
+                 calibration_mode: str = 'offset',
+                 name_region: Optional[Sequence[float]] = None,
+                 parser_backend: Optional[str] = None) -> None:
         self.pdf_file = pdf_file
         self.name_position = name_position
+        self.calibration_mode = calibration_mode
+        self.name_region = name_region
+        self.parser_backend = parser_backend
+        self.progress_callback = progress_callback
+        self.parsed_pages = parsed_pages
+        self.archive_path = archive_path
+        self.checkpoints = checkpoints or []
+        self.checkpoint_callback = checkpoint_callback
+        self.page_names: List[str] = []
+        self.job_metrics: Optional[JobMetrics] = None
 
     @exception_logging(logger=logger)
     def __call__(self) -> str:
-        input_pdf = PdfFileReader(self.pdf_file)
-        temporary_folder_name = str(uuid.uuid4())
-        save_path = str(self.ARCHIVE_SAVE_PATH / temporary_folder_name)
+        self.job_metrics = JobMetrics(service='split')
+        status = 'failed'
+        try:
+            archive_path = self._split()
+            status = 'done'
+        finally:
+            self.job_metrics.finish(status)
+        return archive_path
+
+    def _split(self) -> str:
+        with self.job_metrics.stage('read'):
+            # Сохраненный на диске файл открывается по пути и не читается в память целиком
+            pdf_source = FileHelper.get_pdf_source(self.pdf_file)
+        self.ARCHIVE_SAVE_PATH.mkdir(parents=True, exist_ok=True)
+
+        if self.archive_path is None:
+            archive_path = str(self.ARCHIVE_SAVE_PATH / f'{uuid.uuid4()}.{self.ARCHIVE_EXTENSION}')
+            try:
+                self._write(zipfile.ZipFile(archive_path, 'w', **get_archive_compression()), pdf_source)
+            except BaseException:
+                os.remove(archive_path)
+                raise
+            return archive_path
+
+        # Недописанный архив при ошибке сохраняется, чтобы продолжить с последней зафиксированной страницы
+        part_path = f'{self.archive_path}.part'
+        self._write(CheckpointedZipFile(part_path, self.checkpoints, self.checkpoint_callback), pdf_source)
+        with self.job_metrics.stage('archive'):
+            os.replace(part_path, self.archive_path)
+        return self.archive_path
+
+    def _write(self, archive: zipfile.ZipFile, pdf_source: PdfSource) -> None:
+        """Записывает сертификаты и закрывает архив."""
+        try:
+            # Имена по расположению и по области находятся без извлечения текста страниц целиком,
+            # поэтому асинхронный конвейер не нужен
+            if settings.SPLIT_PIPELINE == 'async' and self.calibration_mode == 'offset':
+                self._write_certificates_async(archive, pdf_source)
+            else:
+                self._write_certificates(archive, pdf_source)
+        finally:
+            with self.job_metrics.stage('archive'):
+                archive.close()
+
+    def _write_certificates(self, archive: zipfile.ZipFile, pdf_source: PdfSource) -> None:
+        """Дописывает сертификаты в архив по мере их получения."""
+        if self.parsed_pages is None and self.calibration_mode == 'offset':
+            with self.job_metrics.stage('parse'):
+                self.parsed_pages = ParsePdfPagesService(pdf_file=pdf_source, backend=self.parser_backend)()
+        with self.job_metrics.stage('name'):
+            # Для калибровки по расположению и по области сюда входит и поиск имен на страницах
+            self.page_names = CertificateNamesService(
+                pdf_file=pdf_source,
+                name_position=self.name_position,
+                parsed_pages=self.parsed_pages,
+                calibration_mode=self.calibration_mode,
+                name_region=self.name_region,
+                parser_backend=self.parser_backend,
+            )()
+
+        pages_processed = len(self.checkpoints)
+        page_chunks = split_pdf_pages(pdf_source, len(self.page_names), start=pages_processed)
+        for page_range, pages in self.job_metrics.iterate(page_chunks, stage='extract'):
+            for i, single_page_pdf in zip(page_range, pages):
+                with self.job_metrics.stage('write'):
+                    archive.writestr(self.page_names[i], single_page_pdf)
+                self.job_metrics.add_page(len(single_page_pdf))
+
+            pages_processed += len(page_range)
+            if self.progress_callback:
+                self.progress_callback(pages_processed, len(self.page_names))
+
+    def _write_certificates_async(self, archive: zipfile.ZipFile, pdf_source: PdfSource) -> None:
+        """Извлекает текст страниц параллельно и дописывает сертификаты в архив по порядку."""
+        pipeline = AsyncSplitCertificatesService(
+            pdf_source=pdf_source,
+            name_position=self.name_position,
+            archive=archive,
+            progress_callback=self.progress_callback,
+            parsed_pages=self.parsed_pages,
+            written_names=[checkpoint['name'] for checkpoint in self.checkpoints],
+            job_metrics=self.job_metrics,
+            parser_backend=self.parser_backend,
+        )
+        asyncio.run(pipeline())
+        self.page_names = pipeline.page_names
+        self.parsed_pages = pipeline.parsed_pages
+
+
+class AsyncSplitCertificatesService:
+    """Асинхронный конвейер разделения PDF документа на отдельные страницы.
+
+    Текст страниц извлекается одновременно, не более SPLIT_ASYNC_CONCURRENCY
+    запросов к бэкенду сразу. Результаты передаются по очереди в порядке
+    страниц этапу записи, который разрешает имена и дописывает архив,
+    поэтому имена совпадают с последовательным разделением.
+
+    Страницы с именами из written_names уже записаны в архив при прошлом
+    запуске и пропускаются. Их текст неизвестен, если он не передан в
+    parsed_pages, тогда parsed_pages после разделения равен None.
+    """
+
+    def __init__(self, pdf_source: PdfSource, name_position: int, archive: zipfile.ZipFile,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 parsed_pages: Optional[List[str]] = None,
+                 written_names: Optional[List[str]] = None,
+                 job_metrics: Optional[JobMetrics] = None,
+                 parser_backend: Optional[str] = None) -> None:
+        self.pdf_source = pdf_source
+        self.parser_backend = parser_backend
+        self.job_metrics = job_metrics or JobMetrics(service='split')
+        self.archive = archive
+        self.progress_callback = progress_callback
+        self.cached_pages = parsed_pages
+        self.names_service = CertificateNamesService(pdf_file=pdf_source, name_position=name_position,
+                                                     parser_backend=parser_backend)
+        self.page_names: List[str] = list(written_names or [])
+        self.parsed_pages: Optional[List[str]] = parsed_pages[:len(self.page_names)] if parsed_pages else []
+
+    async def __call__(self) -> List[str]:
+        concurrency = settings.SPLIT_ASYNC_CONCURRENCY
+        semaphore = asyncio.Semaphore(concurrency)
+        # Очередь ограничивает число страниц, ожидающих записи в памяти
+        queue = asyncio.Queue(maxsize=concurrency * 2)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            producer = asyncio.ensure_future(self._produce(queue, semaphore, executor))
+            try:
+                await self._write(queue, producer)
+                await producer
+            finally:
+                producer.cancel()
+                while not queue.empty():
+                    item = queue.get_nowait()
+                    if item is not None:
+                        item[2].cancel()
+        if len(self.parsed_pages) < len(self.page_names):
+            self.parsed_pages = None
+        return self.page_names
+
+    async def _produce(self, queue: asyncio.Queue, semaphore: asyncio.Semaphore, executor: ThreadPoolExecutor) -> None:
+        """Сериализует страницы и запускает извлечение их текста."""
+        loop = asyncio.get_running_loop()
+        # Последовательная сериализация хранит открытый документ в состоянии потока,
+        # поэтому генератор страниц продвигается всегда в одном и том же потоке
+        with ThreadPoolExecutor(max_workers=1) as split_executor:
+            pages_count = await loop.run_in_executor(split_executor, self._get_pages_count)
+            chunks = self.job_metrics.iterate(split_pdf_pages(self.pdf_source, pages_count, start=len(self.page_names)),
+                                              stage='extract')
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(split_executor, next, chunks, None)
+                    if chunk is None:
+                        break
+                    for i, single_page_pdf in zip(*chunk):
+                        extraction = asyncio.ensure_future(self._extract(i, single_page_pdf, semaphore, executor))
+                        await queue.put((pages_count, single_page_pdf, extraction))
+            finally:
+                await loop.run_in_executor(split_executor, chunks.close)
+        await queue.put(None)
+
+    async def _extract(self, page_index: int, single_page_pdf: bytes, semaphore: asyncio.Semaphore,
+                       executor: ThreadPoolExecutor) -> str:
+        if self.cached_pages is not None:
+            return self.cached_pages[page_index]
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, self._parse, single_page_pdf)
+
+    def _parse(self, single_page_pdf: bytes) -> str:
+        with self.job_metrics.stage('parse'):
+            return get_parser_backend(self.parser_backend).parse(single_page_pdf)
+
+    async def _write(self, queue: asyncio.Queue, producer: asyncio.Future) -> None:
+        """Дописывает сертификаты в архив строго в порядке страниц."""
+        loop = asyncio.get_running_loop()
+        name_registry = self.names_service.create_name_registry(self.page_names)
+        while True:
+            get_item = asyncio.ensure_future(queue.get())
+            await asyncio.wait([get_item, producer], return_when=asyncio.FIRST_COMPLETED)
+            if producer.done() and producer.exception() is not None:
+                # Сериализация страниц завершилась ошибкой до конца документа
+                get_item.cancel()
+                raise producer.exception()
+            item = await get_item
+            if item is None:
+                return
+
+            pages_count, single_page_pdf, extraction = item
+            parsed_page = await extraction
+            with self.job_metrics.stage('name'):
+                page_name = self.names_service.get_page_name(parsed_page, name_registry, len(self.page_names))
+            self.parsed_pages.append(parsed_page)
+            self.page_names.append(page_name)
+            # Запись в архив и сохранение прогресса в базе данных блокируют, поэтому выполняются вне цикла событий
+            await loop.run_in_executor(None, self._write_certificate, page_name, single_page_pdf, pages_count)
+
+    def _write_certificate(self, page_name: str, single_page_pdf: bytes, pages_count: int) -> None:
+        with self.job_metrics.stage('write'):
+            self.archive.writestr(page_name, single_page_pdf)
+        self.job_metrics.add_page(len(single_page_pdf))
+        if self.progress_callback:
+            self.progress_callback(len(self.page_names), pages_count)
+
+    def _get_pages_count(self) -> int:
+        if self.cached_pages is not None:
+            return len(self.cached_pages)
+        document = FileHelper.open_pdf_source(self.pdf_source)
+        try:
+            return document.pageCount
+        finally:
+            document.close()
+
+
+class CheckpointedZipFile(zipfile.ZipFile):
+    """Архив, записанные страницы которого фиксируются для продолжения после сбоя.
+
+    Каждые SPLIT_CHECKPOINT_INTERVAL страниц архив сбрасывается на диск, а
+    checkpoint_callback получает описания записанных страниц: номер, имя,
+    смещения в архиве и поля заголовка. По этим описаниям архив открывается
+    заново: файл обрезается после последней зафиксированной страницы, а
+    оглавление восстанавливается без чтения архива.
+    """
+
+    def __init__(self, path: str, checkpoints: List[dict],
+                 checkpoint_callback: Optional[Callable[[List[dict]], None]] = None) -> None:
+        if checkpoints:
+            file = open(path, 'r+b')
+            file.truncate(checkpoints[-1]['end_offset'])
+            file.seek(checkpoints[-1]['end_offset'])
+        else:
+            file = open(path, 'w+b')
+        self._file = file
+        try:
+            super().__init__(file, 'w', **get_archive_compression())
+        except BaseException:
+            file.close()
+            raise
+
+        for checkpoint in checkpoints:
+            zip_info = self._restore_zip_info(checkpoint)
+            self.filelist.append(zip_info)
+            self.NameToInfo[zip_info.filename] = zip_info
+        self.checkpoint_callback = checkpoint_callback
+        self.pages_committed = len(checkpoints)
+        self._pending: List[dict] = []
+
+    def writestr(self, zinfo_or_arcname, data, compress_type=None, compresslevel=None) -> None:
+        super().writestr(zinfo_or_arcname, data, compress_type=compress_type, compresslevel=compresslevel)
+        zip_info = self.filelist[-1]
+        self._pending.append({
+            'page_index': self.pages_committed + len(self._pending),
+            'name': zip_info.filename,
+            'header_offset': zip_info.header_offset,
+            'end_offset': self.fp.tell(),
+            'zip_info': {
+                'date_time': list(zip_info.date_time),
+                'compress_type': zip_info.compress_type,
+                'flag_bits': zip_info.flag_bits,
+                'crc': zip_info.CRC,
+                'compress_size': zip_info.compress_size,
+                'file_size': zip_info.file_size,
+            },
+        })
+        if len(self._pending) >= settings.SPLIT_CHECKPOINT_INTERVAL:
+            self.commit()
+
+    def commit(self) -> None:
+        """Сбрасывает записанные страницы на диск и передает их описания."""
+        if not self._pending:
+            return
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        if self.checkpoint_callback:
+            self.checkpoint_callback(self._pending)
+        self.pages_committed += len(self._pending)
+        self._pending = []
+
+    def close(self) -> None:
+        try:
+            if self.fp is not None:
+                self.commit()
+            super().close()
+        finally:
+            # Если фиксация не удалась, архив все равно считается закрытым:
+            # иначе ZipFile.__del__ повторит ее с уже закрытым файлом
+            self.fp = None
+            self._pending = []
+            self._file.close()
+
+    @staticmethod
+    def _restore_zip_info(checkpoint: dict) -> zipfile.ZipInfo:
+        fields = checkpoint['zip_info']
+        zip_info = zipfile.ZipInfo(checkpoint['name'], date_time=tuple(fields['date_time']))
+        zip_info.compress_type = fields['compress_type']
+        zip_info.flag_bits = fields['flag_bits']
+        zip_info.CRC = fields['crc']
+        zip_info.compress_size = fields['compress_size']
+        zip_info.file_size = fields['file_size']
+        zip_info.header_offset = checkpoint['header_offset']
+        zip_info.external_attr = 0o600 << 16
+        return zip_info
+
+
+class StreamCertificatesArchiveService:
+    """Сервис потоковой генерации архива с сертификатами по сохраненным именам страниц."""
+
+    def __init__(self, pdf_file: BinaryIO, page_names: List[str]) -> None:
+        self.pdf_file = pdf_file
+        self.page_names = page_names
+
+    def __call__(self) -> Iterator[bytes]:
+        pdf_source = FileHelper.get_pdf_source(self.pdf_file)
+        stream = ZipStreamBuffer()
+        with zipfile.ZipFile(stream, 'w', **get_archive_compression()) as archive:
+            for page_name, single_page_pdf in iter_pdf_certificates(pdf_source, self.page_names):
+                archive.writestr(page_name, single_page_pdf)
+                yield stream.pop()
+        yield stream.pop()
+
+
+class StreamBatchArchiveService:
+    """Сервис потоковой генерации общего архива пакета файлов.
 
-        for i in range(input_pdf.numPages):
-            pdf_with_single_page = PdfFileWriter()
-            pdf_with_single_page.addPage(input_pdf.getPage(i))
+    Сертификаты каждого файла записываются в отдельную папку архива. Папки и
+    сертификаты передаются итераторами и читаются по мере записи архива.
+    """
 
-            buffer = io.BytesIO()
-            pdf_with_single_page.write(buffer)
-            parsed_document = ParsePdfService(pdf_file=buffer.getvalue())()
-            buffer.seek(0)
+    def __init__(self, parts: Iterable[Tuple[str, Iterable[Tuple[str, bytes]]]]) -> None:
+        self.parts = parts
 
-            certificate_name = FileHelper.trim_string_to_newline(
-                string=parsed_document,
-                trim_from=self.name_position,
-            )
-            formatted_name = FileHelper.format_file_name(certificate_name)
+    def __call__(self) -> Iterator[bytes]:
+        stream = ZipStreamBuffer()
+        with zipfile.ZipFile(stream, 'w', **get_archive_compression()) as archive:
+            for folder, certificates in self.parts:
+                for page_name, single_page_pdf in certificates:
+                    archive.writestr(f'{folder}/{page_name}', single_page_pdf)
+                    yield stream.pop()
+        yield stream.pop()
 
-            full_path = f'{save_path}/{formatted_name}.pdf'
 
-            generated_name = FileHelper.generate_name(
-                full_path=full_path,
-                file_name=formatted_name,
-                save_path=save_path,
-            )
+def iter_pdf_certificates(pdf_source: PdfSource, page_names: List[str]) -> Iterator[Tuple[str, bytes]]:
+    """Сертификаты документа по сохраненным именам страниц."""
+    for page_range, pages in split_pdf_pages(pdf_source, len(page_names)):
+        for i, single_page_pdf in zip(page_range, pages):
+            yield page_names[i], single_page_pdf
 
-            save_path = os.path.dirname(generated_name)
 
-            if not os.path.exists(save_path):
-                Path(save_path).mkdir(parents=True, exist_ok=True)
+def iter_archive_certificates(archive_path: str) -> Iterator[Tuple[str, bytes]]:
+    """Сертификаты из готового архива сессии."""
+    with zipfile.ZipFile(archive_path) as archive:
+        for page_name in archive.namelist():
+            yield page_name, archive.read(page_name)
 
-            with open(generated_name, "wb") as output_stream:
-                pdf_with_single_page.write(output_stream)
 
-        shutil.make_archive(save_path, self.ARCHIVE_EXTENSION, save_path)
+class ZipStreamBuffer(io.RawIOBase):
+    """Буфер без позиционирования, из которого zipfile отдает архив частями."""
 
-        shutil.rmtree(save_path, ignore_errors=True)
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: List[bytes] = []
 
-        return save_path + '.' + self.ARCHIVE_EXTENSION
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        """Возвращает записанные с прошлого вызова данные."""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def get_archive_compression() -> dict:
+    """Параметры сжатия архива из настроек."""
+    return {
+        'compression': ARCHIVE_COMPRESSION_METHODS[settings.CERTIFICATES_ARCHIVE_COMPRESSION],
+        'compresslevel': settings.CERTIFICATES_ARCHIVE_COMPRESSLEVEL,
+    }
+
+
+def split_pdf_pages(pdf_source: PdfSource, pages_count: int,
+                    start: int = 0) -> Iterator[Tuple[range, List[bytes]]]:
+    """Сериализует страницы документа, начиная со start, диапазонами в пуле обработчиков.
+
+    Диапазоны возвращаются в порядке страниц, поэтому имена сертификатов
+    разрешаются детерминированно независимо от числа обработчиков. Документ
+    на диске передается обработчикам путем, а не содержимым.
+    """
+    chunk_size = settings.SPLIT_CHUNK_SIZE
+    page_ranges = [range(chunk_start, min(chunk_start + chunk_size, pages_count))
+                   for chunk_start in range(start, pages_count, chunk_size)]
+
+    # Настройки передаются обработчикам явно: процессы пула могут не иметь настроенного Django
+    writer_options = {
+        'writer': settings.SPLIT_WRITER,
+        'garbage': settings.SPLIT_WRITER_GARBAGE,
+        'subset_fonts': settings.SPLIT_WRITER_SUBSET_FONTS,
+    }
+    if settings.SPLIT_WORKERS <= 1 or len(page_ranges) <= 1:
+        # Документ передается явно: генераторы нескольких сессий могут
+        # выполняться в одном потоке поочередно
+        split_pages = functools.partial(_split_pages, pdf_source, writer_options)
+        yield from zip(page_ranges, map(split_pages, page_ranges))
+        return
+
+    executor_class = ProcessPoolExecutor if settings.SPLIT_EXECUTOR == 'process' else ThreadPoolExecutor
+    # Не больше двух диапазонов на обработчик ждут записи, поэтому сериализованные
+    # страницы не копятся в памяти, если архив пишется медленнее
+    window_size = 2 * settings.SPLIT_WORKERS
+    with executor_class(max_workers=settings.SPLIT_WORKERS, initializer=_init_split_worker,
+                        initargs=(pdf_source, writer_options)) as executor:
+        futures = collections.deque()
+        try:
+            for page_range in page_ranges:
+                if len(futures) >= window_size:
+                    yield futures[0][0], futures.popleft()[1].result()
+                futures.append((page_range, executor.submit(_split_pages_worker, page_range)))
+            while futures:
+                yield futures[0][0], futures.popleft()[1].result()
+        finally:
+            for _, future in futures:
+                future.cancel()
+
+
+_split_worker_state = threading.local()
+
+
+def _init_split_worker(pdf_source: PdfSource, writer_options: dict) -> None:
+    """Запоминает исходный документ и параметры записи для обработчика пула."""
+    _split_worker_state.pdf_source = pdf_source
+    _split_worker_state.writer_options = writer_options
+
+
+def _split_pages_worker(page_range: range) -> List[bytes]:
+    """Сериализует диапазон страниц документа, запомненного обработчиком пула."""
+    return _split_pages(_split_worker_state.pdf_source, _split_worker_state.writer_options, page_range)
+
+
+def _split_pages(pdf_source: PdfSource, writer_options: dict, page_range: range) -> List[bytes]:
+    """Сериализует каждую страницу диапазона в отдельный pdf документ.
+
+    Документ открывается заново для каждого диапазона: прочитанные объекты
+    страниц освобождаются вместе с ним, и память не растет с числом страниц.
+    """
+    if writer_options['writer'] == 'fitz':
+        with FileHelper.open_pdf_source(pdf_source) as input_pdf:
+            return [_write_fitz_page(input_pdf, i, writer_options) for i in page_range]
+
+    if not isinstance(pdf_source, str):
+        input_pdf = PdfFileReader(io.BytesIO(pdf_source))
+        return [_write_pypdf2_page(input_pdf, i) for i in page_range]
+    # Отображение файла в память только для чтения не занимает память процесса
+    # под содержимое документа: страницы файла подгружаются по мере чтения
+    with open(pdf_source, 'rb') as pdf_file, \
+            mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_pdf:
+        input_pdf = PdfFileReader(mapped_pdf)
+        return [_write_pypdf2_page(input_pdf, i) for i in page_range]
+
+
+def _write_pypdf2_page(input_pdf: PdfFileReader, page_index: int) -> bytes:
+    pdf_with_single_page = PdfFileWriter()
+    pdf_with_single_page.addPage(input_pdf.getPage(page_index))
+
+    buffer = io.BytesIO()
+    pdf_with_single_page.write(buffer)
+    return buffer.getvalue()
+
+
+def _write_fitz_page(input_pdf: fitz.Document, page_index: int, writer_options: dict) -> bytes:
+    """Копирует страницу средствами MuPDF и сериализует ее один раз.
+
+    Копируются только объекты исходного файла, нужные странице, а потоки
+    сжимаются. Сборка мусора объединяет повторяющиеся объекты, а подмножество
+    шрифтов оставляет только глифы, использованные на странице.
+    """
+    # insertPDF заменяет несуществующий номер страницы последней страницей
+    if not 0 <= page_index < input_pdf.pageCount:
+        raise IndexError(f'В документе нет страницы {page_index}')
+    pdf_with_single_page = fitz.open()
+    pdf_with_single_page.insertPDF(input_pdf, from_page=page_index, to_page=page_index)
+    if writer_options['subset_fonts']:
+        pdf_with_single_page.subset_fonts()
+    page_content = pdf_with_single_page.write(garbage=writer_options['garbage'], deflate=True)
+    pdf_with_single_page.close()
+    return page_content
+
+
+class BasePdfParserBackend:
+    """Базовый бэкенд извлечения текста из pdf документа."""
+
+    def parse(self, pdf_file: PdfSource) -> str:
+        """Возвращает текст всего документа."""
+        return ''.join(self.parse_pages(pdf_file))
+
+    def parse_pages(self, pdf_file: PdfSource) -> List[str]:
+        """Возвращает текст каждой страницы документа."""
+        raise NotImplementedError
+
+    def parse_document_page(self, document: fitz.Document, page_index: int) -> str:
+        """Возвращает текст одной страницы открытого документа."""
+        pdf_with_single_page = fitz.open()
+        pdf_with_single_page.insertPDF(document, from_page=page_index, to_page=page_index)
+        return self.parse(pdf_with_single_page.write())
+
+
+class TikaParserBackend(BasePdfParserBackend):
+    """Бэкенд извлечения текста через сервер Apache Tika."""
+
+    def parse(self, pdf_file: PdfSource) -> str:
+        return self._put(pdf_file, accept='text/plain')
+
+    def parse_pages(self, pdf_file: PdfSource) -> List[str]:
+        page_parser = TikaPagesParser()
+        page_parser.feed(self._put(pdf_file, accept='text/html'))
+        page_parser.close()
+        return page_parser.pages
+
+    @staticmethod
+    def _put(pdf_file: PdfSource, accept: str) -> str:
+        """Отправляет документ с диска потоком, не читая его в память."""
+        if not isinstance(pdf_file, str):
+            return get_tika_client().put('/tika', pdf_file, accept=accept)
+        with open(pdf_file, 'rb') as pdf_stream:
+            return get_tika_client().put('/tika', pdf_stream, accept=accept)
+
+
+class TikaError(Exception):
+    """Ошибка обращения к серверу Tika."""
+
+
+class TikaUnavailableError(TikaError):
+    """Сервер Tika недоступен: запросы не выполняются до истечения паузы."""
+
+
+class TikaClient:
+    """Клиент сервера Tika с пулом постоянных соединений.
+
+    Ограничивает число одновременных запросов, повторяет запросы с
+    экспоненциальной паузой при ошибках 5xx и обрыве соединения, а после
+    серии неудачных запросов перестает обращаться к серверу на время
+    circuit_breaker_timeout.
+    """
+
+    RETRY_STATUSES = range(500, 600)
+
+    def __init__(self, server_path: str, timeout: Tuple[float, float], max_connections: int,
+                 max_retries: int, retry_backoff: float, circuit_breaker_threshold: int,
+                 circuit_breaker_timeout: float) -> None:
+        self.server_path = server_path.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.circuit_breaker_threshold = circuit_breaker_threshold
+        self.circuit_breaker_timeout = circuit_breaker_timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._semaphore = threading.BoundedSemaphore(max_connections)
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+
+    def put(self, path: str, data: Union[bytes, BinaryIO], accept: str) -> str:
+        """Отправляет документ серверу Tika и возвращает ответ."""
+        for attempt in range(self.max_retries + 1):
+            self._check_circuit()
+            if hasattr(data, 'seek'):
+                # Файл отправляется потоком, при повторе его нужно читать с начала
+                data.seek(0)
+            try:
+                with self._semaphore:
+                    # Время ожидания свободного соединения в задержку запроса не входит
+                    started = time.perf_counter()
+                    response = self.session.put(
+                        f'{self.server_path}{path}',
+                        data=data,
+                        headers={'Accept': accept, 'Content-Type': 'application/pdf'},
+                        timeout=self.timeout,
+                    )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                TIKA_REQUEST_DURATION.observe(time.perf_counter() - started, outcome='error')
+                error = TikaError(f'Сервер Tika не ответил: {e}')
+            else:
+                TIKA_REQUEST_DURATION.observe(time.perf_counter() - started, outcome=response.status_code)
+                if response.status_code not in self.RETRY_STATUSES:
+                    self._record_success()
+                    if not response.ok:
+                        raise TikaError(f'Сервер Tika вернул ошибку {response.status_code}')
+                    return response.content.decode('utf-8')
+                error = TikaError(f'Сервер Tika вернул ошибку {response.status_code}')
+
+            self._record_failure()
+            if attempt < self.max_retries:
+                logger.warning(f'{error}, повтор через {self.retry_backoff * 2 ** attempt} с')
+                time.sleep(self.retry_backoff * 2 ** attempt)
+        raise error
+
+    def _check_circuit(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.circuit_breaker_timeout:
+                raise TikaUnavailableError('Сервер Tika временно недоступен')
+            # Пауза истекла: следующий запрос проверит, восстановился ли сервер
+            self._opened_at = None
+            self._failures = self.circuit_breaker_threshold - 1
+
+    def _record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def _record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.circuit_breaker_threshold:
+                self._opened_at = time.monotonic()
+
+
+_tika_clients = {}
+_tika_clients_lock = threading.Lock()
+
+
+def get_tika_client() -> TikaClient:
+    """Возвращает общий для процесса клиент Tika с настройками из settings."""
+    if not settings.TIKA_SERVER_PATH:
+        raise TikaError('Не задан адрес сервера Tika (TIKA_SERVER_PATH)')
+    options = {
+        'server_path': settings.TIKA_SERVER_PATH,
+        'timeout': (settings.TIKA_CONNECT_TIMEOUT, settings.TIKA_READ_TIMEOUT),
+        'max_connections': settings.TIKA_MAX_CONNECTIONS,
+        'max_retries': settings.TIKA_MAX_RETRIES,
+        'retry_backoff': settings.TIKA_RETRY_BACKOFF,
+        'circuit_breaker_threshold': settings.TIKA_CIRCUIT_BREAKER_THRESHOLD,
+        'circuit_breaker_timeout': settings.TIKA_CIRCUIT_BREAKER_TIMEOUT,
+    }
+    key = tuple(options.values())
+    with _tika_clients_lock:
+        if key not in _tika_clients:
+            _tika_clients[key] = TikaClient(**options)
+        return _tika_clients[key]
+
+
+class TikaPagesParser(HTMLParser):
+    """Разбирает XHTML ответ Tika на текст отдельных страниц."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.pages: List[str] = []
+        self._page_depth = 0
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag != 'div':
+            return
+        if self._page_depth:
+            self._page_depth += 1
+        elif ('class', 'page') in attrs:
+            self._page_depth = 1
+            self.pages.append('')
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == 'div' and self._page_depth:
+            self._page_depth -= 1
+
+    def handle_data(self, data: str) -> None:
+        if self._page_depth:
+            self.pages[-1] += data
+
+
+class PyMuPDFParserBackend(BasePdfParserBackend):
+    """Бэкенд извлечения текста средствами PyMuPDF внутри процесса."""
+
+    def parse_document_page(self, document: fitz.Document, page_index: int) -> str:
+        return document.loadPage(page_index).getText()
+
+    def parse_pages(self, pdf_file: PdfSource) -> List[str]:
+        document = FileHelper.open_pdf_source(pdf_file)
+        try:
+            return [page.getText() for page in document]
+        finally:
+            document.close()
+
+
+class PdfMinerParserBackend(BasePdfParserBackend):
+    """Бэкенд извлечения текста средствами pdfminer.six внутри процесса."""
+
+    def parse_pages(self, pdf_file: PdfSource) -> List[str]:
+        return [
+            ''.join(element.get_text() for element in page if isinstance(element, LTTextContainer))
+            for page in extract_pages(pdf_file if isinstance(pdf_file, str) else io.BytesIO(pdf_file))
+        ]
+
+
+def get_parser_backend(backend: Optional[str] = None) -> BasePdfParserBackend:
+    """Возвращает бэкенд извлечения текста по пути к классу, по умолчанию указанный в настройках."""
+    return import_string(backend or settings.PDF_PARSER_BACKEND)()
 
 
 class ParsePdfService:
     """Сервис для распаршивания pdf документа."""
 
-    def __init__(self, pdf_file: bytes) -> None:
+    def __init__(self, pdf_file: bytes, backend: Optional[str] = None) -> None:
         self.pdf_file = pdf_file
+        self.backend = backend
+
+    def __call__(self) -> str:
+        return get_parser_backend(self.backend).parse(self.pdf_file)
+
+
+class ParsePdfPagesService:
+    """Сервис для постраничного распаршивания pdf документа за один проход."""
+
+    def __init__(self, pdf_file: PdfSource, backend: Optional[str] = None) -> None:
+        self.pdf_file = pdf_file
+        self.backend = backend
+
+    def __call__(self) -> List[str]:
+        return get_parser_backend(self.backend).parse_pages(self.pdf_file)
+
+
+class ParseDocumentPageService:
+    """Сервис для распаршивания одной страницы открытого pdf документа."""
+
+    def __init__(self, document: fitz.Document, page_index: int, backend: Optional[str] = None) -> None:
+        self.document = document
+        self.page_index = page_index
+        self.backend = backend
 
     def __call__(self) -> str:
-        parsed_document = parser.from_buffer(self.pdf_file, settings.TIKA_SERVER_PATH)
-        return parsed_document.get('content')
+        return get_parser_backend(self.backend).parse_document_page(self.document, self.page_index)
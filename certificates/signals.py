@@ -0,0 +1,48 @@
+import os
+import shutil
+
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from certificates.models import ParseFile, PageText, ParseFileUpload
+from certificates.services import CalibrationImageService
+
+
+@receiver(post_delete, sender=ParseFile)
+def delete_page_text_cache(sender, instance: ParseFile, **kwargs):
+    """Удаляет кэш текста страниц, если файл больше не используется."""
+    if instance.file_hash and not ParseFile.objects.filter(file_hash=instance.file_hash).exists():
+        PageText.objects.filter(source_hash=instance.file_hash).delete()
+
+
+@receiver(post_delete, sender=ParseFile)
+def delete_calibration_images(sender, instance: ParseFile, using: str, **kwargs):
+    """Удаляет изображения для калибровки, если файл больше не используется."""
+    if instance.file_hash and not ParseFile.objects.filter(file_hash=instance.file_hash).exists():
+        transaction.on_commit(
+            lambda: shutil.rmtree(CalibrationImageService.IMAGE_SAVE_PATH / instance.file_hash, ignore_errors=True),
+            using=using,
+        )
+
+
+@receiver(post_delete, sender=ParseFile)
+def delete_unreferenced_files(sender, instance: ParseFile, using: str, **kwargs):
+    """Удаляет файлы, на которые больше не ссылается ни один ParseFile."""
+    for field_name in ('file', 'calibration_certificate'):
+        field_file: FieldFile = getattr(instance, field_name)
+        if not field_file.name or ParseFile.objects.filter(**{field_name: field_file.name}).exists():
+            continue
+        transaction.on_commit(lambda storage=field_file.storage, name=field_file.name: storage.delete(name),
+                              using=using)
+
+
+@receiver(post_delete, sender=ParseFileUpload)
+def delete_upload_part(sender, instance: ParseFileUpload, using: str, **kwargs):
+    """Удаляет загруженную часть файла, если она не была перенесена в хранилище."""
+    def delete_part(part_path: str = instance.part_path) -> None:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    transaction.on_commit(delete_part, using=using)
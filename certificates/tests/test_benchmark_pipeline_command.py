@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from certificates.management.commands.benchmark_pipeline import _run_isolated
+
+
+def allocate_memory(pdf_path: str, names: list) -> dict:
+    memory = b'x' * 50 * 1024 * 1024
+    return {'allocated_bytes': len(memory)}
+
+
+def exit_without_result(pdf_path: str, names: list) -> dict:
+    os._exit(1)
+
+
+class BenchmarkPipelineCommandTest(SimpleTestCase):
+
+    def setUp(self):
+        output_file, self.output_path = tempfile.mkstemp(suffix='.json')
+        os.close(output_file)
+
+    def tearDown(self):
+        os.remove(self.output_path)
+
+    def _run(self, *args) -> dict:
+        call_command('benchmark_pipeline', '--pages', '3', '5', '--output', self.output_path, *args, stdout=StringIO())
+        with open(self.output_path, encoding='utf-8') as output:
+            return json.load(output)
+
+    def test_report(self):
+        report = self._run()
+
+        self.assertFalse(report['tika_stub'])
+        self.assertEqual(len(report['results']), 6)
+        for result in report['results']:
+            self.assertGreater(result['baseline_rss_kb'], 0)
+            self.assertGreaterEqual(result['peak_rss_kb'], 0)
+            self.assertIn('pages_per_second', result)
+            self.assertIn('peak_temp_disk_bytes', result)
+
+    def test_split_with_tika_stub(self):
+        """Проверяет разделение через локальную заглушку сервера Tika."""
+        report = self._run('--tika-stub', '--duplicates', '0.5')
+
+        self.assertEqual(report['parser_backend'], 'certificates.services.TikaParserBackend')
+        split_results = [result for result in report['results'] if result['stage'] == 'split']
+        self.assertListEqual([result['archive_entries'] for result in split_results], [3, 5])
+
+    def test_async_split_with_tika_stub(self):
+        """Проверяет асинхронный конвейер разделения через заглушку сервера Tika с задержкой."""
+        report = self._run('--tika-stub', '--tika-latency', '0.01', '--split-pipeline', 'async')
+
+        self.assertEqual(report['split_pipeline'], 'async')
+        split_results = [result for result in report['results'] if result['stage'] == 'split']
+        self.assertListEqual([result['archive_entries'] for result in split_results], [3, 5])
+
+
+class RunIsolatedTest(SimpleTestCase):
+
+    def test_peak_rss_excludes_parent(self):
+        """Проверяет, что пиковый RSS замера не включает память родительского процесса."""
+        result = _run_isolated(allocate_memory, '', [])
+
+        self.assertGreaterEqual(result['peak_rss_kb'], 45 * 1024)
+        self.assertLess(result['peak_rss_kb'], 60 * 1024)
+
+    def test_process_exit_without_result(self):
+        with self.assertRaisesMessage(RuntimeError, 'завершился с кодом 1'):
+            _run_isolated(exit_without_result, '', [])
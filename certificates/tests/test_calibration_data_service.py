@@ -1,34 +1,67 @@
-import os
-from pathlib import Path
+import shutil
 from unittest import mock
 from unittest.mock import Mock, MagicMock
 
+from PIL import Image
 from django.conf import settings
 from django.test import SimpleTestCase
 
-from certificates.services import CalibrationDataService
+from certificates.helpers import FileHelper
+from certificates.services import CalibrationDataService, CalibrationImageService
 
 
 class CalibrationDataServiceTest(SimpleTestCase):
 
     UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
 
-    @mock.patch('certificates.services.ParsePdfService')
+    @mock.patch('certificates.services.ParseDocumentPageService')
     def setUp(self, parse_pdf_service: MagicMock):
         self.parsed_data = '\n\n\n \nIbrahim\n'
         parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
 
         file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
         with open(file_path, 'rb') as file_stream:
-            self.parsed_pdf, self.start_auto_with, self.calibration_image = CalibrationDataService(
+            self.parsed_pdf, self.start_auto_with = CalibrationDataService(
                 pdf_file=file_stream,
             )()
 
-    def tearDown(self):
-        os.remove(self.calibration_image)
-
     def test_success(self):
-        archive_path = Path(self.calibration_image)
         self.assertEqual(self.start_auto_with, 5)
         self.assertEqual(self.parsed_pdf, self.parsed_data)
-        self.assertTrue(archive_path.exists())
+
+
+class CalibrationImageServiceTest(SimpleTestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+    FILE_HASH = 'test_calibration_image'
+
+    def tearDown(self):
+        shutil.rmtree(CalibrationImageService.IMAGE_SAVE_PATH / self.FILE_HASH, ignore_errors=True)
+
+    def _render(self, width: int, image_format: str) -> str:
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file_stream:
+            return CalibrationImageService(
+                pdf_file=file_stream,
+                file_hash=self.FILE_HASH,
+                width=width,
+                image_format=image_format,
+                dpi=100,
+            )()
+
+    def test_render(self):
+        for image_format, pillow_format in CalibrationImageService.IMAGE_FORMATS.items():
+            with self.subTest(image_format=image_format):
+                image_path = self._render(width=480, image_format=image_format)
+                with Image.open(image_path) as image:
+                    self.assertEqual(image.format, pillow_format)
+                    self.assertEqual(image.width, 480)
+
+    def test_cached(self):
+        """Проверяет, что отрендеренное изображение не рендерится повторно."""
+        with mock.patch.object(FileHelper, 'open_pdf_document', wraps=FileHelper.open_pdf_document) as open_document:
+            first_path = self._render(width=480, image_format='webp')
+            second_path = self._render(width=480, image_format='webp')
+
+        self.assertEqual(second_path, first_path)
+        open_document.assert_called_once()
@@ -0,0 +1,232 @@
+import hashlib
+import io
+import os
+import uuid
+from datetime import timedelta
+from http import HTTPStatus
+from unittest import mock
+from unittest.mock import Mock, MagicMock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from certificates.helpers import FileHelper
+from certificates.models import Course, CertificateType, ParseFile, ParseFileUpload
+
+
+class FileUploadTestCase(TestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+
+    def setUp(self):
+        self.course = Course.objects.create(name='test name')
+        self.certificate_type = CertificateType.objects.create(
+            name='test type name',
+            course=self.course,
+        )
+        with open(f'{self.UPLOAD_DIRECTORY}/sample.pdf', 'rb') as file:
+            self.content = file.read()
+        self.content_hash = hashlib.sha256(self.content).hexdigest()
+
+        parse_pdf_service_patcher = mock.patch('certificates.services.ParseDocumentPageService')
+        parse_pdf_service: MagicMock = parse_pdf_service_patcher.start()
+        parse_pdf_service.return_value = Mock(return_value='\n\n\n \nIbrahim\n')
+        self.addCleanup(parse_pdf_service_patcher.stop)
+
+    def tearDown(self):
+        for parse_file in ParseFile.objects.all():
+            if os.path.exists(parse_file.file.path):
+                os.remove(parse_file.file.path)
+        for upload in ParseFileUpload.objects.all():
+            if os.path.exists(upload.part_path):
+                os.remove(upload.part_path)
+
+
+class PdfUploadHandlerTest(FileUploadTestCase):
+
+    def get_url(self) -> str:
+        return reverse('parse-file-create', kwargs={
+            'course_slug': self.course.slug,
+            'slug': self.certificate_type.slug,
+        })
+
+    def test_hash_computed_while_uploading(self):
+        with mock.patch.object(FileHelper, 'get_file_hash', wraps=FileHelper.get_file_hash) as get_file_hash:
+            response = self.client.post(self.get_url(), data={
+                'file': SimpleUploadedFile('sample.pdf', self.content),
+            })
+
+        parse_file = self.certificate_type.parse_files.get()
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(parse_file.file_hash, self.content_hash)
+        get_file_hash.assert_not_called()
+        with parse_file.file.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+
+    def test_reject_not_pdf(self):
+        response = self.client.post(self.get_url(), data={
+            'file': SimpleUploadedFile('sample.pdf', b'not a pdf document'),
+        })
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(self.certificate_type.parse_files.exists())
+        self.assertIn('Файл не является pdf документом', response.context['form'].errors['file'])
+
+    def test_csrf_checked(self):
+        client = Client(enforce_csrf_checks=True)
+
+        response = client.post(self.get_url(), data={'file': SimpleUploadedFile('sample.pdf', self.content)})
+
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        self.assertFalse(self.certificate_type.parse_files.exists())
+
+    def test_other_uploads_not_filtered(self):
+        """Проверяет, что файлы не pdf в других формах загружаются без изменений."""
+        self.client.post(self.get_url(), data={'file': SimpleUploadedFile('sample.pdf', self.content)})
+        parse_file = self.certificate_type.parse_files.get()
+        self.client.force_login(User.objects.create_superuser(username='admin', password='password'))
+        image = io.BytesIO()
+        Image.new('RGB', (4, 4)).save(image, format='PNG')
+
+        self.client.post(reverse('admin:certificates_parsefile_change', args=[parse_file.pk]), data={
+            'certificate_type': self.certificate_type.pk,
+            'calibration_certificate': SimpleUploadedFile('calibration.png', image.getvalue()),
+            'parsed_page': parse_file.parsed_page,
+            'parsed_page_length': parse_file.parsed_page_length,
+            'start_with_auto': parse_file.start_with_auto,
+            'file_hash': parse_file.file_hash,
+            'parser_backend': parse_file.parser_backend,
+        })
+
+        parse_file.refresh_from_db()
+        self.addCleanup(os.remove, parse_file.calibration_certificate.path)
+        with parse_file.calibration_certificate.open('rb') as file:
+            self.assertEqual(file.read(), image.getvalue())
+
+
+class ParseFileUploadViewTest(FileUploadTestCase):
+
+    def create_upload(self, size: int) -> str:
+        response = self.client.post(reverse('parse-file-upload-create', kwargs={
+            'course_slug': self.course.slug,
+            'slug': self.certificate_type.slug,
+        }), data={'file_name': 'sample.pdf', 'size': size})
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        return response.json()['upload_url']
+
+    def patch(self, upload_url: str, offset: int, data: bytes):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(upload_url, data=data, content_type='application/offset+octet-stream',
+                                     HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_resume_upload(self):
+        upload_url = self.create_upload(len(self.content))
+        middle = len(self.content) // 2
+
+        response = self.patch(upload_url, 0, self.content[:middle])
+        self.assertEqual(response.json(), {'offset': middle})
+        self.assertEqual(self.client.get(upload_url).json(), {'offset': middle, 'size': len(self.content)})
+
+        response = self.patch(upload_url, 0, self.content)
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(response.json()['offset'], middle)
+
+        response = self.patch(upload_url, middle, self.content[middle:])
+        parse_file = self.certificate_type.parse_files.get()
+        self.assertEqual(response.json()['redirect_url'], parse_file.get_absolute_url())
+        self.assertEqual(parse_file.file_name, 'sample.pdf')
+        self.assertEqual(parse_file.file_hash, self.content_hash)
+        self.assertFalse(ParseFileUpload.objects.exists())
+        self.assertEqual(os.listdir(settings.FILE_UPLOAD_TEMP_DIR), [])
+
+    def test_hash_computed_while_uploading(self):
+        """Проверяет, что SHA-256 файла, загруженного частями, вычисляется без повторного чтения файла."""
+        upload_url = self.create_upload(len(self.content))
+        middle = len(self.content) // 2
+
+        with mock.patch.object(FileHelper, 'get_file_hash', wraps=FileHelper.get_file_hash) as get_file_hash:
+            self.patch(upload_url, 0, self.content[:middle])
+            self.patch(upload_url, middle, self.content[middle:])
+
+        get_file_hash.assert_not_called()
+        self.assertEqual(self.certificate_type.parse_files.get().file_hash, self.content_hash)
+
+    def test_hash_computed_from_file_in_other_process(self):
+        """Проверяет хэш, если предыдущую часть файла принял другой процесс."""
+        upload_url = self.create_upload(len(self.content))
+        middle = len(self.content) // 2
+
+        self.patch(upload_url, 0, self.content[:middle])
+        ParseFileUpload._part_hashes.clear()
+        self.patch(upload_url, middle, self.content[middle:])
+
+        self.assertEqual(self.certificate_type.parse_files.get().file_hash, self.content_hash)
+
+    @override_settings(UPLOAD_CHUNK_SIZE=100)
+    def test_reject_exceeded_chunk_size(self):
+        upload_url = self.create_upload(len(self.content))
+
+        response = self.patch(upload_url, 0, self.content[:101])
+
+        self.assertEqual(response.status_code, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(self.client.get(upload_url).json()['offset'], 0)
+
+    def test_reject_not_pdf(self):
+        upload_url = self.create_upload(100)
+
+        response = self.patch(upload_url, 0, b'not a pdf document')
+
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(self.client.get(upload_url).json()['offset'], 0)
+
+    def test_reject_exceeded_size(self):
+        upload_url = self.create_upload(10)
+
+        response = self.patch(upload_url, 0, self.content[:20])
+
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertFalse(self.certificate_type.parse_files.exists())
+
+    def test_duplicate_upload(self):
+        for _ in range(2):
+            upload_url = self.create_upload(len(self.content))
+            self.patch(upload_url, 0, self.content)
+
+        parse_files = self.certificate_type.parse_files.all()
+        self.assertEqual(len(parse_files), 2)
+        self.assertEqual(parse_files[0].file.name, parse_files[1].file.name)
+        self.assertEqual(os.listdir(settings.FILE_UPLOAD_TEMP_DIR), [])
+
+
+class SweepUploadsTest(FileUploadTestCase):
+
+    def test_sweep_stale_uploads(self):
+        stale_upload = ParseFileUpload.objects.create(
+            certificate_type=self.certificate_type, file_name='sample.pdf', size=len(self.content),
+            created_at=timezone.now() - timedelta(days=2),
+        )
+        stale_upload.append(io.BytesIO(self.content[:100]), 0)
+        os.utime(stale_upload.part_path, (0, 0))
+        active_upload = ParseFileUpload.objects.create(
+            certificate_type=self.certificate_type, file_name='sample.pdf', size=len(self.content),
+            created_at=timezone.now() - timedelta(days=2),
+        )
+        active_upload.append(io.BytesIO(self.content[:100]), 0)
+        orphaned_path = os.path.join(settings.FILE_UPLOAD_TEMP_DIR, f'{uuid.uuid4()}.upload.pdf')
+        with open(orphaned_path, 'wb') as file:
+            file.write(self.content[:100])
+        os.utime(orphaned_path, (0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('sweep_split_jobs', upload_max_age=60 * 60, stdout=io.StringIO())
+
+        self.assertEqual(list(ParseFileUpload.objects.all()), [active_upload])
+        self.assertFalse(os.path.exists(stale_upload.part_path))
+        self.assertTrue(os.path.exists(active_upload.part_path))
+        self.assertFalse(os.path.exists(orphaned_path))
@@ -0,0 +1,105 @@
+from unittest import mock
+from unittest.mock import MagicMock
+
+import fitz
+from django.test import SimpleTestCase
+
+from certificates.services import CertificateNamesService, LayoutNameLocatorService, PyMuPDFParserBackend, \
+    RegionNameExtractorService
+
+
+class LayoutNameLocatorServiceTest(SimpleTestCase):
+
+    NAMES = ['Ibrahim Abdullayev', 'Yusuf Karimov', 'Ibrahim Abdullayev', 'Maryam Saidova']
+    # Шапка разной длины сдвигает имя в тексте страницы
+    HEADERS = ['Academy of Fiqh', 'International Academy of Islamic Fiqh', 'Academy', 'Fiqh Academy, Kazan']
+
+    def setUp(self):
+        document = fitz.open()
+        for i, (header, name) in enumerate(zip(self.HEADERS, self.NAMES)):
+            page = document.newPage(width=842, height=595)
+            page.insertText((70, 80), 'CERTIFICATE', fontsize=32)
+            page.insertText((70, 130), header, fontsize=18)
+            page.insertText((70, 260), name, fontsize=28)
+            page.insertText((70, 520), f'{i:06d}', fontsize=12)
+        self.pdf_file = document.write()
+        document.close()
+
+        self.parsed_pages = PyMuPDFParserBackend().parse_pages(self.pdf_file)
+        self.name_position = self.parsed_pages[0].find(self.NAMES[0])
+
+    def test_locate_names(self):
+        names = LayoutNameLocatorService(pdf_file=self.pdf_file, reference_name=self.NAMES[0])()
+        self.assertListEqual(names, self.NAMES)
+
+    def test_offset_mode_breaks_on_varying_header(self):
+        """Проверяет, что смещение первой страницы не подходит для страниц с другой шапкой."""
+        page_names = CertificateNamesService(
+            pdf_file=self.pdf_file,
+            name_position=self.name_position,
+            parsed_pages=self.parsed_pages,
+        )()
+        self.assertNotEqual(page_names[1], 'Yusuf_Karimov.pdf')
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_layout_mode(self, parse_pdf_pages_service: MagicMock):
+        """Проверяет, что в режиме layout текст всех страниц не извлекается."""
+        page_names = CertificateNamesService(
+            pdf_file=self.pdf_file,
+            name_position=self.name_position,
+            calibration_mode='layout',
+        )()
+
+        parse_pdf_pages_service.assert_not_called()
+        self.assertListEqual(page_names, ['Ibrahim_Abdullayev.pdf', 'Yusuf_Karimov.pdf',
+                                          'Ibrahim_Abdullayev_1.pdf', 'Maryam_Saidova.pdf'])
+
+    def test_constant_prefix(self):
+        """Проверяет, что постоянный текст перед именем в той же строке отбрасывается."""
+        document = fitz.open()
+        for name in self.NAMES[:2]:
+            page = document.newPage(width=842, height=595)
+            page.insertText((70, 260), f'Awarded to: {name}', fontsize=28)
+        pdf_file = document.write()
+        document.close()
+
+        names = LayoutNameLocatorService(pdf_file=pdf_file, reference_name=self.NAMES[0])()
+        self.assertListEqual(names, self.NAMES[:2])
+
+    def test_reference_not_found(self):
+        with self.assertRaises(ValueError):
+            LayoutNameLocatorService(pdf_file=self.pdf_file, reference_name='Isa Musayev')()
+
+
+class RegionNameExtractorServiceTest(SimpleTestCase):
+
+    NAMES = ['Ibrahim Abdullayev', 'Yusuf Karimov', 'Ibrahim Abdullayev']
+    # Имя на странице 842x595 занимает полосу вокруг y=260
+    NAME_REGION = [0.05, 0.38, 0.95, 0.47]
+
+    def setUp(self):
+        document = fitz.open()
+        for i, name in enumerate(self.NAMES):
+            page = document.newPage(width=842, height=595)
+            page.insertText((70, 80), 'CERTIFICATE', fontsize=32)
+            page.insertText((70, 130), 'Academy of Fiqh' * (i + 1), fontsize=12)
+            page.insertText((70, 260), name, fontsize=28)
+            page.insertText((70, 520), f'{i:06d}', fontsize=12)
+        self.pdf_file = document.write()
+        document.close()
+
+    def test_extract_names(self):
+        names = RegionNameExtractorService(pdf_file=self.pdf_file, region=self.NAME_REGION)()
+        self.assertListEqual(names, self.NAMES)
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_region_mode(self, parse_pdf_pages_service: MagicMock):
+        page_names = CertificateNamesService(
+            pdf_file=self.pdf_file,
+            name_position=0,
+            calibration_mode='region',
+            name_region=self.NAME_REGION,
+        )()
+
+        parse_pdf_pages_service.assert_not_called()
+        self.assertListEqual(page_names, ['Ibrahim_Abdullayev.pdf', 'Yusuf_Karimov.pdf', 'Ibrahim_Abdullayev_1.pdf'])
@@ -0,0 +1,182 @@
+import os
+import urllib.request
+from unittest import mock
+from unittest.mock import Mock, MagicMock
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from certificates import metrics
+from certificates.metrics import Counter, Histogram, JobMetrics, MetricsRegistry, start_metrics_server
+from certificates.services import SplitCertificatesService, CalibrationDataService
+
+
+class MetricsRegistryTest(SimpleTestCase):
+
+    def test_render_counter_and_histogram(self):
+        """Проверяет текстовый формат Prometheus счетчика и гистограммы."""
+        registry = MetricsRegistry()
+        counter = registry.register(Counter('test_pages_total', 'Страницы', label_names=('service',)))
+        histogram = registry.register(Histogram('test_duration_seconds', 'Длительность', buckets=(0.1, 1)))
+        counter.inc(service='split')
+        counter.inc(2, service='split')
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP test_pages_total Страницы',
+            '# TYPE test_pages_total counter',
+            'test_pages_total{service="split"} 3',
+            '# HELP test_duration_seconds Длительность',
+            '# TYPE test_duration_seconds histogram',
+            'test_duration_seconds_bucket{le="0.1"} 1',
+            'test_duration_seconds_bucket{le="1"} 2',
+            'test_duration_seconds_bucket{le="+Inf"} 3',
+            'test_duration_seconds_sum 5.55',
+            'test_duration_seconds_count 3',
+        ])
+
+    def test_labels_required(self):
+        """Проверяет, что метрика не принимает неизвестные метки."""
+        counter = Counter('test_total', 'Счетчик', label_names=('service',))
+
+        with self.assertRaises(ValueError):
+            counter.inc(stage='write')
+
+    def test_metrics_server(self):
+        """Проверяет, что сервер метрик обработчика отдает метрики процесса."""
+        server = start_metrics_server(0, '127.0.0.1')
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}/metrics') as response:
+            content = response.read().decode('utf-8')
+
+        self.assertEqual(response.headers['Content-Type'], metrics.CONTENT_TYPE)
+        self.assertIn('# TYPE certificates_pages_processed_total counter', content)
+
+
+class JobMetricsTest(SimpleTestCase):
+
+    def test_iterate_closes_iterator(self):
+        """Проверяет, что прерванный перебор закрывает исходный генератор."""
+        closed = []
+
+        def generate():
+            try:
+                yield from range(3)
+            finally:
+                closed.append(True)
+
+        job_metrics = JobMetrics(service='test')
+        items = job_metrics.iterate(generate(), stage='extract')
+        self.assertEqual(next(items), 0)
+        items.close()
+
+        self.assertEqual(closed, [True])
+        self.assertIn('extract', job_metrics.durations)
+
+    def test_summary_logged(self):
+        """Проверяет, что по завершении задания сводка пишется в лог."""
+        job_metrics = JobMetrics(service='test')
+        with job_metrics.stage('write'):
+            job_metrics.add_page(100)
+        with job_metrics.stage('read'):
+            pass
+
+        with self.assertLogs('certificates.metrics', level='INFO') as logs:
+            job_metrics.finish('done')
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertRegex(logs.records[0].getMessage(),
+                         r'^test: done за [\d.]+ с, read [\d.]+ с, write [\d.]+ с; страниц 1, записано 100 байт$')
+        self.assertEqual(metrics.STAGE_DURATION.get_count(service='test', stage='write'), 1)
+
+
+@override_settings(SPLIT_WRITER='fitz')
+class SplitCertificatesServiceMetricsTest(SimpleTestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+
+    def setUp(self):
+        parse_pdf_service_patcher = mock.patch('certificates.services.ParsePdfPagesService')
+        parse_pdf_service: MagicMock = parse_pdf_service_patcher.start()
+        parse_pdf_service.return_value = Mock(
+            return_value=['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n'],
+        )
+        self.addCleanup(parse_pdf_service_patcher.stop)
+
+    def split(self) -> SplitCertificatesService:
+        with open(f'{self.UPLOAD_DIRECTORY}/sample.pdf', 'rb') as file_stream:
+            service = SplitCertificatesService(pdf_file=file_stream, name_position=5)
+            with self.assertLogs('certificates.metrics', level='INFO'):
+                archive_path = service()
+        os.remove(archive_path)
+        return service
+
+    def test_stages_timed(self):
+        """Проверяет, что разделение замеряет все этапы и учитывает записанные страницы."""
+        pages_before = metrics.PAGES_PROCESSED.get(service='split')
+        bytes_before = metrics.BYTES_WRITTEN.get(service='split')
+        jobs_before = metrics.JOB_DURATION.get_count(service='split', status='done')
+
+        service = self.split()
+
+        self.assertSetEqual(set(service.job_metrics.durations), set(metrics.STAGES))
+        self.assertEqual(service.job_metrics.pages, 3)
+        self.assertEqual(metrics.PAGES_PROCESSED.get(service='split') - pages_before, 3)
+        self.assertEqual(metrics.BYTES_WRITTEN.get(service='split') - bytes_before, service.job_metrics.bytes_written)
+        self.assertEqual(metrics.JOB_DURATION.get_count(service='split', status='done') - jobs_before, 1)
+
+    @override_settings(SPLIT_PIPELINE='async')
+    def test_async_stages_timed(self):
+        """Проверяет замер этапов асинхронного конвейера."""
+        with mock.patch('certificates.services.get_parser_backend') as get_parser_backend:
+            get_parser_backend.return_value.parse.return_value = '\n\n\n \nIbrahim\n'
+            service = self.split()
+
+        self.assertSetEqual(set(service.job_metrics.durations), set(metrics.STAGES))
+        self.assertEqual(service.job_metrics.pages, 3)
+
+    def test_failed_job_counted(self):
+        """Проверяет, что задание с ошибкой попадает в метрики со статусом failed."""
+        failed_before = metrics.JOB_DURATION.get_count(service='split', status='failed')
+
+        with mock.patch('certificates.services.split_pdf_pages', side_effect=RuntimeError), \
+                open(f'{self.UPLOAD_DIRECTORY}/sample.pdf', 'rb') as file_stream:
+            with self.assertRaises(RuntimeError), self.assertLogs('certificates', level='INFO'):
+                SplitCertificatesService(pdf_file=file_stream, name_position=5)()
+
+        self.assertEqual(metrics.JOB_DURATION.get_count(service='split', status='failed') - failed_before, 1)
+
+
+class CalibrationDataServiceMetricsTest(SimpleTestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+
+    @mock.patch('certificates.services.ParseDocumentPageService')
+    def test_stages_timed(self, parse_document_page_service: MagicMock):
+        """Проверяет замер этапов получения калибровочных данных."""
+        parse_document_page_service.return_value = Mock(return_value='\n\n\n \nIbrahim\n')
+
+        with open(f'{self.UPLOAD_DIRECTORY}/sample.pdf', 'rb') as file_stream:
+            service = CalibrationDataService(pdf_file=file_stream)
+            with self.assertLogs('certificates.metrics', level='INFO'):
+                service()
+
+        self.assertSetEqual(set(service.job_metrics.durations), {'read', 'parse', 'name'})
+
+
+class MetricsViewTest(SimpleTestCase):
+
+    def test_metrics(self):
+        """Проверяет, что веб-сервер отдает метрики в формате Prometheus."""
+        metrics.TIKA_REQUEST_DURATION.observe(0.2, outcome=200)
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        self.assertIn('certificates_tika_request_duration_seconds_count{outcome="200"}',
+                      response.content.decode('utf-8'))
@@ -0,0 +1,52 @@
+from django.test import SimpleTestCase
+
+from certificates.helpers import NameRegistry
+
+
+class NameRegistryTest(SimpleTestCase):
+
+    def test_suffix_strategy(self):
+        name_registry = NameRegistry()
+
+        names = [name_registry.allocate('Ivan', page_index) for page_index in range(3)]
+
+        self.assertEqual(names, ['Ivan.pdf', 'Ivan_1.pdf', 'Ivan_2.pdf'])
+
+    def test_case_insensitive(self):
+        name_registry = NameRegistry()
+
+        names = [name_registry.allocate(name) for name in ('Ivan', 'IVAN', 'ivan_1')]
+
+        self.assertEqual(names, ['Ivan.pdf', 'IVAN_1.pdf', 'ivan_1_1.pdf'])
+        self.assertIn('ivan.PDF', name_registry)
+
+    def test_case_sensitive(self):
+        name_registry = NameRegistry(case_sensitive=True)
+
+        names = [name_registry.allocate(name) for name in ('Ivan', 'IVAN')]
+
+        self.assertEqual(names, ['Ivan.pdf', 'IVAN.pdf'])
+
+    def test_skip_taken_suffix(self):
+        name_registry = NameRegistry(used_names=['Ivan.pdf', 'Ivan_1.pdf', 'Ivan_2.pdf'])
+
+        self.assertEqual(name_registry.allocate('Ivan'), 'Ivan_3.pdf')
+        self.assertEqual(name_registry.allocate('Ivan'), 'Ivan_4.pdf')
+        self.assertEqual(len(name_registry), 5)
+
+    def test_page_strategy(self):
+        name_registry = NameRegistry(strategy='page')
+
+        names = [name_registry.allocate('Ivan', page_index) for page_index in (0, 4, 4)]
+
+        self.assertEqual(names, ['Ivan.pdf', 'Ivan_p5.pdf', 'Ivan_p5_1.pdf'])
+
+    def test_hash_strategy(self):
+        names = [NameRegistry(strategy='hash', used_names=['Ivan.pdf']).allocate('Ivan', 7) for _ in range(2)]
+
+        self.assertEqual(names[0], names[1])
+        self.assertRegex(names[0], r'^Ivan_[0-9a-f]{8}\.pdf$')
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            NameRegistry(strategy='random')
@@ -0,0 +1,135 @@
+import os
+from datetime import timedelta
+from unittest import mock
+from unittest.mock import Mock, MagicMock
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from certificates.models import Course, CertificateType, ParseFile, \
+    ParseSession, PageText
+from certificates.services import TikaError
+
+
+class PageTextCacheTest(TestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+
+    @mock.patch('certificates.services.ParseDocumentPageService')
+    def setUp(self, parse_pdf_service: MagicMock):
+        self.parsed_data = '\n\n\n \nIbrahim\n'
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
+
+        self.course = Course.objects.create(name='test name')
+        self.certificate_type = CertificateType.objects.create(
+            name='test type name',
+            course=self.course,
+        )
+
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file:
+            self.parse_file = ParseFile.objects.create(
+                file=File(file, name=os.path.basename(file.name)),
+                certificate_type=self.certificate_type,
+            )
+        self.parsed_pages = ['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n']
+
+    def tearDown(self):
+        if os.path.exists(self.parse_file.file.path):
+            os.remove(self.parse_file.file.path)
+
+    def _split_certificates(self, start_with: int) -> ParseSession:
+        parse_session = ParseSession.objects.create(parse_file=self.parse_file, start_with=start_with)
+        parse_session.split_certificates()
+        os.remove(parse_session.certificates.path)
+        return parse_session
+
+    def test_file_hash(self):
+        self.assertEqual(len(self.parse_file.file_hash), 64)
+        self.assertEqual(self.parse_file.parser_backend, settings.PDF_PARSER_BACKEND)
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_recalibration_uses_cache(self, parse_pdf_service: MagicMock):
+        """Проверяет, что повторная калибровка не извлекает текст страниц заново."""
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_pages)
+
+        self._split_certificates(start_with=5)
+        parse_session = self._split_certificates(start_with=6)
+
+        parse_pdf_service.assert_called_once()
+        self.assertEqual(PageText.objects.get_pages(self.parse_file.file_hash), self.parsed_pages)
+        self.assertListEqual(parse_session.page_names, ['brahim.pdf', 'brahim_1.pdf', 'usuf.pdf'])
+
+    @override_settings(PDF_PARSER_BACKEND='certificates.services.PyMuPDFParserBackend')
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_split_with_calibration_backend(self, parse_pdf_service: MagicMock):
+        """Проверяет, что файл разделяется бэкендом, которым он калибровался."""
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_pages)
+        tika_backend = 'certificates.services.TikaParserBackend'
+        ParseFile.objects.filter(pk=self.parse_file.pk).update(parser_backend=tika_backend)
+        self.parse_file.refresh_from_db()
+
+        self._split_certificates(start_with=5)
+
+        parse_pdf_service.assert_called_once_with(pdf_file=mock.ANY, backend=tika_backend)
+        self.assertEqual(PageText.objects.get_pages(self.parse_file.file_hash, tika_backend), self.parsed_pages)
+        self.assertIsNone(PageText.objects.get_pages(self.parse_file.file_hash))
+
+    @override_settings(PDF_PARSER_BACKEND='certificates.services.PyMuPDFParserBackend')
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_calibration_backend_unavailable(self, parse_pdf_service: MagicMock):
+        """Проверяет, что ошибка разделения называет недоступный бэкенд, которым калибровался файл."""
+        parse_pdf_service.return_value = Mock(side_effect=TikaError('Сервер Tika не ответил'))
+        tika_backend = 'certificates.services.TikaParserBackend'
+        ParseFile.objects.filter(pk=self.parse_file.pk).update(parser_backend=tika_backend)
+        self.parse_file.refresh_from_db()
+
+        parse_session = ParseSession.objects.create(parse_file=self.parse_file, start_with=5)
+        parse_session.split_certificates()
+
+        self.assertEqual(parse_session.status, ParseSession.Status.FAILED)
+        self.assertIn(tika_backend, parse_session.error)
+        self.assertIn('--profile tika', parse_session.error)
+
+    @mock.patch('certificates.models.PageTextQuerySet.save_pages', side_effect=IntegrityError('duplicate key'))
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_cache_error_does_not_fail_session(self, parse_pdf_service: MagicMock, save_pages: MagicMock):
+        """Проверяет, что ошибка сохранения кэша не делает завершенное разделение неудачным."""
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_pages)
+
+        with self.assertLogs('certificates.models', level='WARNING'):
+            parse_session = self._split_certificates(start_with=5)
+
+        save_pages.assert_called_once()
+        self.assertEqual(parse_session.status, ParseSession.Status.DONE)
+        self.assertEqual(parse_session.error, '')
+
+    def test_evict_by_age(self):
+        PageText.objects.save_pages(self.parse_file.file_hash, self.parsed_pages)
+        PageText.objects.update(used_at=timezone.now() - timedelta(days=2))
+
+        deleted = PageText.objects.evict(max_age=timedelta(days=1), max_size=10 ** 6)
+
+        self.assertEqual(deleted, 3)
+        self.assertIsNone(PageText.objects.get_pages(self.parse_file.file_hash))
+
+    def test_evict_by_size(self):
+        """Проверяет, что при превышении объема удаляются давно использованные документы."""
+        PageText.objects.save_pages('old', self.parsed_pages)
+        PageText.objects.update(used_at=timezone.now() - timedelta(hours=1))
+        PageText.objects.save_pages('new', self.parsed_pages)
+
+        PageText.objects.evict(max_age=timedelta(days=1), max_size=sum(map(len, self.parsed_pages)))
+
+        self.assertIsNone(PageText.objects.get_pages('old'))
+        self.assertEqual(PageText.objects.get_pages('new'), self.parsed_pages)
+
+    def test_invalidation_on_delete(self):
+        PageText.objects.save_pages(self.parse_file.file_hash, self.parsed_pages)
+
+        self.parse_file.delete()
+
+        self.assertFalse(PageText.objects.exists())
@@ -0,0 +1,250 @@
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from http import HTTPStatus
+from unittest import mock
+from unittest.mock import Mock, MagicMock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from certificates.models import Course, CertificateType, ParseBatch, ParseFile, ParseSession
+from certificates.services import BatchCalibrationService
+
+
+class ParseBatchTestCase(TestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+
+    def setUp(self):
+        self.course = Course.objects.create(name='test name')
+        self.certificate_type = CertificateType.objects.create(name='test type name', course=self.course)
+        with open(f'{self.UPLOAD_DIRECTORY}/sample.pdf', 'rb') as file:
+            self.content = file.read()
+
+        for target, return_value in (
+            ('certificates.services.ParseDocumentPageService', Mock(return_value='\n\n\n \nIbrahim\n')),
+            ('certificates.services.ParsePdfPagesService',
+             Mock(return_value=['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n'])),
+        ):
+            patcher = mock.patch(target)
+            service: MagicMock = patcher.start()
+            service.return_value = return_value
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        file_paths = {parse_file.file.path for parse_file in ParseFile.objects.all()}
+        file_paths.update(parse_session.certificates.path for parse_session in ParseSession.objects.all()
+                          if parse_session.certificates)
+        for file_path in file_paths:
+            os.remove(file_path)
+
+    def split_queued(self):
+        with self.assertLogs('certificates', level='INFO'):
+            call_command('process_parse_sessions', once=True)
+
+
+class BatchCalibrationServiceTest(ParseBatchTestCase):
+
+    def test_error_does_not_stop_other_files(self):
+        """Проверяет, что ошибка калибровки одного файла не прерывает калибровку остальных."""
+        with self.assertLogs('certificates', level='INFO'):
+            results = BatchCalibrationService(pdf_files=[
+                io.BytesIO(self.content), io.BytesIO(b'%PDF-broken'), io.BytesIO(self.content),
+            ])()
+
+        self.assertEqual(results[0], ('\n\n\n \nIbrahim\n', 5))
+        self.assertIsInstance(results[1], Exception)
+        self.assertEqual(results[2], ('\n\n\n \nIbrahim\n', 5))
+
+
+class ParseBatchViewTest(ParseBatchTestCase):
+
+    def get_create_url(self) -> str:
+        return reverse('parse-batch-create', kwargs={
+            'course_slug': self.course.slug,
+            'slug': self.certificate_type.slug,
+        })
+
+    def upload(self, files: list, **data):
+        data = {
+            'files': files,
+            'start_with_policy': ParseBatch.StartWithPolicy.AUTO,
+            'archive_mode': ParseBatch.ArchiveMode.COMBINED,
+            **data,
+        }
+        with self.assertLogs('certificates', level='INFO'):
+            return self.client.post(self.get_create_url(), data=data)
+
+    def test_auto_policy(self):
+        """Проверяет, что при автоматическом начале имени все файлы пакета сразу ставятся в очередь."""
+        response = self.upload([SimpleUploadedFile('first.pdf', self.content),
+                                SimpleUploadedFile('second.pdf', self.content)])
+
+        batch = ParseBatch.objects.get()
+        self.assertRedirects(response, batch.get_absolute_url())
+        self.assertEqual(batch.parse_files.count(), 2)
+        self.assertListEqual(
+            list(batch.get_parse_sessions().values_list('start_with', 'status')),
+            [(5, ParseSession.Status.QUEUED)] * 2,
+        )
+
+    def test_calibration_outside_transaction(self):
+        """Проверяет, что файлы калибруются до открытия транзакции, в которой сохраняется пакет."""
+        savepoints = []
+        calibrate = BatchCalibrationService.__call__
+
+        def record_savepoints(service: BatchCalibrationService):
+            savepoints.append(len(connection.savepoint_ids))
+            return calibrate(service)
+
+        outer_savepoints = len(connection.savepoint_ids)
+        with mock.patch.object(BatchCalibrationService, '__call__', record_savepoints):
+            self.upload([SimpleUploadedFile('first.pdf', self.content)])
+
+        self.assertEqual(savepoints, [outer_savepoints])
+        self.assertEqual(ParseBatch.objects.get().parse_files.count(), 1)
+
+    def test_calibrated_at_zero_offset(self):
+        """Проверяет, что файл с именем в начале текста страницы не калибруется повторно при сохранении."""
+        with mock.patch.object(BatchCalibrationService, '__call__', return_value=[('Ibrahim\n', 0)]), \
+                mock.patch('certificates.models.CalibrationDataService') as calibration_service:
+            self.client.post(self.get_create_url(), data={
+                'files': [SimpleUploadedFile('first.pdf', self.content)],
+                'start_with_policy': ParseBatch.StartWithPolicy.AUTO,
+                'archive_mode': ParseBatch.ArchiveMode.COMBINED,
+            })
+
+        calibration_service.assert_not_called()
+        parse_file = ParseBatch.objects.get().parse_files.get()
+        self.assertEqual(parse_file.start_with_auto, 0)
+        self.assertEqual(parse_file.parse_sessions.get().start_with, 0)
+
+    def test_per_file_policy(self):
+        """Проверяет разделение файлов пакета с началом имени, заданным для каждого файла."""
+        self.upload([SimpleUploadedFile('first.pdf', self.content), SimpleUploadedFile('second.pdf', self.content)],
+                    start_with_policy=ParseBatch.StartWithPolicy.PER_FILE)
+        batch = ParseBatch.objects.get()
+        first_file, second_file = batch.parse_files.order_by('pk')
+        self.assertFalse(batch.get_parse_sessions().exists())
+
+        self.client.post(batch.get_absolute_url(), data={f'start_with_{first_file.pk}': 4})
+
+        self.assertEqual(first_file.parse_sessions.get().start_with, 4)
+        self.assertEqual(second_file.parse_sessions.get().start_with, 5)
+
+    def test_invalid_file_reported(self):
+        response = self.upload([SimpleUploadedFile('first.pdf', self.content),
+                                SimpleUploadedFile('broken.pdf', b'not a pdf document')])
+
+        batch = ParseBatch.objects.get()
+        self.assertEqual(batch.parse_files.count(), 1)
+        detail_response = self.client.get(response.url)
+        self.assertContains(detail_response, 'broken.pdf: Файл не является pdf документом')
+
+    def test_no_valid_files(self):
+        response = self.client.post(self.get_create_url(), data={
+            'files': [SimpleUploadedFile('broken.pdf', b'not a pdf document')],
+            'start_with_policy': ParseBatch.StartWithPolicy.AUTO,
+            'archive_mode': ParseBatch.ArchiveMode.COMBINED,
+        })
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(ParseBatch.objects.exists())
+
+    @override_settings(BATCH_MAX_FILES=1)
+    def test_too_many_files(self):
+        response = self.client.post(self.get_create_url(), data={
+            'files': [SimpleUploadedFile('first.pdf', self.content), SimpleUploadedFile('second.pdf', self.content)],
+            'start_with_policy': ParseBatch.StartWithPolicy.AUTO,
+            'archive_mode': ParseBatch.ArchiveMode.COMBINED,
+        })
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(ParseBatch.objects.exists())
+
+    def test_download_combined_archive(self):
+        """Проверяет, что общий архив пакета содержит сертификаты каждого файла в отдельной папке."""
+        self.upload([SimpleUploadedFile('sample.pdf', self.content), SimpleUploadedFile('sample.pdf', self.content)])
+        batch = ParseBatch.objects.get()
+        download_url = reverse('parse-batch-download', kwargs={'pk': batch.pk})
+        self.assertEqual(self.client.get(download_url).status_code, HTTPStatus.NOT_FOUND)
+
+        self.split_queued()
+        self.assertContains(self.client.get(batch.get_absolute_url()), download_url)
+        response = self.client.get(download_url)
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertListEqual(archive.namelist(), [
+                'sample_5/Ibrahim.pdf', 'sample_5/Ibrahim_1.pdf', 'sample_5/Yusuf.pdf',
+                'sample_5_1/Ibrahim.pdf', 'sample_5_1/Ibrahim_1.pdf', 'sample_5_1/Yusuf.pdf',
+            ])
+
+    @override_settings(CERTIFICATES_ARCHIVE_MODE='stream')
+    def test_download_combined_archive_stream_mode(self):
+        self.upload([SimpleUploadedFile('sample.pdf', self.content)])
+        batch = ParseBatch.objects.get()
+        self.split_queued()
+
+        response = self.client.get(reverse('parse-batch-download', kwargs={'pk': batch.pk}))
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertListEqual(archive.namelist(),
+                                 ['sample_5/Ibrahim.pdf', 'sample_5/Ibrahim_1.pdf', 'sample_5/Yusuf.pdf'])
+
+
+class IngestCertificatesCommandTest(ParseBatchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.input_directory = tempfile.mkdtemp()
+        self.output_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.input_directory)
+        self.addCleanup(shutil.rmtree, self.output_directory)
+        # Одинаковые файлы хранятся один раз под именем первого, поэтому содержимое файлов различается
+        for file_name in ('first.pdf', 'second.pdf'):
+            with open(os.path.join(self.input_directory, file_name), 'wb') as file:
+                file.write(self.content + f'\n%{file_name}\n'.encode())
+        with open(os.path.join(self.input_directory, 'notes.txt'), 'w') as file:
+            file.write('not a certificate')
+
+    def ingest(self, *args, **options):
+        stdout = io.StringIO()
+        with self.assertLogs('certificates', level='INFO'):
+            call_command('ingest_certificates', self.course.slug, self.certificate_type.slug, *args,
+                         stdout=stdout, stderr=io.StringIO(), **options)
+        return stdout.getvalue()
+
+    def test_queue_directory(self):
+        """Проверяет, что без --output разделение файлов каталога ставится в очередь."""
+        stdout = self.ingest(self.input_directory)
+
+        batch = ParseBatch.objects.get()
+        self.assertIn(f'Пакет {batch.pk}: загружено файлов 2 из 2', stdout)
+        self.assertListEqual(sorted(batch.parse_files.values_list('file', flat=True)),
+                             ['parse_files/first.pdf', 'parse_files/second.pdf'])
+        self.assertEqual(batch.get_parse_sessions().filter(status=ParseSession.Status.QUEUED).count(), 2)
+
+    def test_combined_archive(self):
+        self.ingest(self.input_directory, output=self.output_directory)
+
+        batch = ParseBatch.objects.get()
+        with zipfile.ZipFile(os.path.join(self.output_directory, batch.archive_name)) as archive:
+            self.assertListEqual(archive.namelist(), [
+                'first_5/Ibrahim.pdf', 'first_5/Ibrahim_1.pdf', 'first_5/Yusuf.pdf',
+                'second_5/Ibrahim.pdf', 'second_5/Ibrahim_1.pdf', 'second_5/Yusuf.pdf',
+            ])
+
+    def test_per_file_archives(self):
+        """Проверяет архив для каждого файла и начало имени, заданное для файла."""
+        self.ingest(os.path.join(self.input_directory, 'first.pdf'), os.path.join(self.input_directory, 'second.pdf'),
+                    '--start-with', 'second.pdf=4', start_with_policy='per_file', archive_mode='per_file',
+                    output=self.output_directory)
+
+        self.assertListEqual(sorted(os.listdir(self.output_directory)), ['first_5.zip', 'second_4.zip'])
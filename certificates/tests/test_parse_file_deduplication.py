@@ -0,0 +1,73 @@
+import os
+from unittest import mock
+from unittest.mock import Mock, MagicMock
+
+from django.conf import settings
+from django.core.files import File
+from django.test import TestCase
+
+from certificates.models import Course, CertificateType, ParseFile
+
+
+class ParseFileDeduplicationTest(TestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+
+    @mock.patch('certificates.services.ParseDocumentPageService')
+    def setUp(self, parse_pdf_service: MagicMock):
+        self.parsed_data = '\n\n\n \nIbrahim\n'
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
+
+        self.course = Course.objects.create(name='test name')
+        self.certificate_types = [
+            CertificateType.objects.create(name=name, course=self.course)
+            for name in ('arabic', 'russian')
+        ]
+        self.parse_files = [self._create_parse_file(certificate_type) for certificate_type in self.certificate_types]
+        self.parse_pdf_service = parse_pdf_service
+
+    def tearDown(self):
+        if os.path.exists(self.parse_files[0].file.path):
+            os.remove(self.parse_files[0].file.path)
+
+    def _create_parse_file(self, certificate_type: CertificateType) -> ParseFile:
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file:
+            return ParseFile.objects.create(
+                file=File(file, name=os.path.basename(file.name)),
+                certificate_type=certificate_type,
+            )
+
+    def test_shared_file(self):
+        """Проверяет, что одинаковый файл сохраняется и калибруется один раз."""
+        first_file, second_file = self.parse_files
+
+        self.parse_pdf_service.assert_called_once()
+        self.assertEqual(first_file.file_hash, second_file.file_hash)
+        self.assertEqual(first_file.file.name, second_file.file.name)
+        self.assertEqual(second_file.parsed_page, self.parsed_data)
+        self.assertEqual(second_file.start_with_auto, first_file.start_with_auto)
+
+    @mock.patch('certificates.models.CalibrationDataService')
+    def test_shared_zero_offset(self, calibration_service: MagicMock):
+        """Проверяет, что имя в начале текста страницы не приводит к повторной калибровке копии."""
+        ParseFile.objects.update(start_with_auto=0)
+        certificate_type = CertificateType.objects.create(name='english', course=self.course)
+
+        parse_file = self._create_parse_file(certificate_type)
+
+        calibration_service.assert_not_called()
+        self.assertEqual(parse_file.start_with_auto, 0)
+        self.assertEqual(parse_file.parsed_page, self.parsed_data)
+
+    def test_shared_file_deleted_with_last_reference(self):
+        """Проверяет, что общий файл удаляется только вместе с последней ссылкой на него."""
+        first_file, second_file = self.parse_files
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first_file.delete()
+        self.assertTrue(os.path.exists(second_file.file.path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second_file.delete()
+        self.assertFalse(os.path.exists(second_file.file.path))
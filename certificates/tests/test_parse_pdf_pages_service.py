@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from certificates.helpers import FileHelper
+from certificates.services import ParsePdfPagesService
+
+
+class ParsePdfPagesServiceTest(SimpleTestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+
+    def setUp(self):
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file_stream:
+            self.parsed_pages = ParsePdfPagesService(pdf_file=file_stream.read())()
+
+    def test_pages_count(self):
+        """Проверяет, что текст получен для каждой страницы документа."""
+        self.assertEqual(len(self.parsed_pages), 3)
+
+    def test_certificate_names(self):
+        """Проверяет, что имена сертификатов извлекаются по смещению первой страницы."""
+        name_position = FileHelper.get_first_alpha_from_string(self.parsed_pages[0])
+        names = [
+            FileHelper.trim_string_to_newline(string=page, trim_from=name_position)
+            for page in self.parsed_pages
+        ]
+        self.assertListEqual(names, ['Ibrahim', 'Ibrahim', 'Yusuf'])
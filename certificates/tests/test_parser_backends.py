@@ -0,0 +1,70 @@
+from unittest import mock
+from unittest.mock import MagicMock
+
+import fitz
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from certificates.helpers import FileHelper
+from certificates.services import PyMuPDFParserBackend, PdfMinerParserBackend, \
+    TikaParserBackend, ParsePdfPagesService
+
+
+class ParserBackendsCompatibilityTest(SimpleTestCase):
+    """Проверяет, что все бэкенды совместимы с калибровкой по смещению."""
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+    CERTIFICATE_NAMES = ['Ibrahim', 'Ibrahim', 'Yusuf']
+    TIKA_RESPONSE = (
+        '<html xmlns="http://www.w3.org/1999/xhtml">\n<head>\n<meta name="producer" content="PyPDF2"/>\n'
+        '<title></title>\n</head>\n<body>'
+        '<div class="page"><p/>\n<p> \n \n \nIbrahim\n3861\n</p>\n<p/>\n</div>\n'
+        '<div class="page"><p/>\n<p> \n \n \nIbrahim\n3861\n</p>\n<p/>\n</div>\n'
+        '<div class="page"><p/>\n<p> \n \n \nYusuf\n5238\n</p>\n<p/>\n</div>\n'
+        '</body></html>'
+    )
+
+    def setUp(self):
+        with open(f'{self.UPLOAD_DIRECTORY}/sample.pdf', 'rb') as file_stream:
+            self.pdf_file = file_stream.read()
+
+    def _get_names(self, parsed_pages: list) -> list:
+        name_position = FileHelper.get_first_alpha_from_string(parsed_pages[0])
+        return [
+            FileHelper.format_file_name(FileHelper.trim_string_to_newline(string=page, trim_from=name_position))
+            for page in parsed_pages
+        ]
+
+    def test_pymupdf_backend(self):
+        parsed_pages = PyMuPDFParserBackend().parse_pages(self.pdf_file)
+        self.assertListEqual(self._get_names(parsed_pages), self.CERTIFICATE_NAMES)
+
+    def test_pdfminer_backend(self):
+        parsed_pages = PdfMinerParserBackend().parse_pages(self.pdf_file)
+        self.assertListEqual(self._get_names(parsed_pages), self.CERTIFICATE_NAMES)
+
+    @mock.patch('certificates.services.get_tika_client')
+    def test_tika_backend(self, get_tika_client: MagicMock):
+        get_tika_client.return_value.put.return_value = self.TIKA_RESPONSE
+        parsed_pages = TikaParserBackend().parse_pages(self.pdf_file)
+        self.assertListEqual(self._get_names(parsed_pages), self.CERTIFICATE_NAMES)
+
+    def test_single_page_matches_pages(self):
+        """Проверяет, что текст документа совпадает с объединенным текстом страниц."""
+        backend = PyMuPDFParserBackend()
+        self.assertEqual(backend.parse(self.pdf_file), ''.join(backend.parse_pages(self.pdf_file)))
+
+    @override_settings(PDF_PARSER_BACKEND='certificates.services.PdfMinerParserBackend')
+    def test_backend_from_settings(self):
+        with mock.patch.object(PdfMinerParserBackend, 'parse_pages', return_value=['Ibrahim']) as parse_pages:
+            parsed_pages = ParsePdfPagesService(pdf_file=self.pdf_file)()
+        parse_pages.assert_called_once_with(self.pdf_file)
+        self.assertListEqual(parsed_pages, ['Ibrahim'])
+
+    def test_document_page(self):
+        """Проверяет извлечение одной страницы открытого документа всеми бэкендами."""
+        document = fitz.open(stream=self.pdf_file, filetype='pdf')
+        for backend in (PyMuPDFParserBackend(), PdfMinerParserBackend()):
+            with self.subTest(backend=backend.__class__.__name__):
+                parsed_page = backend.parse_document_page(document, 2)
+                self.assertListEqual(self._get_names([parsed_page]), ['Yusuf'])
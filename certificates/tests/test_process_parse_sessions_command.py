@@ -0,0 +1,79 @@
+import os
+from unittest import mock
+from unittest.mock import Mock, MagicMock
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management import call_command
+from django.test import TestCase
+
+from certificates.models import Course, CertificateType, ParseFile, \
+    ParseSession
+
+
+class ProcessParseSessionsCommandTest(TestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+    NAME_POSITION = 5
+
+    @mock.patch('certificates.services.ParseDocumentPageService')
+    def setUp(self, parse_pdf_service: MagicMock):
+        self.parsed_data = '\n\n\n \nIbrahim\n'
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
+
+        self.course = Course.objects.create(name='test name')
+        self.certificate_type = CertificateType.objects.create(
+            name='test type name',
+            course=self.course,
+        )
+
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file:
+            self.parse_file = ParseFile.objects.create(
+                file=File(file, name=os.path.basename(file.name)),
+                certificate_type=self.certificate_type,
+            )
+
+        self.parse_session = ParseSession.objects.create(
+            parse_file=self.parse_file,
+            start_with=self.NAME_POSITION,
+        )
+
+    def tearDown(self):
+        os.remove(self.parse_file.file.path)
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_success(self, parse_pdf_service: MagicMock):
+        """Проверяет обработку сессии из очереди."""
+        parse_pdf_service.return_value = Mock(
+            return_value=['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n'],
+        )
+
+        call_command('process_parse_sessions', once=True)
+
+        self.parse_session.refresh_from_db()
+        os.remove(self.parse_session.certificates.path)
+        self.assertEqual(self.parse_session.status, ParseSession.Status.DONE)
+        self.assertEqual(self.parse_session.pages_processed, 3)
+        self.assertEqual(self.parse_session.pages_total, 3)
+        self.assertIsNotNone(self.parse_session.finished_at)
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_failed(self, parse_pdf_service: MagicMock):
+        """Проверяет сохранение ошибки разделения."""
+        parse_pdf_service.return_value = Mock(side_effect=ValueError('broken pdf'))
+
+        call_command('process_parse_sessions', once=True)
+
+        self.parse_session.refresh_from_db()
+        self.assertEqual(self.parse_session.status, ParseSession.Status.FAILED)
+        self.assertEqual(self.parse_session.error, 'broken pdf')
+        self.assertFalse(self.parse_session.certificates)
+
+    def test_claim_next(self):
+        """Проверяет, что сессия забирается из очереди только один раз."""
+        claimed_session = ParseSession.objects.claim_next()
+
+        self.assertEqual(claimed_session, self.parse_session)
+        self.assertEqual(claimed_session.status, ParseSession.Status.RUNNING)
+        self.assertIsNone(ParseSession.objects.claim_next())
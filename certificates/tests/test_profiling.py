@@ -0,0 +1,171 @@
+import os
+import time
+from http import HTTPStatus
+from unittest import mock
+from unittest.mock import Mock, MagicMock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from certificates.models import Course, CertificateType, ParseFile, ParseSession
+from certificates.profiling import CProfileProfiler, SamplingProfiler, format_stats
+
+
+def busy_loop(duration: float) -> int:
+    total = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+class ProfilerTest(SimpleTestCase):
+
+    def test_cprofile(self):
+        """Проверяет, что cProfile сохраняет статистику и свернутые стеки."""
+        with CProfileProfiler() as profiler:
+            busy_loop(0.05)
+
+        self.assertIn('busy_loop', format_stats(profiler.get_stats()))
+        lines = profiler.get_collapsed().decode('utf-8').splitlines()
+        busy_loop_lines = [line for line in lines if line.rpartition(' ')[0].endswith(':busy_loop')]
+        self.assertEqual(len(busy_loop_lines), 1)
+        self.assertGreater(int(busy_loop_lines[0].rpartition(' ')[2]), 0)
+        self.assertTrue(all(line.rpartition(' ')[2].isdigit() for line in lines))
+
+    def test_sampling(self):
+        """Проверяет, что сэмплирующий профилировщик записывает стеки профилируемого потока."""
+        with SamplingProfiler(interval=0.001) as profiler:
+            busy_loop(0.1)
+
+        self.assertIsNone(profiler.get_stats())
+        collapsed = profiler.get_collapsed().decode('utf-8')
+        self.assertIn(':busy_loop', collapsed)
+        self.assertNotIn('sampling-profiler', collapsed)
+
+
+class ParseSessionProfilingTest(TestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+
+    @mock.patch('certificates.services.ParseDocumentPageService')
+    def setUp(self, parse_pdf_service: MagicMock):
+        parse_pdf_service.return_value = Mock(return_value='\n\n\n \nIbrahim\n')
+        parse_pdf_pages_service_patcher = mock.patch('certificates.services.ParsePdfPagesService')
+        parse_pdf_pages_service: MagicMock = parse_pdf_pages_service_patcher.start()
+        parse_pdf_pages_service.return_value = Mock(
+            return_value=['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n'],
+        )
+        self.addCleanup(parse_pdf_pages_service_patcher.stop)
+
+        course = Course.objects.create(name='test name')
+        self.certificate_type = CertificateType.objects.create(name='test type name', course=course)
+        with open(f'{self.UPLOAD_DIRECTORY}/sample.pdf', 'rb') as file:
+            self.parse_file = ParseFile.objects.create(
+                file=File(file, name=os.path.basename(file.name)),
+                certificate_type=self.certificate_type,
+            )
+        self.parse_session = ParseSession.objects.create(parse_file=self.parse_file, start_with=5)
+
+        self.user = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        os.remove(self.parse_file.file.path)
+        for parse_session in ParseSession.objects.all():
+            for field_file in (parse_session.certificates, parse_session.profile_stats, parse_session.profile_stacks):
+                if field_file:
+                    os.remove(field_file.path)
+
+    def split(self):
+        with self.assertLogs('certificates', level='INFO'):
+            self.parse_session.split_certificates()
+        self.parse_session.refresh_from_db()
+
+    def test_without_profiler(self):
+        self.split()
+
+        self.assertFalse(self.parse_session.profile_stats)
+        self.assertFalse(self.parse_session.profile_stacks)
+
+    def test_cprofile(self):
+        """Проверяет, что результат профилирования сохраняется рядом с сессией."""
+        self.parse_session.profiler = ParseSession.Profiler.CPROFILE
+        self.split()
+
+        self.assertEqual(self.parse_session.status, ParseSession.Status.DONE)
+        self.assertEqual(self.parse_session.profile_stats.name, f'profiles/session_{self.parse_session.pk}.pstats')
+        self.assertEqual(self.parse_session.profile_stacks.name,
+                         f'profiles/session_{self.parse_session.pk}.collapsed')
+        with self.parse_session.profile_stacks.open('rb') as stacks_file:
+            self.assertIn(b':_write_certificates', stacks_file.read())
+
+    @override_settings(SPLIT_PROFILER='sampling', SPLIT_PROFILER_INTERVAL=0.001)
+    def test_profiler_from_settings(self):
+        self.split()
+
+        self.assertFalse(self.parse_session.profile_stats)
+        self.assertTrue(self.parse_session.profile_stacks)
+
+    def test_profile_replaced(self):
+        """Проверяет, что повторное профилирование заменяет прошлый результат."""
+        self.parse_session.profiler = ParseSession.Profiler.CPROFILE
+        self.split()
+        previous_stats_path = self.parse_session.profile_stats.path
+        self.parse_session.profiler = ParseSession.Profiler.SAMPLING
+        self.split()
+
+        self.assertFalse(os.path.exists(previous_stats_path))
+        self.assertFalse(self.parse_session.profile_stats)
+
+    def test_admin_profile(self):
+        """Проверяет просмотр и скачивание профиля в администрировании."""
+        self.parse_session.profiler = ParseSession.Profiler.CPROFILE
+        self.split()
+
+        change_response = self.client.get(
+            reverse('admin:certificates_parsesession_change', args=[self.parse_session.pk]))
+        profile_url = reverse('admin:certificates_parsesession_profile', args=[self.parse_session.pk])
+        stacks_url = reverse('admin:certificates_parsesession_profile_download', args=[self.parse_session.pk, 'stacks'])
+        self.assertContains(change_response, profile_url)
+        self.assertContains(change_response, stacks_url)
+
+        profile_response = self.client.get(profile_url)
+        self.assertContains(profile_response, '_write_certificates')
+
+        stacks_response = self.client.get(stacks_url)
+        self.assertEqual(stacks_response['Content-Disposition'],
+                         f'attachment; filename="session_{self.parse_session.pk}.collapsed"')
+        self.assertIn(b':_write_certificates', b''.join(stacks_response.streaming_content))
+
+        self.client.logout()
+        self.assertNotEqual(self.client.get(stacks_url).status_code, HTTPStatus.OK)
+
+    def test_admin_requeue_with_profiler(self):
+        self.split()
+
+        self.client.post(reverse('admin:certificates_parsesession_changelist'), data={
+            'action': 'requeue_with_cprofile',
+            '_selected_action': [self.parse_session.pk],
+        })
+
+        self.parse_session.refresh_from_db()
+        self.assertEqual(self.parse_session.status, ParseSession.Status.QUEUED)
+        self.assertEqual(self.parse_session.profiler, ParseSession.Profiler.CPROFILE)
+
+    def test_profiler_requires_staff(self):
+        """Проверяет, что профилирование при создании сессии включает только персонал."""
+        url = reverse('parse-session-create', kwargs={
+            'course_slug': self.certificate_type.course.slug,
+            'slug': self.certificate_type.slug,
+            'pk': self.parse_file.pk,
+        })
+        self.client.post(url, data={'start_with': 6, 'profiler': 'cprofile'})
+        self.client.logout()
+        self.client.post(url, data={'start_with': 7, 'profiler': 'cprofile'})
+
+        self.assertEqual(ParseSession.objects.get(start_with=6).profiler, ParseSession.Profiler.CPROFILE)
+        self.assertEqual(ParseSession.objects.get(start_with=7).profiler, ParseSession.Profiler.NONE)
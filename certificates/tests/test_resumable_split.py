@@ -0,0 +1,270 @@
+import gc
+import os
+import sys
+import time
+import uuid
+import zipfile
+from datetime import timedelta
+from io import StringIO
+from typing import List, Optional
+from unittest import mock
+from unittest.mock import Mock, MagicMock
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from certificates.models import Course, CertificateType, ParseFile, \
+    ParseSession, SplitCheckpoint, SessionLostError
+from certificates.services import CheckpointedZipFile, SplitCertificatesService, split_pdf_pages, _split_pages
+
+
+class Crash(Exception):
+    pass
+
+
+@override_settings(SPLIT_CHUNK_SIZE=1, SPLIT_CHECKPOINT_INTERVAL=1)
+class ResumableSplitCertificatesServiceTest(SimpleTestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+    NAME_POSITION = 5
+
+    def setUp(self):
+        self.parsed_data = ['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n']
+        self.certificate_files = ['Ibrahim.pdf', 'Ibrahim_1.pdf', 'Yusuf.pdf']
+        self.archive_path = str(SplitCertificatesService.ARCHIVE_SAVE_PATH / 'session_test.zip')
+        self.checkpoints = []
+
+    def tearDown(self):
+        for path in (self.archive_path, f'{self.archive_path}.part'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _crash_after(self, pages: int):
+        def progress_callback(pages_processed: int, pages_total: int) -> None:
+            if pages_processed >= pages:
+                raise Crash()
+        return progress_callback
+
+    def _split(self, checkpoints: Optional[List[dict]] = None, progress_callback=None,
+               parsed_pages: Optional[List[str]] = None) -> SplitCertificatesService:
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file_stream:
+            service = SplitCertificatesService(
+                pdf_file=file_stream,
+                name_position=self.NAME_POSITION,
+                progress_callback=progress_callback,
+                parsed_pages=parsed_pages or self.parsed_data,
+                archive_path=self.archive_path,
+                checkpoints=checkpoints,
+                checkpoint_callback=self.checkpoints.extend,
+            )
+            service()
+        return service
+
+    def _assert_archive(self) -> None:
+        self.assertFalse(os.path.exists(f'{self.archive_path}.part'))
+        with zipfile.ZipFile(self.archive_path) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertListEqual(archive.namelist(), self.certificate_files)
+
+    def test_checkpoints(self):
+        """Проверяет, что записанные страницы фиксируются с именами и смещениями."""
+        self._split()
+
+        self._assert_archive()
+        self.assertListEqual([checkpoint['page_index'] for checkpoint in self.checkpoints], [0, 1, 2])
+        self.assertListEqual([checkpoint['name'] for checkpoint in self.checkpoints], self.certificate_files)
+        self.assertEqual(self.checkpoints[1]['header_offset'], self.checkpoints[0]['end_offset'])
+
+    def test_resume_after_crash(self):
+        """Проверяет продолжение разделения с последней зафиксированной страницы."""
+        with self.assertRaises(Crash):
+            self._split(progress_callback=self._crash_after(2))
+        self.assertEqual(len(self.checkpoints), 2)
+        # Обработчик упал, не дописав следующую страницу
+        with open(f'{self.archive_path}.part', 'ab') as part:
+            part.write(b'PK\x03\x04 half-written entry')
+
+        with mock.patch('certificates.services.split_pdf_pages', wraps=split_pdf_pages) as split_pages:
+            service = self._split(checkpoints=self.checkpoints[:2])
+
+        self.assertEqual(split_pages.call_args.kwargs['start'], 2)
+        self.assertListEqual(service.page_names, self.certificate_files)
+        self._assert_archive()
+
+    @override_settings(SPLIT_PIPELINE='async')
+    def test_resume_async_pipeline(self):
+        with self.assertRaises(Crash):
+            self._split(progress_callback=self._crash_after(1))
+
+        service = self._split(checkpoints=self.checkpoints[:1])
+
+        self.assertListEqual(service.page_names, self.certificate_files)
+        self._assert_archive()
+
+    @override_settings(SPLIT_CHECKPOINT_INTERVAL=10)
+    def test_close_after_lost_session(self):
+        """Проверяет, что архив потерянной сессии закрывается без повторной фиксации."""
+        checkpoint_callback = Mock(side_effect=SessionLostError)
+        archive = CheckpointedZipFile(f'{self.archive_path}.part', [], checkpoint_callback)
+        archive.writestr('Ibrahim.pdf', b'page')
+
+        with self.assertRaises(SessionLostError):
+            archive.close()
+        with mock.patch.object(sys, 'unraisablehook') as unraisablehook:
+            archive.close()
+            del archive
+            gc.collect()
+
+        checkpoint_callback.assert_called_once()
+        unraisablehook.assert_not_called()
+
+
+class ResumableParseSessionTest(TestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+    NAME_POSITION = 5
+
+    @mock.patch('certificates.services.ParseDocumentPageService')
+    def setUp(self, parse_pdf_service: MagicMock):
+        parse_pdf_service.return_value = Mock(return_value='\n\n\n \nIbrahim\n')
+
+        self.course = Course.objects.create(name='test name')
+        self.certificate_type = CertificateType.objects.create(
+            name='test type name',
+            course=self.course,
+        )
+
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file:
+            self.parse_file = ParseFile.objects.create(
+                file=File(file, name=os.path.basename(file.name)),
+                certificate_type=self.certificate_type,
+            )
+
+        self.parse_session = ParseSession.objects.create(
+            parse_file=self.parse_file,
+            start_with=self.NAME_POSITION,
+        )
+        self.parsed_pages = ['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n']
+
+    def tearDown(self):
+        os.remove(self.parse_file.file.path)
+        for path in (self.parse_session.archive_path, f'{self.parse_session.archive_path}.part'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @override_settings(SPLIT_CHUNK_SIZE=1, SPLIT_CHECKPOINT_INTERVAL=1)
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_resume(self, parse_pdf_service: MagicMock):
+        """Проверяет, что повторный запуск после ошибки продолжает недописанный архив."""
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_pages)
+
+        def crash_on_last_page(pdf_source, writer_options: dict, page_range: range) -> List[bytes]:
+            if page_range.start == 2:
+                raise Crash()
+            return _split_pages(pdf_source, writer_options, page_range)
+
+        with mock.patch('certificates.services._split_pages', side_effect=crash_on_last_page):
+            self.parse_session.split_certificates()
+
+        self.assertEqual(self.parse_session.status, ParseSession.Status.FAILED)
+        self.assertEqual(self.parse_session.checkpoints.count(), 2)
+        self.assertTrue(os.path.exists(f'{self.parse_session.archive_path}.part'))
+
+        self.parse_session.requeue()
+        with mock.patch('certificates.services._split_pages', wraps=_split_pages) as split_worker:
+            self.parse_session.split_certificates()
+
+        split_worker.assert_called_once()
+        self.assertEqual(split_worker.call_args.args[-1], range(2, 3))
+        self.assertEqual(self.parse_session.status, ParseSession.Status.DONE)
+        self.assertEqual(self.parse_session.certificates.path, self.parse_session.archive_path)
+        self.assertFalse(self.parse_session.checkpoints.exists())
+        with zipfile.ZipFile(self.parse_session.certificates.path) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertListEqual(archive.namelist(), ['Ibrahim.pdf', 'Ibrahim_1.pdf', 'Yusuf.pdf'])
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_stale_checkpoints_discarded(self, parse_pdf_service: MagicMock):
+        """Проверяет, что записи без недописанного архива не используются."""
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_pages)
+        SplitCheckpoint.objects.create(parse_session=self.parse_session, page_index=0, name='Ibrahim.pdf',
+                                       header_offset=0, end_offset=100, zip_info={})
+
+        self.parse_session.split_certificates()
+
+        self.assertEqual(self.parse_session.status, ParseSession.Status.DONE)
+        self.assertFalse(self.parse_session.checkpoints.exists())
+
+    def test_requeue_stale(self):
+        ParseSession.objects.claim_next()
+        self.assertEqual(ParseSession.objects.requeue_stale(timeout=timedelta(minutes=5)), 0)
+
+        ParseSession.objects.filter(pk=self.parse_session.pk).update(
+            heartbeat_at=timezone.now() - timedelta(minutes=10),
+        )
+        self.assertEqual(ParseSession.objects.requeue_stale(timeout=timedelta(minutes=5)), 1)
+
+        self.parse_session.refresh_from_db()
+        self.assertEqual(self.parse_session.status, ParseSession.Status.QUEUED)
+
+    @override_settings(SPLIT_HEARTBEAT_INTERVAL=0.01)
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_heartbeat_during_parse(self, parse_pdf_service: MagicMock):
+        """Проверяет, что выполнение сессии подтверждается во время долгого извлечения текста."""
+        parse_pdf_service.return_value = Mock(side_effect=lambda: time.sleep(0.2) or self.parsed_pages)
+        owned_session = MagicMock()
+
+        with mock.patch.object(ParseSession, '_filter_owned', return_value=owned_session):
+            self.parse_session.split_certificates()
+
+        heartbeats = [call for call in owned_session.update.call_args_list if call.kwargs.keys() == {'heartbeat_at'}]
+        self.assertGreaterEqual(len(heartbeats), 5)
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_lost_session_not_saved(self, parse_pdf_service: MagicMock):
+        """Проверяет, что сессия, которую забрал другой обработчик, не перезаписывается прежним."""
+        claimed_session = ParseSession.objects.claim_next()
+
+        def parse_and_lose_session() -> List[str]:
+            ParseSession.objects.filter(pk=claimed_session.pk).update(claim_token=uuid.uuid4())
+            return self.parsed_pages
+
+        parse_pdf_service.return_value = Mock(side_effect=parse_and_lose_session)
+        with self.assertLogs('certificates.models', level='WARNING'):
+            claimed_session.split_certificates()
+
+        self.parse_session.refresh_from_db()
+        self.assertEqual(self.parse_session.status, ParseSession.Status.RUNNING)
+        self.assertEqual(self.parse_session.pages_processed, 0)
+        self.assertFalse(self.parse_session.certificates)
+        self.assertFalse(self.parse_session.checkpoints.exists())
+
+    def test_sweep(self):
+        """Проверяет удаление брошенных временных файлов разделения."""
+        save_path = SplitCertificatesService.ARCHIVE_SAVE_PATH
+        save_path.mkdir(parents=True, exist_ok=True)
+        finished_session = ParseSession.objects.create(parse_file=self.parse_file, start_with=6,
+                                                       status=ParseSession.Status.FAILED)
+        orphaned = [save_path / 'orphaned_directory', save_path / 'orphaned.zip',
+                    save_path / f'session_{finished_session.pk}.zip.part']
+        kept = [save_path / f'session_{self.parse_session.pk}.zip.part', save_path / 'recent.zip']
+
+        os.makedirs(orphaned[0], exist_ok=True)
+        for path in orphaned[1:] + kept:
+            path.write_bytes(b'PK')
+        old_time = time.time() - 3600
+        for path in orphaned + kept[:1]:
+            os.utime(path, (old_time, old_time))
+
+        call_command('sweep_split_jobs', max_age=600, stdout=StringIO())
+
+        for path in orphaned:
+            self.assertFalse(path.exists(), path)
+        for path in kept:
+            self.assertTrue(path.exists(), path)
+            os.remove(path)
@@ -1,13 +1,23 @@
+import importlib.util
+import io
 import os
-import shutil
+import tempfile
+import threading
+import time
+import zipfile
 from pathlib import Path
-from unittest import mock
+from typing import List, Optional, Tuple
+from unittest import mock, skipUnless
 from unittest.mock import Mock, MagicMock
 
+from PIL import Image
 from django.conf import settings
-from django.test import SimpleTestCase
+import fitz
+from django.core.files import File
+from django.test import SimpleTestCase, override_settings
 
-from certificates.services import SplitCertificatesService
+from certificates.helpers import PdfSource
+from certificates.services import PyMuPDFParserBackend, SplitCertificatesService, TikaError, split_pdf_pages
 
 
 class SplitCertificatesServiceTest(SimpleTestCase):
@@ -15,11 +25,11 @@ class SplitCertificatesServiceTest(SimpleTestCase):
     UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
     NAME_POSITION = 5
 
-    @mock.patch('certificates.services.ParsePdfService')
+    @mock.patch('certificates.services.ParsePdfPagesService')
     def setUp(self, parse_pdf_service: MagicMock):
         self.parsed_data = ['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n']
         parse_pdf_service.return_value = Mock(
-            side_effect=self.parsed_data,
+            return_value=self.parsed_data,
         )
 
         file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
@@ -29,8 +39,6 @@ class SplitCertificatesServiceTest(SimpleTestCase):
                 name_position=self.NAME_POSITION,
             )()
 
-        self.archive_directory = os.path.dirname(self.certificates_archive)
-        self.archive_name = os.path.basename(self.certificates_archive)
         self.certificate_files = ['Ibrahim.pdf', 'Ibrahim_1.pdf', 'Yusuf.pdf']
 
     def tearDown(self):
@@ -43,13 +51,340 @@ class SplitCertificatesServiceTest(SimpleTestCase):
 
     def test_pdf_creating_with_equal_name(self):
         """Проверяет создания сертификатов с одинаковыми именами."""
+        with zipfile.ZipFile(self.certificates_archive) as archive:
+            files = archive.namelist()
 
-        extract_directory = self.archive_directory + '/' + os.path.splitext(self.archive_name)[0]
-        shutil.unpack_archive(self.certificates_archive, extract_directory)
-        files = os.listdir(extract_directory)
-
-        shutil.rmtree(extract_directory, ignore_errors=True)
         self.assertListEqual(files, self.certificate_files)
         self.assertEqual(len(files), 3)
 
+    def test_archive_without_compression(self):
+        """Проверяет, что по умолчанию сертификаты сохраняются без сжатия."""
+        with zipfile.ZipFile(self.certificates_archive) as archive:
+            compress_types = {info.compress_type for info in archive.infolist()}
+
+        self.assertSetEqual(compress_types, {zipfile.ZIP_STORED})
+
+    def test_temporary_files_removed(self):
+        """Проверяет, что рядом с архивом не остается временных файлов."""
+        extract_directory = os.path.splitext(self.certificates_archive)[0]
+        self.assertFalse(os.path.exists(extract_directory))
+
+
+class SplitCertificatesServicePoolTest(SimpleTestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+    NAME_POSITION = 5
+
+    def setUp(self):
+        self.parsed_data = ['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n']
+        self.certificate_files = ['Ibrahim.pdf', 'Ibrahim_1.pdf', 'Yusuf.pdf']
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def _split(self, parse_pdf_service: MagicMock) -> list:
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
+        progress = []
+
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file_stream:
+            certificates_archive = SplitCertificatesService(
+                pdf_file=file_stream,
+                name_position=self.NAME_POSITION,
+                progress_callback=lambda processed, total: progress.append((processed, total)),
+            )()
+
+        with zipfile.ZipFile(certificates_archive) as archive:
+            files = archive.namelist()
+        os.remove(certificates_archive)
+
+        self.assertListEqual(progress, [(1, 3), (2, 3), (3, 3)])
+        return files
+
+    @override_settings(SPLIT_WORKERS=2, SPLIT_EXECUTOR='thread', SPLIT_CHUNK_SIZE=1)
+    def test_thread_pool(self):
+        """Проверяет порядок имен при разделении в пуле потоков."""
+        self.assertListEqual(self._split(), self.certificate_files)
+
+    @override_settings(SPLIT_WORKERS=2, SPLIT_EXECUTOR='process', SPLIT_CHUNK_SIZE=1)
+    def test_process_pool(self):
+        """Проверяет порядок имен при разделении в пуле процессов."""
+        self.assertListEqual(self._split(), self.certificate_files)
+
+    @override_settings(SPLIT_WORKERS=2, SPLIT_EXECUTOR='thread', SPLIT_CHUNK_SIZE=1)
+    def test_pool_window(self):
+        """Проверяет, что пул сериализует не больше двух диапазонов на обработчик впереди записи."""
+        submitted = []
+
+        def split_pages(page_range: range) -> list:
+            submitted.append(page_range.start)
+            return [b'%PDF-']
+
+        with mock.patch('certificates.services._split_pages_worker', side_effect=split_pages):
+            page_chunks = split_pdf_pages(f'{self.UPLOAD_DIRECTORY}/sample.pdf', 20)
+            first_chunk = next(page_chunks)
+            submitted_before_write = len(submitted)
+            remaining_chunks = list(page_chunks)
+
+        self.assertEqual(first_chunk[0], range(0, 1))
+        self.assertLessEqual(submitted_before_write, 4)
+        self.assertListEqual([page_range.start for page_range, _ in remaining_chunks], list(range(1, 20)))
+
+    @override_settings(CERTIFICATES_ARCHIVE_COMPRESSION='deflated', CERTIFICATES_ARCHIVE_COMPRESSLEVEL=9)
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_archive_compression(self, parse_pdf_service: MagicMock):
+        """Проверяет сжатие архива, заданное в настройках."""
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
+
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file_stream:
+            certificates_archive = SplitCertificatesService(
+                pdf_file=file_stream,
+                name_position=self.NAME_POSITION,
+            )()
+
+        with zipfile.ZipFile(certificates_archive) as archive:
+            compress_types = {info.compress_type for info in archive.infolist()}
+        os.remove(certificates_archive)
+
+        self.assertSetEqual(compress_types, {zipfile.ZIP_DEFLATED})
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_source_opened_by_path(self, parse_pdf_service: MagicMock):
+        """Проверяет, что файл на диске передается обработчикам путем, а не содержимым."""
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
+
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file_stream, \
+                mock.patch('certificates.services.split_pdf_pages', wraps=split_pdf_pages) as split_pages:
+            certificates_archive = SplitCertificatesService(
+                pdf_file=File(file_stream, name='sample.pdf'),
+                name_position=self.NAME_POSITION,
+            )()
+        os.remove(certificates_archive)
+
+        parse_pdf_service.assert_called_once_with(pdf_file=file_path, backend=None)
+        self.assertEqual(split_pages.call_args.args[0], file_path)
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def test_archive_removed_on_error(self, parse_pdf_service: MagicMock):
+        """Проверяет, что недописанный архив удаляется при ошибке."""
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_data + ['\n\n\n \nIsa\n'])
+        archives_before = set(os.listdir(SplitCertificatesService.ARCHIVE_SAVE_PATH))
+
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file_stream, self.assertRaises(Exception):
+            SplitCertificatesService(
+                pdf_file=file_stream,
+                name_position=self.NAME_POSITION,
+            )()
+
+        self.assertSetEqual(set(os.listdir(SplitCertificatesService.ARCHIVE_SAVE_PATH)), archives_before)
+
+
+class SplitPdfPagesWriterTest(SimpleTestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+
+    def setUp(self):
+        self.pdf_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(self.pdf_path, 'rb') as file_stream:
+            self.pdf_content = file_stream.read()
+        with fitz.open(stream=self.pdf_content, filetype='pdf') as document:
+            self.page_texts = [page.getText() for page in document]
+
+    def _split(self, pdf_source: Optional[PdfSource] = None) -> List[bytes]:
+        pdf_source = self.pdf_content if pdf_source is None else pdf_source
+        return [page for _, pages in split_pdf_pages(pdf_source, len(self.page_texts)) for page in pages]
+
+    def _assert_single_pages(self, pages: List[bytes]) -> None:
+        self.assertEqual(len(pages), len(self.page_texts))
+        for page, page_text in zip(pages, self.page_texts):
+            with fitz.open(stream=page, filetype='pdf') as document:
+                self.assertEqual(document.pageCount, 1)
+                self.assertEqual(document[0].getText(), page_text)
+
+    @override_settings(SPLIT_WRITER='fitz')
+    def test_fitz_writer(self):
+        """Проверяет, что страницы, записанные через MuPDF, совпадают с исходными."""
+        self._assert_single_pages(self._split())
+
+    @override_settings(SPLIT_WRITER='pypdf2')
+    def test_pypdf2_writer(self):
+        """Проверяет прежнюю запись страниц через PyPDF2."""
+        self._assert_single_pages(self._split())
+
+    @override_settings(SPLIT_WRITER='fitz', SPLIT_CHUNK_SIZE=2)
+    def test_fitz_writer_from_path(self):
+        """Проверяет запись страниц документа, открытого с диска по пути."""
+        self._assert_single_pages(self._split(self.pdf_path))
+
+    @override_settings(SPLIT_WRITER='pypdf2', SPLIT_CHUNK_SIZE=2)
+    def test_pypdf2_writer_from_mmap(self):
+        """Проверяет запись страниц документа, отображенного в память."""
+        self._assert_single_pages(self._split(self.pdf_path))
+
+    def _uncompressed_pdf(self) -> bytes:
+        """Документ с несжатыми потоками и изображением, общим для всех страниц."""
+        image = io.BytesIO()
+        Image.linear_gradient('L').convert('RGB').save(image, 'PNG')
+        document = fitz.open()
+        for name in ['Musa', 'Isa', 'Nuh']:
+            page = document.newPage()
+            page.insertImage(fitz.Rect(0, 0, 200, 200), stream=image.getvalue())
+            page.insertImage(fitz.Rect(200, 0, 400, 200), stream=image.getvalue())
+            page.insertText((70, 260), name)
+        pdf_content = document.write(garbage=0, deflate=False)
+        document.close()
+        return pdf_content
+
+    def test_fitz_writer_size(self):
+        """Проверяет, что MuPDF сжимает потоки страниц и не копирует общее изображение."""
+        pdf_content = self._uncompressed_pdf()
+        with override_settings(SPLIT_WRITER='pypdf2'):
+            pypdf2_pages = [page for _, pages in split_pdf_pages(pdf_content, 3) for page in pages]
+        with override_settings(SPLIT_WRITER='fitz', SPLIT_WRITER_GARBAGE=4):
+            fitz_pages = [page for _, pages in split_pdf_pages(pdf_content, 3) for page in pages]
+
+        self.assertLess(sum(map(len, fitz_pages)), sum(map(len, pypdf2_pages)) / 2)
+        for page in fitz_pages:
+            with fitz.open(stream=page, filetype='pdf') as document:
+                self.assertEqual(len({image[0] for image in document[0].getImageList(full=True)}), 1)
+
+    @skipUnless(importlib.util.find_spec('fontTools'), 'fonttools не установлен')
+    @override_settings(SPLIT_WRITER='fitz', SPLIT_WRITER_SUBSET_FONTS=1)
+    def test_fitz_writer_subset_fonts(self):
+        """Проверяет страницы с подмножеством шрифтов."""
+        self._assert_single_pages(self._split())
+
+    def _other_pdf(self) -> bytes:
+        document = fitz.open()
+        for name in ['Musa', 'Isa', 'Nuh']:
+            document.newPage().insertText((70, 80), name)
+        pdf_content = document.write()
+        document.close()
+        return pdf_content
+
+    @staticmethod
+    def _page_text(page: bytes) -> str:
+        with fitz.open(stream=page, filetype='pdf') as document:
+            return document[0].getText().strip()
+
+    def _split_interleaved(self, pdf_source: PdfSource, other_pdf_source: PdfSource) -> Tuple[list, list]:
+        """Разделяет два документа в одном потоке, чередуя шаги генераторов."""
+        page_chunks = split_pdf_pages(pdf_source, len(self.page_texts))
+        other_page_chunks = split_pdf_pages(other_pdf_source, 3)
+        pages, other_pages = [], []
+        for (_, chunk), (_, other_chunk) in zip(page_chunks, other_page_chunks):
+            pages.extend(chunk)
+            other_pages.extend(other_chunk)
+        return pages, other_pages
+
+    @override_settings(SPLIT_WRITER='fitz', SPLIT_CHUNK_SIZE=1)
+    def test_interleaved_documents(self):
+        """Проверяет, что генераторы двух сессий в одном потоке режут страницы своих документов."""
+        pages, other_pages = self._split_interleaved(self.pdf_content, self._other_pdf())
+
+        self._assert_single_pages(pages)
+        self.assertListEqual(list(map(self._page_text, other_pages)), ['Musa', 'Isa', 'Nuh'])
+
+    def test_interleaved_documents_from_path(self):
+        """Проверяет, что документы, открываемые по пути для каждого диапазона, не подменяют друг друга."""
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as other_pdf_file:
+            other_pdf_file.write(self._other_pdf())
+            other_pdf_file.flush()
+            for writer in ['fitz', 'pypdf2']:
+                with self.subTest(writer=writer), override_settings(SPLIT_WRITER=writer, SPLIT_CHUNK_SIZE=1):
+                    pages, other_pages = self._split_interleaved(self.pdf_path, other_pdf_file.name)
+
+                    self._assert_single_pages(pages)
+                    self.assertListEqual(list(map(self._page_text, other_pages)), ['Musa', 'Isa', 'Nuh'])
+
+    @override_settings(SPLIT_WRITER='fitz')
+    def test_missing_page(self):
+        """Проверяет ошибку при запросе страницы, которой нет в документе."""
+        with self.assertRaises(IndexError):
+            list(split_pdf_pages(self.pdf_content, len(self.page_texts) + 1))
+
+
+class AsyncSplitCertificatesServiceTest(SimpleTestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+    NAME_POSITION = 24
+
+    def setUp(self):
+        self.certificate_files = ['Ibrahim.pdf', 'Ibrahim_1.pdf', 'Yusuf.pdf']
+        self.lock = threading.Lock()
+        self.active_requests = 0
+        self.max_active_requests = 0
+
+    def _slow_parse(self, single_page_pdf: bytes) -> str:
+        """Имитирует задержку сервера Tika и считает одновременные запросы."""
+        with self.lock:
+            self.active_requests += 1
+            self.max_active_requests = max(self.max_active_requests, self.active_requests)
+        time.sleep(0.1)
+        with self.lock:
+            self.active_requests -= 1
+        return PyMuPDFParserBackend().parse(single_page_pdf)
+
+    def _split(self, parsed_pages: Optional[List[str]] = None) -> Tuple[SplitCertificatesService, list, list]:
+        progress = []
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file_stream:
+            service = SplitCertificatesService(
+                pdf_file=file_stream,
+                name_position=self.NAME_POSITION,
+                progress_callback=lambda processed, total: progress.append((processed, total)),
+                parsed_pages=parsed_pages,
+            )
+            certificates_archive = service()
+
+        with zipfile.ZipFile(certificates_archive) as archive:
+            files = archive.namelist()
+        os.remove(certificates_archive)
+        return service, files, progress
+
+    @override_settings(SPLIT_PIPELINE='async', SPLIT_ASYNC_CONCURRENCY=2, SPLIT_CHUNK_SIZE=1)
+    @mock.patch('certificates.services.get_parser_backend')
+    def test_concurrent_extraction(self, get_parser_backend: MagicMock):
+        """Проверяет, что текст страниц извлекается одновременно, а архив пишется по порядку."""
+        get_parser_backend.return_value.parse.side_effect = self._slow_parse
+        service, files, progress = self._split()
+
+        self.assertListEqual(files, self.certificate_files)
+        self.assertListEqual(service.page_names, self.certificate_files)
+        self.assertListEqual(progress, [(1, 3), (2, 3), (3, 3)])
+        self.assertEqual(self.max_active_requests, 2)
+
+    @override_settings(SPLIT_PIPELINE='async')
+    def test_same_names_as_sync_pipeline(self):
+        async_service, async_files, _ = self._split()
+        with override_settings(SPLIT_PIPELINE='sync'):
+            sync_service, sync_files, _ = self._split()
+
+        self.assertListEqual(async_files, sync_files)
+        self.assertListEqual(async_service.parsed_pages, sync_service.parsed_pages)
+
+    @override_settings(SPLIT_PIPELINE='async')
+    @mock.patch('certificates.services.get_parser_backend')
+    def test_cached_pages(self, get_parser_backend: MagicMock):
+        """Проверяет, что при переданном тексте страниц бэкенд не вызывается."""
+        parsed_pages = ['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n']
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file_stream:
+            service = SplitCertificatesService(pdf_file=file_stream, name_position=5, parsed_pages=parsed_pages)
+            certificates_archive = service()
+        os.remove(certificates_archive)
+
+        get_parser_backend.assert_not_called()
+        self.assertListEqual(service.page_names, self.certificate_files)
+
+    @override_settings(SPLIT_PIPELINE='async')
+    @mock.patch('certificates.services.get_parser_backend')
+    def test_archive_removed_on_error(self, get_parser_backend: MagicMock):
+        """Проверяет, что ошибка извлечения текста прерывает конвейер и удаляет архив."""
+        get_parser_backend.return_value.parse.side_effect = TikaError('Сервер Tika вернул ошибку 422')
+        archives_before = set(os.listdir(SplitCertificatesService.ARCHIVE_SAVE_PATH))
 
+        with self.assertRaises(TikaError):
+            self._split()
+        self.assertSetEqual(set(os.listdir(SplitCertificatesService.ARCHIVE_SAVE_PATH)), archives_before)
@@ -0,0 +1,135 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from django.test import SimpleTestCase
+
+from certificates.metrics import TIKA_REQUEST_DURATION
+from certificates.services import TikaClient, TikaError, TikaUnavailableError
+
+
+class TikaStubHandler(BaseHTTPRequestHandler):
+    """Заглушка сервера Tika, отвечающая кодами из очереди сервера."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_PUT(self):
+        self.server.bodies.append(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        self.server.requests.append((self.path, self.headers['Accept'], self.client_address))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+
+        body = self.headers['Accept'].encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TikaClientTest(SimpleTestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), TikaStubHandler)
+        self.server.statuses: List[int] = []
+        self.server.requests = []
+        self.server.bodies = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _get_client(self, server_path: str = None, **options) -> TikaClient:
+        parameters = {
+            'server_path': server_path or f'http://127.0.0.1:{self.server.server_port}/',
+            'timeout': (1, 5),
+            'max_connections': 2,
+            'max_retries': 2,
+            'retry_backoff': 0.01,
+            'circuit_breaker_threshold': 5,
+            'circuit_breaker_timeout': 60,
+        }
+        parameters.update(options)
+        return TikaClient(**parameters)
+
+    def test_keep_alive(self):
+        """Проверяет, что последовательные запросы используют одно соединение."""
+        client = self._get_client()
+        for _ in range(3):
+            self.assertEqual(client.put('/tika', b'%PDF-', accept='text/plain'), 'text/plain')
+
+        self.assertEqual(len({client_address for _, _, client_address in self.server.requests}), 1)
+        self.assertEqual(self.server.requests[0][0], '/tika')
+
+    def test_retry_on_server_error(self):
+        self.server.statuses = [503, 500]
+        client = self._get_client()
+
+        self.assertEqual(client.put('/tika', b'%PDF-', accept='text/html'), 'text/html')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_retry_file_stream(self):
+        """Проверяет, что при повторе файл отправляется с начала."""
+        self.server.statuses = [503]
+        client = self._get_client()
+
+        client.put('/tika', io.BytesIO(b'%PDF-1.4 document'), accept='text/plain')
+
+        self.assertEqual(self.server.bodies, [b'%PDF-1.4 document'] * 2)
+
+    def test_latency_recorded(self):
+        """Проверяет, что задержка каждой попытки запроса попадает в метрики."""
+        self.server.statuses = [503]
+        client = self._get_client()
+        errors_before = TIKA_REQUEST_DURATION.get_count(outcome=503)
+        successes_before = TIKA_REQUEST_DURATION.get_count(outcome=200)
+
+        client.put('/tika', b'%PDF-', accept='text/plain')
+
+        self.assertEqual(TIKA_REQUEST_DURATION.get_count(outcome=503) - errors_before, 1)
+        self.assertEqual(TIKA_REQUEST_DURATION.get_count(outcome=200) - successes_before, 1)
+
+    def test_client_error_is_not_retried(self):
+        self.server.statuses = [422]
+        client = self._get_client()
+
+        with self.assertRaises(TikaError):
+            client.put('/tika', b'%PDF-', accept='text/plain')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_retries_exhausted(self):
+        self.server.statuses = [503] * 3
+        client = self._get_client()
+
+        with self.assertRaises(TikaError):
+            client.put('/tika', b'%PDF-', accept='text/plain')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_connection_error(self):
+        client = self._get_client(server_path='http://127.0.0.1:1/', max_retries=1)
+        with self.assertRaises(TikaError):
+            client.put('/tika', b'%PDF-', accept='text/plain')
+
+    def test_circuit_breaker(self):
+        """Проверяет, что после серии ошибок клиент перестает обращаться к серверу."""
+        self.server.statuses = [503] * 3
+        client = self._get_client(circuit_breaker_threshold=3)
+
+        with self.assertRaises(TikaError):
+            client.put('/tika', b'%PDF-', accept='text/plain')
+        with self.assertRaises(TikaUnavailableError):
+            client.put('/tika', b'%PDF-', accept='text/plain')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_circuit_breaker_half_open(self):
+        """Проверяет, что после паузы клиент снова обращается к серверу."""
+        self.server.statuses = [503] * 3
+        client = self._get_client(circuit_breaker_threshold=3, circuit_breaker_timeout=0)
+
+        with self.assertRaises(TikaError):
+            client.put('/tika', b'%PDF-', accept='text/plain')
+        self.assertEqual(client.put('/tika', b'%PDF-', accept='text/plain'), 'text/plain')
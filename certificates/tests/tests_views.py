@@ -1,15 +1,25 @@
+import io
 import os
+import shutil
+import zipfile
+from datetime import timedelta
 from http import HTTPStatus
 from unittest import mock
 from unittest.mock import Mock, MagicMock
 
 from django.conf import settings
 from django.core.files import File
-from django.test import TestCase
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from certificates.models import Course, CertificateType, ParseFile, \
     ParseSession
+from certificates.services import CalibrationImageService
+from certificates.tests.utils import QueryCountTestMixin
 
 
 class CourseCreateViewTest(TestCase):
@@ -96,7 +106,7 @@ class ParseFileCreateViewTest(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, 'parse_file/parse-file-create.html')
 
-    @mock.patch('certificates.services.ParsePdfService')
+    @mock.patch('certificates.services.ParseDocumentPageService')
     def test_post_success(self, parse_pdf_service: MagicMock):
         self.parsed_data = '\n\n\n \nIbrahim\n'
         parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
@@ -111,7 +121,6 @@ class ParseFileCreateViewTest(TestCase):
 
         parsed_file = self.certificate_type.parse_files.first()
         os.remove(parsed_file.file.path)
-        os.remove(parsed_file.calibration_certificate.path)
         self.assertIsNotNone(parsed_file)
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
         redirect_url = reverse('parse-session-create', kwargs={
@@ -128,7 +137,7 @@ class ParseSessionCreateViewTest(TestCase):
     NAME_POSITION = 5
     PARSE_SESSION_EXIST_MESSAGE = 'Сертификаты с такими калибровочными параметрами уже существуют'
 
-    @mock.patch('certificates.services.ParsePdfService')
+    @mock.patch('certificates.services.ParseDocumentPageService')
     def setUp(self, parse_pdf_service: MagicMock):
         self.parsed_data = '\n\n\n \nIbrahim\n'
         parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
@@ -148,7 +157,6 @@ class ParseSessionCreateViewTest(TestCase):
 
     def tearDown(self):
         os.remove(self.parse_file.file.path)
-        os.remove(self.parse_file.calibration_certificate.path)
 
     def test_url(self):
         url = reverse('parse-session-create', kwargs={
@@ -169,13 +177,7 @@ class ParseSessionCreateViewTest(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, 'parse_session/parse-session-create.html')
 
-    @mock.patch('certificates.services.ParsePdfService')
-    def test_post_success(self, parse_pdf_service: MagicMock):
-        self.parsed_data = ['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n']
-        parse_pdf_service.return_value = Mock(
-            side_effect=self.parsed_data,
-        )
-
+    def test_post_success(self):
         url = reverse('parse-session-create', kwargs={
             'course_slug': self.course.slug,
             'slug': self.certificate_type.slug,
@@ -185,8 +187,9 @@ class ParseSessionCreateViewTest(TestCase):
         response = self.client.post(url, data={'start_with': self.NAME_POSITION})
 
         parsed_session = self.parse_file.parse_sessions.first()
-        os.remove(parsed_session.certificates.path)
         self.assertIsNotNone(parsed_session)
+        self.assertEqual(parsed_session.status, ParseSession.Status.QUEUED)
+        self.assertFalse(parsed_session.certificates)
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
         redirect_url = reverse('parse-session-create', kwargs={
             'course_slug': self.course.slug,
@@ -195,13 +198,7 @@ class ParseSessionCreateViewTest(TestCase):
         })
         self.assertEqual(response.url, redirect_url)
 
-    @mock.patch('certificates.services.ParsePdfService')
-    def test_unique_parse_session(self, parse_pdf_service: MagicMock):
-        self.parsed_data = ['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n']
-        parse_pdf_service.return_value = Mock(
-            side_effect=self.parsed_data,
-        )
-
+    def test_unique_parse_session(self):
         url = reverse('parse-session-create', kwargs={
             'course_slug': self.course.slug,
             'slug': self.certificate_type.slug,
@@ -209,8 +206,6 @@ class ParseSessionCreateViewTest(TestCase):
         })
 
         self.client.post(url, data={'start_with': self.NAME_POSITION})
-        parsed_session = self.parse_file.parse_sessions.first()
-        os.remove(parsed_session.certificates.path)
 
         response = self.client.post(url, data={'start_with': self.NAME_POSITION})
 
@@ -223,13 +218,208 @@ class ParseSessionCreateViewTest(TestCase):
         start_with_error_message = str(start_with_error.data[0].message)
         self.assertEqual(start_with_error_message, self.PARSE_SESSION_EXIST_MESSAGE)
 
+    def test_layout_calibration_mode(self):
+        """Проверяет, что с тем же смещением можно создать сессию с поиском имени по расположению."""
+        url = reverse('parse-session-create', kwargs={
+            'course_slug': self.course.slug,
+            'slug': self.certificate_type.slug,
+            'pk': self.parse_file.pk,
+        })
+
+        self.client.post(url, data={'start_with': self.NAME_POSITION})
+        response = self.client.post(url, data={
+            'start_with': self.NAME_POSITION,
+            'calibration_mode': ParseSession.CalibrationMode.LAYOUT,
+        })
 
-class ParseSessionDeleteViewTest(TestCase):
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertListEqual(
+            sorted(self.parse_file.parse_sessions.values_list('calibration_mode', flat=True)),
+            [ParseSession.CalibrationMode.LAYOUT, ParseSession.CalibrationMode.OFFSET],
+        )
+
+    def test_region_calibration_mode(self):
+        url = reverse('parse-session-create', kwargs={
+            'course_slug': self.course.slug,
+            'slug': self.certificate_type.slug,
+            'pk': self.parse_file.pk,
+        })
+
+        response = self.client.post(url, data={
+            'start_with': self.NAME_POSITION,
+            'calibration_mode': ParseSession.CalibrationMode.REGION,
+            'name_region': '[0.1, 0.4, 0.9, 0.5]',
+        })
+
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertListEqual(self.parse_file.parse_sessions.get().name_region, [0.1, 0.4, 0.9, 0.5])
+
+    def test_region_calibration_mode_without_region(self):
+        """Проверяет, что сессия с поиском по области не создается без выделенной области."""
+        url = reverse('parse-session-create', kwargs={
+            'course_slug': self.course.slug,
+            'slug': self.certificate_type.slug,
+            'pk': self.parse_file.pk,
+        })
+
+        response = self.client.post(url, data={
+            'start_with': self.NAME_POSITION,
+            'calibration_mode': ParseSession.CalibrationMode.REGION,
+            'name_region': '[]',
+        })
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('name_region', response.context_data['form'].errors)
+        self.assertFalse(self.parse_file.parse_sessions.exists())
+
+    def test_failed_parse_session_requeue(self):
+        """Проверяет, что повторная отправка неудавшейся сессии возвращает ее в очередь."""
+        parse_session = ParseSession.objects.create(
+            parse_file=self.parse_file,
+            start_with=self.NAME_POSITION,
+            status=ParseSession.Status.FAILED,
+            error='error',
+        )
+        url = reverse('parse-session-create', kwargs={
+            'course_slug': self.course.slug,
+            'slug': self.certificate_type.slug,
+            'pk': self.parse_file.pk,
+        })
+
+        response = self.client.post(url, data={'start_with': self.NAME_POSITION})
+
+        parse_session.refresh_from_db()
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(parse_session.status, ParseSession.Status.QUEUED)
+        self.assertEqual(parse_session.error, '')
+
+
+class CalibrationImageViewTest(TestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+
+    @mock.patch('certificates.services.ParseDocumentPageService')
+    def setUp(self, parse_pdf_service: MagicMock):
+        parse_pdf_service.return_value = Mock(return_value='\n\n\n \nIbrahim\n')
+
+        self.course = Course.objects.create(name='test name')
+        self.certificate_type = CertificateType.objects.create(
+            name='test type name',
+            course=self.course,
+        )
+
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file:
+            self.parse_file = ParseFile.objects.create(
+                file=File(file, name=os.path.basename(file.name)),
+                certificate_type=self.certificate_type,
+            )
+
+    def tearDown(self):
+        os.remove(self.parse_file.file.path)
+        shutil.rmtree(CalibrationImageService.IMAGE_SAVE_PATH / self.parse_file.file_hash, ignore_errors=True)
+
+    def _get_url(self, width: int = 480, image_format: str = 'webp', dpi: int = settings.CALIBRATION_IMAGE_DPI) -> str:
+        return reverse('calibration-image', kwargs={
+            'file_hash': self.parse_file.file_hash,
+            'dpi': dpi,
+            'width': width,
+            'image_format': image_format,
+        })
+
+    def test_upload_does_not_render_image(self):
+        self.assertFalse(self.parse_file.calibration_certificate)
+        self.assertFalse((CalibrationImageService.IMAGE_SAVE_PATH / self.parse_file.file_hash).exists())
+
+    def test_get_success(self):
+        response = self.client.get(self._get_url())
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertGreater(len(b''.join(response.streaming_content)), 0)
+
+    def test_not_allowed_parameters(self):
+        """Проверяет, что изображения рендерятся только с параметрами из настроек."""
+        for url in (self._get_url(width=123), self._get_url(image_format='png'), self._get_url(dpi=600)):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, HTTPStatus.NOT_FOUND)
+
+    def test_srcset_in_calibration_page(self):
+        response = self.client.get(self.parse_file.get_absolute_url())
+
+        self.assertContains(response, f'{self._get_url(width=960)} 960w')
+        self.assertContains(response, self._get_url(width=1600, image_format='jpeg'))
+
+
+class ParseSessionProgressViewTest(TestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+    NAME_POSITION = 5
+
+    @mock.patch('certificates.services.ParseDocumentPageService')
+    def setUp(self, parse_pdf_service: MagicMock):
+        self.parsed_data = '\n\n\n \nIbrahim\n'
+        parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
+
+        self.course = Course.objects.create(name='test name')
+        self.certificate_type = CertificateType.objects.create(
+            name='test type name',
+            course=self.course,
+        )
+
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file:
+            self.parse_file = ParseFile.objects.create(
+                file=File(file, name=os.path.basename(file.name)),
+                certificate_type=self.certificate_type,
+            )
+
+        self.parse_session = ParseSession.objects.create(
+            parse_file=self.parse_file,
+            start_with=self.NAME_POSITION,
+        )
+
+    def tearDown(self):
+        os.remove(self.parse_file.file.path)
+
+    def test_url(self):
+        url = reverse('parse-session-progress', kwargs={'pk': self.parse_session.pk})
+        self.assertEqual(url, f'/parse-session/{self.parse_session.pk}/progress/')
+
+    def test_get_queued(self):
+        url = reverse('parse-session-progress', kwargs={'pk': self.parse_session.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        progress = response.json()
+        self.assertEqual(progress['status'], ParseSession.Status.QUEUED)
+        self.assertEqual(progress['pages_processed'], 0)
+        self.assertIsNone(progress['eta'])
+        self.assertIsNone(progress['certificates_url'])
+
+    def test_get_running(self):
+        ParseSession.objects.filter(pk=self.parse_session.pk).update(
+            status=ParseSession.Status.RUNNING,
+            started_at=timezone.now() - timedelta(seconds=10),
+            pages_processed=1,
+            pages_total=3,
+        )
+        url = reverse('parse-session-progress', kwargs={'pk': self.parse_session.pk})
+        response = self.client.get(url)
+
+        progress = response.json()
+        self.assertEqual(progress['status'], ParseSession.Status.RUNNING)
+        self.assertEqual(progress['pages_total'], 3)
+        self.assertAlmostEqual(progress['eta'], 20, delta=2)
+
+
+class ParseSessionDownloadViewTest(TestCase):
 
     UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
     NAME_POSITION = 5
 
-    @mock.patch('certificates.services.ParsePdfService')
+    @mock.patch('certificates.services.ParseDocumentPageService')
     def setUp(self, parse_pdf_service: MagicMock):
         self.parsed_data = '\n\n\n \nIbrahim\n'
         parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
@@ -240,6 +430,101 @@ class ParseSessionDeleteViewTest(TestCase):
             course=self.course,
         )
 
+        file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
+        with open(file_path, 'rb') as file:
+            self.parse_file = ParseFile.objects.create(
+                file=File(file, name=os.path.basename(file.name)),
+                certificate_type=self.certificate_type,
+            )
+
+        self.parse_session = ParseSession.objects.create(
+            parse_file=self.parse_file,
+            start_with=self.NAME_POSITION,
+        )
+        self.certificate_files = ['Ibrahim.pdf', 'Ibrahim_1.pdf', 'Yusuf.pdf']
+
+    def tearDown(self):
+        os.remove(self.parse_file.file.path)
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    def _split_certificates(self, parse_pdf_service: MagicMock):
+        parse_pdf_service.return_value = Mock(
+            return_value=['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n'],
+        )
+        self.parse_session.split_certificates()
+
+    def test_url(self):
+        url = reverse('parse-session-download', kwargs={'pk': self.parse_session.pk})
+        self.assertEqual(url, f'/parse-session/{self.parse_session.pk}/download/')
+
+    def test_get_not_finished(self):
+        url = reverse('parse-session-download', kwargs={'pk': self.parse_session.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_get_archive_file(self):
+        self._split_certificates()
+        url = reverse('parse-session-download', kwargs={'pk': self.parse_session.pk})
+        response = self.client.get(url)
+
+        os.remove(self.parse_session.certificates.path)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(response.url, self.parse_session.certificates.url)
+
+    @override_settings(CERTIFICATES_ARCHIVE_MODE='stream')
+    def test_get_streaming_archive(self):
+        self._split_certificates()
+        self.assertFalse(self.parse_session.certificates)
+        self.assertListEqual(self.parse_session.page_names, self.certificate_files)
+
+        url = reverse('parse-session-download', kwargs={'pk': self.parse_session.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertListEqual(archive.namelist(), self.certificate_files)
+
+    @override_settings(CERTIFICATES_ARCHIVE_MODE='stream')
+    def test_streaming_archive_closes_file(self):
+        """Проверяет, что файл с сертификатами закрывается после отдачи архива."""
+        self._split_certificates()
+        opened_files = []
+        open_file = FileSystemStorage._open
+
+        def record_open(storage: FileSystemStorage, name: str, mode: str = 'rb') -> File:
+            opened_files.append(open_file(storage, name, mode))
+            return opened_files[-1]
+
+        with mock.patch.object(FileSystemStorage, '_open', record_open):
+            response = self.client.get(reverse('parse-session-download', kwargs={'pk': self.parse_session.pk}))
+            b''.join(response.streaming_content)
+            response.close()
+
+        self.assertEqual(len(opened_files), 1)
+        self.assertTrue(opened_files[0].closed)
+
+
+class ParseSessionDeleteViewTest(TestCase):
+
+    UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
+    NAME_POSITION = 5
+
+    @mock.patch('certificates.services.ParsePdfPagesService')
+    @mock.patch('certificates.services.ParseDocumentPageService')
+    def setUp(self, parse_page_service: MagicMock, parse_pdf_service: MagicMock):
+        self.parsed_data = '\n\n\n \nIbrahim\n'
+        parse_page_service.return_value = Mock(return_value=self.parsed_data)
+
+        self.course = Course.objects.create(name='test name')
+        self.certificate_type = CertificateType.objects.create(
+            name='test type name',
+            course=self.course,
+        )
+
         file_path = f'{self.UPLOAD_DIRECTORY}/sample.pdf'
         with open(file_path, 'rb') as file:
             self.parse_file = ParseFile.objects.create(
@@ -249,17 +534,17 @@ class ParseSessionDeleteViewTest(TestCase):
 
         self.parsed_data = ['\n\n\n \nIbrahim\n', '\n\n\n \nIbrahim\n', '\n\n\n \nYusuf\n']
         parse_pdf_service.return_value = Mock(
-            side_effect=self.parsed_data,
+            return_value=self.parsed_data,
         )
 
         self.parse_session = ParseSession.objects.create(
             parse_file=self.parse_file,
             start_with=self.NAME_POSITION,
         )
+        self.parse_session.split_certificates()
 
     def tearDown(self):
         os.remove(self.parse_file.file.path)
-        os.remove(self.parse_file.calibration_certificate.path)
         os.remove(self.parse_session.certificates.path)
 
     def test_url(self):
@@ -346,7 +631,7 @@ class ParseFileDeleteView(TestCase):
 
     UPLOAD_DIRECTORY = settings.BASE_DIR / 'fixtures'
 
-    @mock.patch('certificates.services.ParsePdfService')
+    @mock.patch('certificates.services.ParseDocumentPageService')
     def setUp(self, parse_pdf_service: MagicMock):
         self.parsed_data = '\n\n\n \nIbrahim\n'
         parse_pdf_service.return_value = Mock(return_value=self.parsed_data)
@@ -366,7 +651,6 @@ class ParseFileDeleteView(TestCase):
 
     def tearDown(self):
         os.remove(self.parse_file.file.path)
-        os.remove(self.parse_file.calibration_certificate.path)
 
     def test_url(self):
         url = reverse('parse-file-delete', kwargs={
@@ -395,3 +679,142 @@ class ParseFileDeleteView(TestCase):
         })
 
         self.assertEqual(response.url, redirect_url)
+
+
+class ViewQueryCountTest(QueryCountTestMixin, TestCase):
+
+    ROWS_PER_STEP = 3
+
+    def setUp(self):
+        self.course = Course.objects.create(name='test name')
+        self.certificate_type = CertificateType.objects.create(name='test type name', course=self.course)
+        ParseFile.objects.bulk_create([self._build_parse_file()])
+        self.parse_file = ParseFile.objects.get(certificate_type=self.certificate_type)
+
+    def _build_parse_file(self) -> ParseFile:
+        return ParseFile(
+            file='parse_files/sample.pdf',
+            certificate_type=self.certificate_type,
+            parsed_page='\n\n\n \nIbrahim\n',
+            start_with_auto=5,
+            file_hash='0' * 64,
+        )
+
+    def test_home(self):
+        def add_courses():
+            for _ in range(self.ROWS_PER_STEP):
+                course = Course.objects.create(name=f'course {Course.objects.count()}')
+                CertificateType.objects.create(name='type', course=course)
+
+        self.assertConstantQueryCount(reverse('home'), add_courses)
+
+    def test_certificate_type_create(self):
+        def add_certificate_types():
+            for _ in range(self.ROWS_PER_STEP):
+                CertificateType.objects.create(name=f'type {CertificateType.objects.count()}', course=self.course)
+
+        self.assertConstantQueryCount(
+            reverse('certificate-type-create', kwargs={'slug': self.course.slug}), add_certificate_types)
+
+    def test_parse_file_create(self):
+        def add_parse_files():
+            ParseFile.objects.bulk_create([self._build_parse_file() for _ in range(self.ROWS_PER_STEP)])
+
+        self.assertConstantQueryCount(reverse('parse-file-create', kwargs={
+            'course_slug': self.course.slug,
+            'slug': self.certificate_type.slug,
+        }), add_parse_files)
+
+    def test_parse_session_create(self):
+        def add_parse_sessions():
+            start_with = ParseSession.objects.count()
+            ParseSession.objects.bulk_create([
+                ParseSession(parse_file=self.parse_file, start_with=start_with + i, status=status)
+                for i, status in enumerate(ParseSession.Status.values[:self.ROWS_PER_STEP])
+            ])
+
+        self.assertConstantQueryCount(self.parse_file.get_absolute_url(), add_parse_sessions)
+
+    def test_paginate_parse_sessions(self):
+        ParseSession.objects.bulk_create([
+            ParseSession(parse_file=self.parse_file, start_with=i) for i in range(settings.PAGINATE_BY + 1)
+        ])
+
+        response = self.client.get(self.parse_file.get_absolute_url(), data={'page': 2})
+
+        self.assertEqual([parse_session.start_with for parse_session in response.context['parse_sessions']],
+                         [settings.PAGINATE_BY])
+        self.assertContains(response, '2 из 2')
+
+    def test_delete_parse_session_queries(self):
+        parse_session = ParseSession.objects.create(parse_file=self.parse_file, start_with=5)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('parse-session-delete', kwargs={'pk': parse_session.pk}))
+
+        self.assertEqual(response.url, self.parse_file.get_absolute_url())
+        # Курс и тип сертификата для адреса перенаправления загружаются вместе с сессией
+        for table in ('certificates_parsefile', 'certificates_certificatetype', 'certificates_course'):
+            self.assertFalse(any(query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']
+                                 for query in queries.captured_queries))
+
+
+@override_settings(CALIBRATION_TEXT_WINDOW=10)
+class ParseFileTextViewTest(TestCase):
+
+    PARSED_PAGE = 'header ' * 10 + 'Ibrahim\n' + 'footer ' * 1000
+
+    def setUp(self):
+        self.course = Course.objects.create(name='test name')
+        self.certificate_type = CertificateType.objects.create(name='test type name', course=self.course)
+        ParseFile.objects.bulk_create([ParseFile(
+            file='parse_files/sample.pdf',
+            certificate_type=self.certificate_type,
+            parsed_page=self.PARSED_PAGE,
+            parsed_page_length=len(self.PARSED_PAGE),
+            start_with_auto=self.PARSED_PAGE.index('Ibrahim'),
+            file_hash='0' * 64,
+        )])
+        self.parse_file = ParseFile.objects.get(certificate_type=self.certificate_type)
+
+    def test_default_queryset_defers_parsed_page(self):
+        self.assertIn('parsed_page', self.parse_file.get_deferred_fields())
+
+    def test_get_window(self):
+        url = reverse('parse-file-text', kwargs={'pk': self.parse_file.pk})
+
+        response = self.client.get(url, data={'offset': 70, 'limit': 15})
+
+        self.assertEqual(response.json(), {
+            'offset': 70,
+            'text': self.PARSED_PAGE[70:85],
+            'length': len(self.PARSED_PAGE),
+        })
+
+    def test_limit_window(self):
+        url = reverse('parse-file-text', kwargs={'pk': self.parse_file.pk})
+
+        response = self.client.get(url, data={'offset': 0, 'limit': 10000})
+
+        self.assertEqual(response.json()['text'], self.PARSED_PAGE[:20])
+
+    def test_invalid_offset(self):
+        url = reverse('parse-file-text', kwargs={'pk': self.parse_file.pk})
+
+        response = self.client.get(url, data={'offset': 'abc'})
+
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_not_found(self):
+        url = reverse('parse-file-text', kwargs={'pk': self.parse_file.pk + 1})
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_parse_session_page_renders_window(self):
+        response = self.client.get(self.parse_file.get_absolute_url())
+
+        self.assertContains(response, '>Ibrahim\nfo</pre>')
+        self.assertContains(response, f'max="{len(self.PARSED_PAGE)}"')
+        self.assertNotContains(response, 'footer footer')
@@ -0,0 +1,26 @@
+from http import HTTPStatus
+from typing import Callable
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountTestMixin:
+    """Проверки числа запросов к базе данных для TestCase."""
+
+    def assertConstantQueryCount(self, url: str, add_rows: Callable[[], None]) -> None:
+        """Проверяет, что число запросов страницы не меняется после add_rows,
+        то есть не зависит от числа выводимых объектов.
+        """
+        add_rows()
+        with CaptureQueriesContext(connection) as initial_queries:
+            self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
+
+        add_rows()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
+
+        self.assertEqual(
+            len(initial_queries), len(queries),
+            msg='\n'.join(query['sql'] for query in queries.captured_queries),
+        )
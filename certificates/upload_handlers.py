@@ -0,0 +1,53 @@
+import hashlib
+import os
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from certificates.validators import PDF_HEADER
+
+
+class PdfUploadHandler(TemporaryFileUploadHandler):
+    """Записывает загружаемый файл на диск по частям.
+
+    Временный файл создается в FILE_UPLOAD_TEMP_DIR внутри MEDIA_ROOT, поэтому
+    при сохранении он переносится в хранилище переименованием, а не копированием.
+    Одновременно вычисляется SHA-256 содержимого и проверяется заголовок pdf:
+    данные файла без заголовка на диск не записываются.
+    """
+
+    def new_file(self, *args, **kwargs):
+        os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+        super().new_file(*args, **kwargs)
+        self.file_hash = hashlib.sha256()
+        self.file.is_pdf = None
+
+    def receive_data_chunk(self, raw_data: bytes, start: int):
+        if self.file.is_pdf is None:
+            self.file.is_pdf = raw_data.startswith(PDF_HEADER)
+        if not self.file.is_pdf:
+            return None
+        self.file_hash.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size: int) -> TemporaryUploadedFile:
+        self.file.file_hash = self.file_hash.hexdigest()
+        return super().file_complete(file_size)
+
+
+class PartUploadedFile(File):
+    """Файл, загруженный частями во временный каталог.
+
+    Хранилище переносит такой файл переименованием, как и временный файл обычной загрузки.
+    """
+
+    def __init__(self, file, name: Optional[str] = None, file_hash: Optional[str] = None) -> None:
+        super().__init__(file, name=name)
+        self.file_hash = file_hash
+
+    def temporary_file_path(self) -> str:
+        return self.file.name
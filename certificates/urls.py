@@ -2,14 +2,28 @@ from django.urls import path
 
 from certificates.views import CourseCreateView, CertificateTypeCreateView, \
     ParseFileCreateView, ParseSessionCreateView, ParseSessionDeleteView, \
-    CourseDeleteView, CertificateTypeDeleteView, ParseFileDeleteView
+    CourseDeleteView, CertificateTypeDeleteView, ParseFileDeleteView, \
+    ParseSessionProgressView, ParseSessionDownloadView, CalibrationImageView, \
+    ParseFileUploadCreateView, ParseFileUploadView, ParseFileTextView, MetricsView, \
+    ParseBatchCreateView, ParseBatchDetailView, ParseBatchDownloadView
 
 urlpatterns = [
     path('', CourseCreateView.as_view(), name='home'),
     path('courses/<slug:slug>/', CertificateTypeCreateView.as_view(), name='certificate-type-create'),
     path('courses/<slug:course_slug>/type/<slug:slug>/', ParseFileCreateView.as_view(), name='parse-file-create'),
+    path('courses/<slug:course_slug>/type/<slug:slug>/uploads/', ParseFileUploadCreateView.as_view(), name='parse-file-upload-create'),
+    path('courses/<slug:course_slug>/type/<slug:slug>/batches/', ParseBatchCreateView.as_view(), name='parse-batch-create'),
     path('courses/<slug:course_slug>/type/<slug:slug>/file/<int:pk>/', ParseSessionCreateView.as_view(), name='parse-session-create'),
 
+    path('calibration-images/<str:file_hash>/<int:dpi>/<int:width>.<str:image_format>',
+         CalibrationImageView.as_view(), name='calibration-image'),
+    path('parse-file/<int:pk>/text/', ParseFileTextView.as_view(), name='parse-file-text'),
+    path('uploads/<uuid:pk>/', ParseFileUploadView.as_view(), name='parse-file-upload'),
+    path('batches/<int:pk>/', ParseBatchDetailView.as_view(), name='parse-batch-detail'),
+    path('batches/<int:pk>/download/', ParseBatchDownloadView.as_view(), name='parse-batch-download'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('parse-session/<int:pk>/progress/', ParseSessionProgressView.as_view(), name='parse-session-progress'),
+    path('parse-session/<int:pk>/download/', ParseSessionDownloadView.as_view(), name='parse-session-download'),
     path('parse-session/<int:pk>/delete/', ParseSessionDeleteView.as_view(), name='parse-session-delete'),
     path('courses/<slug:slug>/delete/', CourseDeleteView.as_view(), name='course-delete'),
     path('courses/<slug:course_slug>/type/<slug:slug>/delete/', CertificateTypeDeleteView.as_view(), name='certificate-type-delete'),
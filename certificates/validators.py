@@ -0,0 +1,22 @@
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.utils.translation import gettext_lazy as _
+
+
+PDF_HEADER = b'%PDF-'
+
+
+def validate_pdf_file(file: File) -> None:
+    """Проверяет, что файл начинается с заголовка pdf.
+
+    Заголовок загружаемого файла проверяется обработчиком загрузки на лету,
+    остальные файлы проверяются чтением первых байтов.
+    """
+    is_pdf = getattr(getattr(file, 'file', file), 'is_pdf', None)
+    if is_pdf is None:
+        position = file.tell()
+        file.seek(0)
+        is_pdf = file.read(len(PDF_HEADER)) == PDF_HEADER
+        file.seek(position)
+    if not is_pdf:
+        raise ValidationError(_('Файл не является pdf документом'), code='invalid_pdf')
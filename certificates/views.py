@@ -1,16 +1,57 @@
-from django.db import IntegrityError
-from django.db.models import QuerySet
+import io
+from http import HTTPStatus
+from typing import Optional, Iterator
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib import messages
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator, Page
+from django.db import IntegrityError, transaction
+from django.db.models import QuerySet, F
 from django.forms import ModelForm
-from django.shortcuts import get_object_or_404
+from django.http import JsonResponse, HttpRequest, HttpResponse, \
+    StreamingHttpResponse, Http404, FileResponse
+from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
-from django.views.generic import CreateView, DeleteView
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.generic import CreateView, DeleteView, DetailView
 
+from certificates import metrics
 from certificates.models import Course, CertificateType, ParseFile, \
-    ParseSession
+    ParseSession, ParseFileUpload, ParseBatch
+from certificates.services import StreamCertificatesArchiveService, CalibrationImageService, \
+    StreamBatchArchiveService
+from certificates.upload_handlers import PdfUploadHandler
 
 
-class CourseCreateView(CreateView):
+class PaginateRelatedMixin:
+    """Постраничный вывод списка объектов на странице создания."""
+
+    paginate_by = settings.PAGINATE_BY
+
+    def paginate(self, queryset: QuerySet) -> Page:
+        return Paginator(queryset, self.paginate_by).get_page(self.request.GET.get('page'))
+
+
+class PdfUploadMixin:
+    """Загрузка pdf файлов обработчиком PdfUploadHandler.
+
+    Обработчик добавляется до чтения тела запроса, поэтому проверка CSRF
+    выполняется после него, а не в middleware.
+    """
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        request.upload_handlers.insert(0, PdfUploadHandler(request))
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
+
+class CourseCreateView(PaginateRelatedMixin, CreateView):
 
     model = Course
     fields = ['name']
@@ -18,11 +59,11 @@ class CourseCreateView(CreateView):
 
     def get_context_data(self, **kwargs) -> dict:
         context = super().get_context_data(**kwargs)
-        context['courses'] = self.model.objects.all()
+        context['courses'] = self.paginate(self.model.objects.prefetch_related('certificate_types').order_by('pk'))
         return context
 
 
-class CertificateTypeCreateView(CreateView):
+class CertificateTypeCreateView(PaginateRelatedMixin, CreateView):
 
     model = CertificateType
     fields = ['name']
@@ -31,6 +72,7 @@ class CertificateTypeCreateView(CreateView):
     def get_context_data(self, **kwargs) -> dict:
         context = super().get_context_data(**kwargs)
         context['course'] = get_object_or_404(Course, **self.kwargs)
+        context['certificate_types'] = self.paginate(context['course'].certificate_types.order_by('pk'))
         return context
 
     def form_valid(self, form: ModelForm):
@@ -43,9 +85,9 @@ class CertificateTypeCreateView(CreateView):
         return super().form_valid(form)
 
 
-class ParseFileCreateView(CreateView):
+class ParseFileCreateView(PdfUploadMixin, PaginateRelatedMixin, CreateView):
 
-    queryset = CertificateType.objects.all()
+    queryset = CertificateType.objects.select_related('course')
     model = ParseFile
     fields = ['file']
     template_name = 'parse_file/parse-file-create.html'
@@ -57,6 +99,8 @@ class ParseFileCreateView(CreateView):
     def get_context_data(self, **kwargs) -> dict:
         context = super().get_context_data(**kwargs)
         context['certificate_type'] = get_object_or_404(self.get_queryset())
+        context['parse_files'] = self.paginate(context['certificate_type'].parse_files.order_by('pk'))
+        context['upload_chunk_size'] = settings.UPLOAD_CHUNK_SIZE
         return context
 
     def form_valid(self, form: ModelForm):
@@ -65,11 +109,161 @@ class ParseFileCreateView(CreateView):
         return super().form_valid(form)
 
 
-class ParseSessionCreateView(CreateView):
+class ParseFileUploadCreateView(CreateView):
+
+    queryset = CertificateType.objects.all()
+    model = ParseFileUpload
+    fields = ['file_name', 'size']
+    http_method_names = ['post']
+
+    def get_queryset(self) -> QuerySet:
+        return self.queryset.filter(slug=self.kwargs.get('slug'), course__slug=self.kwargs.get('course_slug'))
+
+    def form_valid(self, form: ModelForm) -> JsonResponse:
+        form.instance.certificate_type = get_object_or_404(self.get_queryset())
+        self.object = form.save()
+        return JsonResponse({
+            'upload_url': reverse('parse-file-upload', kwargs={'pk': self.object.pk}),
+            'offset': 0,
+        }, status=HTTPStatus.CREATED)
+
+    def form_invalid(self, form: ModelForm) -> JsonResponse:
+        return JsonResponse({'errors': form.errors}, status=HTTPStatus.BAD_REQUEST)
+
+
+class ParseFileUploadView(DetailView):
+    """Прием частей файла: GET возвращает размер загруженной части,
+    PATCH дописывает часть, начинающуюся с байта из заголовка Upload-Offset.
+    """
+
+    model = ParseFileUpload
+    http_method_names = ['get', 'patch']
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> JsonResponse:
+        upload = self.get_object()
+        return JsonResponse({'offset': upload.offset, 'size': upload.size})
+
+    def patch(self, request: HttpRequest, *args, **kwargs) -> JsonResponse:
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return JsonResponse({'error': _('Не указано смещение части файла')}, status=HTTPStatus.BAD_REQUEST)
+        if int(request.META.get('CONTENT_LENGTH') or 0) > settings.UPLOAD_CHUNK_SIZE:
+            return JsonResponse({'error': _('Часть файла больше %(size)s байт') % {'size': settings.UPLOAD_CHUNK_SIZE}},
+                                status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+        # Часть читается до блокировки, чтобы медленный клиент не держал строку загрузки
+        chunk = io.BytesIO(request.read())
+        with transaction.atomic():
+            upload = self.get_object(self.model.objects.select_for_update())
+            try:
+                offset = upload.append(chunk, offset)
+            except ValidationError as error:
+                status = HTTPStatus.CONFLICT if error.code == 'offset_mismatch' else HTTPStatus.BAD_REQUEST
+                return JsonResponse({'error': error.messages[0], 'offset': upload.offset}, status=status)
+
+        if offset < upload.size:
+            return JsonResponse({'offset': offset})
+        parse_file = upload.complete()
+        return JsonResponse({'offset': offset, 'redirect_url': parse_file.get_absolute_url()})
+
+
+class ParseBatchCreateView(PdfUploadMixin, CreateView):
+    """Загрузка нескольких файлов с сертификатами одним пакетом."""
+
+    queryset = CertificateType.objects.select_related('course')
+    model = ParseBatch
+    fields = ['start_with_policy', 'archive_mode']
+    template_name = 'parse_batch/parse-batch-create.html'
+
+    def get_queryset(self) -> QuerySet:
+        return self.queryset.filter(slug=self.kwargs.get('slug'), course__slug=self.kwargs.get('course_slug'))
+
+    def get_context_data(self, **kwargs) -> dict:
+        context = super().get_context_data(**kwargs)
+        context['certificate_type'] = get_object_or_404(self.get_queryset())
+        context['start_with_policies'] = ParseBatch.StartWithPolicy.choices
+        context['archive_modes'] = ParseBatch.ArchiveMode.choices
+        context['max_files'] = settings.BATCH_MAX_FILES
+        return context
+
+    def form_valid(self, form: ModelForm):
+        files = self.request.FILES.getlist('files')
+        if not files:
+            form.add_error(None, _('Выберите файлы с сертификатами'))
+            return self.form_invalid(form)
+        if len(files) > settings.BATCH_MAX_FILES:
+            form.add_error(None, _('В пакете может быть не больше %(count)s файлов') % {
+                'count': settings.BATCH_MAX_FILES})
+            return self.form_invalid(form)
+
+        form.instance.certificate_type = get_object_or_404(self.get_queryset())
+        # Калибровка долгая, поэтому выполняется до транзакции, в которой сохраняются пакет и его файлы
+        calibrations = ParseBatch.calibrate_files(files)
+        for file, calibration in zip(files, calibrations):
+            if isinstance(calibration, ValidationError):
+                messages.error(self.request, f'{file.name}: {calibration.messages[0]}')
+        if all(isinstance(calibration, ValidationError) for calibration in calibrations):
+            form.add_error(None, _('Ни один файл не добавлен'))
+            return self.form_invalid(form)
+
+        with transaction.atomic():
+            self.object = form.save()
+            self.object.add_files(files, calibrations)
+            if self.object.start_with_policy == ParseBatch.StartWithPolicy.AUTO:
+                self.object.create_sessions()
+        return redirect(self.object.get_absolute_url())
+
+
+class ParseBatchDetailView(DetailView):
+    """Файлы пакета и их разделение. Если начало имени задается для каждого
+    файла, POST ставит в очередь разделение с указанными значениями.
+    """
+
+    queryset = ParseBatch.objects.select_related('certificate_type__course')
+    template_name = 'parse_batch/parse-batch-detail.html'
+    context_object_name = 'batch'
+
+    def get_context_data(self, **kwargs) -> dict:
+        context = super().get_context_data(**kwargs)
+        context['batch_files'] = self.object.get_latest_sessions()
+        context['has_pending_files'] = any(parse_session is None for _, parse_session in context['batch_files'])
+        context['is_finished'] = not context['has_pending_files'] and all(
+            parse_session.is_finished for _, parse_session in context['batch_files'])
+        return context
+
+    def post(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        self.object = self.get_object()
+        start_with = {}
+        for parse_file in self.object.parse_files.all():
+            value = request.POST.get(f'start_with_{parse_file.pk}', '')
+            if value.isdigit():
+                start_with[parse_file.pk] = int(value)
+        self.object.create_sessions(start_with)
+        return redirect(self.object.get_absolute_url())
+
+
+class ParseBatchDownloadView(DetailView):
+    """Общий архив пакета: сертификаты каждого файла в отдельной папке."""
+
+    queryset = ParseBatch.objects.select_related('certificate_type')
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        batch = self.get_object()
+        if not batch.is_finished:
+            raise Http404
+
+        response = StreamingHttpResponse(StreamBatchArchiveService(parts=batch.iter_archive_parts())(),
+                                         content_type='application/zip')
+        response['Content-Disposition'] = f"attachment; filename*=utf-8''{quote(batch.archive_name)}"
+        return response
+
+
+class ParseSessionCreateView(PaginateRelatedMixin, CreateView):
 
-    queryset = ParseFile.objects.all()
+    queryset = ParseFile.objects.select_related('certificate_type__course')
     model = ParseSession
-    fields = ['start_with']
+    fields = ['start_with', 'calibration_mode', 'name_region', 'profiler']
     template_name = 'parse_session/parse-session-create.html'
     context_object_name = 'parse_file'
 
@@ -79,35 +273,152 @@ class ParseSessionCreateView(CreateView):
 
     def get_context_data(self, **kwargs) -> dict:
         context = super().get_context_data(**kwargs)
-        context['parse_file'] = get_object_or_404(self.get_queryset())
+        # Страница получает только фрагмент текста с автоматически найденного начала имени,
+        # остальные фрагменты запрашиваются ParseFileTextView при калибровке
+        context['parse_file'] = get_object_or_404(
+            self.get_queryset().with_text_window(F('start_with_auto'), settings.CALIBRATION_TEXT_WINDOW))
+        context['calibration_text_window'] = settings.CALIBRATION_TEXT_WINDOW
+        context['parse_sessions'] = self.paginate(
+            context['parse_file'].parse_sessions.defer('page_names').order_by('pk'))
+        context['calibration_modes'] = ParseSession.CalibrationMode.choices
+        context['profilers'] = ParseSession.Profiler.choices
         return context
 
+    def get_form(self, form_class=None) -> ModelForm:
+        form = super().get_form(form_class)
+        form.fields['calibration_mode'].required = False
+        return form
+
     def form_valid(self, form: ModelForm):
         form.instance.parse_file = get_object_or_404(self.get_queryset())
-        is_parse_session_exist = self.model.objects.filter(
+        form.instance.calibration_mode = form.cleaned_data.get('calibration_mode') \
+            or ParseSession.CalibrationMode.OFFSET
+        # Профилирование замедляет разделение, поэтому включить его может только персонал
+        if not self.request.user.is_staff:
+            form.instance.profiler = ParseSession.Profiler.NONE
+        parse_session = self.model.objects.filter(
             parse_file=form.instance.parse_file,
             start_with=form.cleaned_data.get('start_with'),
-        ).exists()
+            calibration_mode=form.instance.calibration_mode,
+            name_region=form.instance.name_region,
+        ).first()
+
+        if parse_session and parse_session.status == ParseSession.Status.FAILED:
+            parse_session.profiler = form.instance.profiler
+            parse_session.save(update_fields=['profiler'])
+            parse_session.requeue()
+            return redirect(parse_session.get_absolute_url())
 
-        if is_parse_session_exist:
+        if parse_session:
             form.add_error(field='start_with', error=_('Сертификаты с такими калибровочными параметрами уже существуют'))
             return super().form_invalid(form)
         self.object = form.save()
         return super().form_valid(form)
 
 
-class ParseSessionDeleteView(DeleteView):
+class ParseFileTextView(DetailView):
+    """Фрагмент текста первой страницы длиной limit с символа offset."""
+
+    model = ParseFile
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> JsonResponse:
+        try:
+            offset = max(int(request.GET.get('offset', 0)), 0)
+            limit = min(max(int(request.GET.get('limit', settings.CALIBRATION_TEXT_WINDOW)), 0),
+                        settings.CALIBRATION_TEXT_WINDOW * 2)
+        except ValueError:
+            return JsonResponse({'error': _('Некорректные параметры фрагмента текста')}, status=HTTPStatus.BAD_REQUEST)
+
+        parse_file = self.get_object(self.model.objects.with_text_window(offset, limit))
+        return JsonResponse({
+            'offset': offset,
+            'text': parse_file.text_window,
+            'length': parse_file.parsed_page_length,
+        })
+
+
+class CalibrationImageView(DetailView):
+
+    model = ParseFile
+
+    def get_object(self, queryset: Optional[QuerySet] = None) -> ParseFile:
+        # Одинаковые файлы разных типов сертификатов имеют общий хэш и общие изображения
+        parse_file = self.model.objects.filter(file_hash=self.kwargs['file_hash']).first()
+        if parse_file is None:
+            raise Http404
+        return parse_file
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> FileResponse:
+        if self.kwargs['dpi'] != settings.CALIBRATION_IMAGE_DPI \
+                or self.kwargs['width'] not in settings.CALIBRATION_IMAGE_WIDTHS \
+                or self.kwargs['image_format'] not in CalibrationImageService.IMAGE_FORMATS:
+            raise Http404
+
+        parse_file = self.get_object()
+        with parse_file.file.open('rb') as pdf_file:
+            image_path = CalibrationImageService(
+                pdf_file=pdf_file.file,
+                file_hash=parse_file.file_hash,
+                width=self.kwargs['width'],
+                image_format=self.kwargs['image_format'],
+                dpi=self.kwargs['dpi'],
+            )()
+
+        response = FileResponse(open(image_path, 'rb'), content_type=f"image/{self.kwargs['image_format']}")
+        # Ссылка содержит хэш файла и параметры рендеринга, поэтому изображение по ней не меняется
+        response['Cache-Control'] = f'public, max-age={settings.CALIBRATION_IMAGE_MAX_AGE}, immutable'
+        return response
+
+
+class ParseSessionProgressView(DetailView):
 
     model = ParseSession
 
-    def get_success_url(self) -> str:
-        return reverse('parse-session-create', kwargs={
-            'course_slug': self.object.parse_file.certificate_type.course.slug,
-            'slug': self.object.parse_file.certificate_type.slug,
-            'pk': self.object.parse_file.pk,
+    def get(self, request: HttpRequest, *args, **kwargs) -> JsonResponse:
+        parse_session = self.get_object()
+        eta = parse_session.eta
+        return JsonResponse({
+            'status': parse_session.status,
+            'status_display': parse_session.get_status_display(),
+            'pages_processed': parse_session.pages_processed,
+            'pages_total': parse_session.pages_total,
+            'eta': round(eta.total_seconds()) if eta is not None else None,
+            'certificates_url': reverse('parse-session-download', kwargs={'pk': parse_session.pk})
+            if parse_session.status == ParseSession.Status.DONE else None,
+            'error': parse_session.error,
         })
 
 
+class ParseSessionDownloadView(DetailView):
+
+    queryset = ParseSession.objects.filter(status=ParseSession.Status.DONE)
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        parse_session = self.get_object()
+        if parse_session.certificates:
+            return redirect(parse_session.certificates.url)
+        if not parse_session.page_names:
+            raise Http404
+
+        response = StreamingHttpResponse(self._stream_archive(parse_session), content_type='application/zip')
+        response['Content-Disposition'] = f"attachment; filename*=utf-8''{quote(parse_session.archive_name)}"
+        return response
+
+    @staticmethod
+    def _stream_archive(parse_session: ParseSession) -> Iterator[bytes]:
+        # Файл открывается при начале отдачи архива и закрывается после нее или при обрыве соединения
+        with parse_session.parse_file.file.open('rb') as pdf_file:
+            yield from StreamCertificatesArchiveService(pdf_file=pdf_file, page_names=parse_session.page_names)()
+
+
+class ParseSessionDeleteView(DeleteView):
+
+    queryset = ParseSession.objects.select_related('parse_file__certificate_type__course')
+
+    def get_success_url(self) -> str:
+        return self.object.parse_file.get_absolute_url()
+
+
 class CourseDeleteView(DeleteView):
 
     model = Course
@@ -118,7 +429,7 @@ class CourseDeleteView(DeleteView):
 
 class CertificateTypeDeleteView(DeleteView):
 
-    queryset = CertificateType.objects.all()
+    queryset = CertificateType.objects.select_related('course')
     model = CertificateType
 
     def get_success_url(self) -> str:
@@ -132,7 +443,7 @@ class CertificateTypeDeleteView(DeleteView):
 
 class ParseFileDeleteView(DeleteView):
 
-    queryset = ParseFile.objects.all()
+    queryset = ParseFile.objects.select_related('certificate_type__course')
     model = ParseFile
 
     def get_success_url(self) -> str:
@@ -144,3 +455,10 @@ class ParseFileDeleteView(DeleteView):
     def get_queryset(self) -> QuerySet:
         return self.queryset.filter(id=self.kwargs.get('pk'), certificate_type__course__slug=self.kwargs.get('course_slug'),
                                     certificate_type__slug=self.kwargs.get('slug'))
+
+
+class MetricsView(View):
+    """Метрики веб-сервера в текстовом формате Prometheus."""
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
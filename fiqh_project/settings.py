@@ -116,6 +116,18 @@ MEDIA_ROOT = BASE_DIR / 'upload'
 
 MEDIA_URL = '/media/'
 
+# Число курсов, типов сертификатов, файлов и сессий на одной странице списка
+PAGINATE_BY = int(os.environ.get('PAGINATE_BY', 20))
+
+# Файлы с сертификатами записываются на диск по частям во временный каталог
+# внутри MEDIA_ROOT, откуда переносятся в хранилище переименованием; обработчик
+# загрузки pdf подключается только в представлениях загрузки файлов. Браузер
+# отправляет файл частями по UPLOAD_CHUNK_SIZE байт, поэтому прерванную загрузку
+# можно продолжить; брошенные загрузки удаляются через UPLOAD_MAX_AGE секунд.
+FILE_UPLOAD_TEMP_DIR = str(MEDIA_ROOT / 'tmp/uploads')
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+UPLOAD_MAX_AGE = int(os.environ.get('UPLOAD_MAX_AGE', 24 * 60 * 60))
+
 
 
 # Static files (CSS, JavaScript, Images)
@@ -129,6 +141,92 @@ STATIC_URL = '/static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 TIKA_SERVER_PATH = os.environ.get('TIKA_SERVER_PATH')
+TIKA_CONNECT_TIMEOUT = float(os.environ.get('TIKA_CONNECT_TIMEOUT', 5))
+TIKA_READ_TIMEOUT = float(os.environ.get('TIKA_READ_TIMEOUT', 120))
+TIKA_MAX_CONNECTIONS = int(os.environ.get('TIKA_MAX_CONNECTIONS', 8))
+TIKA_MAX_RETRIES = int(os.environ.get('TIKA_MAX_RETRIES', 3))
+TIKA_RETRY_BACKOFF = float(os.environ.get('TIKA_RETRY_BACKOFF', 0.5))
+TIKA_CIRCUIT_BREAKER_THRESHOLD = int(os.environ.get('TIKA_CIRCUIT_BREAKER_THRESHOLD', 5))
+TIKA_CIRCUIT_BREAKER_TIMEOUT = float(os.environ.get('TIKA_CIRCUIT_BREAKER_TIMEOUT', 30))
+
+# Бэкенд извлечения текста из pdf: PyMuPDFParserBackend, PdfMinerParserBackend или TikaParserBackend
+PDF_PARSER_BACKEND = os.environ.get('PDF_PARSER_BACKEND', 'certificates.services.PyMuPDFParserBackend')
+
+# Пул обработчиков для сериализации страниц при разделении: process или thread.
+# Впереди записи архива сериализуется не больше 2 * SPLIT_WORKERS диапазонов
+# из SPLIT_CHUNK_SIZE страниц, поэтому память не растет с числом страниц
+SPLIT_EXECUTOR = os.environ.get('SPLIT_EXECUTOR', 'process')
+SPLIT_WORKERS = int(os.environ.get('SPLIT_WORKERS', 1))
+SPLIT_CHUNK_SIZE = int(os.environ.get('SPLIT_CHUNK_SIZE', 50))
+
+# Запись страниц сертификатов: fitz - страница копируется средствами MuPDF со
+# сжатием потоков, повторяющиеся объекты объединяются сборкой мусора уровня
+# SPLIT_WRITER_GARBAGE (0-4),
+# а при SPLIT_WRITER_SUBSET_FONTS в шрифтах остаются только использованные глифы
+# (нужен fonttools); pypdf2 - прежняя запись через PyPDF2
+SPLIT_WRITER = os.environ.get('SPLIT_WRITER', 'fitz')
+SPLIT_WRITER_GARBAGE = int(os.environ.get('SPLIT_WRITER_GARBAGE', 3))
+SPLIT_WRITER_SUBSET_FONTS = int(os.environ.get('SPLIT_WRITER_SUBSET_FONTS', 0))
+
+# Конвейер разделения: sync - текст всех страниц извлекается одним запросом,
+# async - текст каждой страницы извлекается отдельно, не более
+# SPLIT_ASYNC_CONCURRENCY запросов одновременно
+SPLIT_PIPELINE = os.environ.get('SPLIT_PIPELINE', 'sync')
+SPLIT_ASYNC_CONCURRENCY = int(os.environ.get('SPLIT_ASYNC_CONCURRENCY', TIKA_MAX_CONNECTIONS))
+
+# Разделение фиксирует записанные страницы каждые SPLIT_CHECKPOINT_INTERVAL
+# страниц и после сбоя продолжается с последней зафиксированной. Обработчик
+# подтверждает, что сессия выполняется, каждые SPLIT_HEARTBEAT_INTERVAL секунд;
+# сессия без подтверждения дольше SPLIT_HEARTBEAT_TIMEOUT секунд возвращается в очередь.
+SPLIT_CHECKPOINT_INTERVAL = int(os.environ.get('SPLIT_CHECKPOINT_INTERVAL', 50))
+SPLIT_HEARTBEAT_INTERVAL = float(os.environ.get('SPLIT_HEARTBEAT_INTERVAL', 60))
+SPLIT_HEARTBEAT_TIMEOUT = int(os.environ.get('SPLIT_HEARTBEAT_TIMEOUT', 30 * 60))
+
+# Профилирование разделения: cprofile - cProfile со статистикой pstats,
+# sampling - сэмплирование стеков всех потоков каждые SPLIT_PROFILER_INTERVAL
+# секунд. Пустое значение - профилируются только сессии с выбранным профилировщиком
+SPLIT_PROFILER = os.environ.get('SPLIT_PROFILER', '')
+SPLIT_PROFILER_INTERVAL = float(os.environ.get('SPLIT_PROFILER_INTERVAL', 0.005))
+
+# Пакетная загрузка: число файлов, калибруемых одновременно, и наибольшее
+# число файлов в одном пакете
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 100))
+
+# Разрешение совпадающих имен сертификатов в архиве: suffix - порядковый
+# номер, page - номер страницы, hash - короткий хэш имени и номера страницы.
+# Имена сравниваются без учета регистра.
+CERTIFICATE_NAME_COLLISION_STRATEGY = os.environ.get('CERTIFICATE_NAME_COLLISION_STRATEGY', 'suffix')
+
+# Сжатие архива с сертификатами: stored, deflated, bzip2 или lzma.
+# PDF уже сжаты, поэтому по умолчанию файлы сохраняются без сжатия.
+CERTIFICATES_ARCHIVE_COMPRESSION = os.environ.get('CERTIFICATES_ARCHIVE_COMPRESSION', 'stored')
+CERTIFICATES_ARCHIVE_COMPRESSLEVEL = int(os.environ['CERTIFICATES_ARCHIVE_COMPRESSLEVEL']) \
+    if os.environ.get('CERTIFICATES_ARCHIVE_COMPRESSLEVEL') else None
+
+# Хранение архива с сертификатами: file - архив создается при разделении,
+# stream - сохраняются только имена страниц, а архив генерируется при скачивании
+CERTIFICATES_ARCHIVE_MODE = os.environ.get('CERTIFICATES_ARCHIVE_MODE', 'file')
+
+# Изображения первой страницы для калибровки: разрешение рендеринга, ширины
+# для srcset, качество WebP/JPEG и срок кэширования браузером в секундах
+CALIBRATION_IMAGE_DPI = int(os.environ.get('CALIBRATION_IMAGE_DPI', 100))
+CALIBRATION_IMAGE_WIDTHS = [int(width) for width in os.environ.get('CALIBRATION_IMAGE_WIDTHS', '480,960,1600').split(',')]
+CALIBRATION_IMAGE_QUALITY = int(os.environ.get('CALIBRATION_IMAGE_QUALITY', 80))
+CALIBRATION_IMAGE_MAX_AGE = int(os.environ.get('CALIBRATION_IMAGE_MAX_AGE', 365 * 24 * 60 * 60))
+
+# Размер фрагмента текста первой страницы в символах, который показывается
+# при калибровке; фрагменты подгружаются по мере перемещения ползунка
+CALIBRATION_TEXT_WINDOW = int(os.environ.get('CALIBRATION_TEXT_WINDOW', 1000))
+
+# Метрики в текстовом формате Prometheus: веб-сервер отдает их по адресу
+# /metrics, а обработчик очереди - собственным сервером на порту METRICS_PORT
+# (0 - сервер метрик обработчика не запускается)
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+
+# Кэш текста страниц: срок хранения в днях и максимальный объем в символах
+PAGE_TEXT_CACHE_MAX_AGE = int(os.environ.get('PAGE_TEXT_CACHE_MAX_AGE', 30))
+PAGE_TEXT_CACHE_MAX_SIZE = int(os.environ.get('PAGE_TEXT_CACHE_MAX_SIZE', 500 * 1024 * 1024))
 
 LOG_MAX_SIZE = int(os.getenv('LOG_MAX_SIZE', 10 * 1024 * 1024))  # 10 MB
 LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 10))